@@ -1,16 +1,29 @@
-from fastapi import FastAPI, UploadFile, File, HTTPException
+from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
-from document_processor import DocumentProcessor
+from fastapi.responses import StreamingResponse, Response, JSONResponse
 from dataset_processor import DatasetProcessor
 from vector_store import VectorStore
+from index_writer import IndexWriter
+from upload_api import create_upload_router
+from llm_client import get_llm_client, build_messages
+from chat_stream import chat_events, NO_RESULTS_MESSAGE
+from clients import get_clients
+from metrics import REGISTRY, CONTENT_TYPE, RequestMetricsMiddleware, cache_collector, span
+from profiler import RequestProfiler
 import uvicorn
 import os
+import asyncio
+from typing import List, Dict, Any, Optional, Union
+from pydantic import BaseModel
 from dotenv import load_dotenv
 import logging
 
 # Load environment variables
 load_dotenv()
 
+# Create logs directory before the file handler opens logs/app.log
+os.makedirs('logs', exist_ok=True)
+
 # Set up logging
 logging.basicConfig(
     level=logging.INFO,
@@ -22,9 +35,6 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-# Create logs directory if it doesn't exist
-os.makedirs('logs', exist_ok=True)
-
 app = FastAPI(title="HSA RAG API")
 
 # Configure CORS
@@ -35,85 +45,145 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+# Outermost, so request timings include CORS handling; PROFILE_REQUESTS turns on slow-request stack dumps
+app.add_middleware(
+    RequestMetricsMiddleware,
+    profiler=RequestProfiler(),
+    paths=["/api/chat", "/api/upload", "/api/search", "/api/search/batch", "/metrics"],
+)
 
 # Initialize components
-document_processor = DocumentProcessor()
-dataset_processor = DatasetProcessor()
 vector_store = VectorStore()
+# Shares the API's VectorStore (and through it the pooled clients)
+dataset_processor = DatasetProcessor(vector_store=vector_store)
+index_writer = IndexWriter(vector_store=vector_store)
+llm_client = get_llm_client()
+app.include_router(create_upload_router(index_writer.spool_dir))
+
+REGISTRY.register_collector(cache_collector({
+    "query_result": lambda: {"hits": vector_store.result_cache.hits, "misses": vector_store.result_cache.misses},
+    "embedding": lambda: vector_store.embedder.cache.stats() if getattr(vector_store.embedder, "cache", None) else None,
+}))
 
 @app.on_event("startup")
 async def startup_event():
-    """Initialize components on startup"""
+    """Initialize components on startup (unless already initialized, e.g. by a benchmark harness)"""
     try:
-        vector_store.initialize()
+        if not vector_store.index:
+            vector_store.initialize()
         logger.info("Vector store initialized successfully")
+        # Read-only workers (serve.py) leave uploads to the writer process
+        if not vector_store.read_only:
+            index_writer.start()
     except Exception as e:
         logger.error(f"Failed to initialize vector store: {str(e)}")
         raise
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Stop the in-process index writer and release pooled connections"""
+    await asyncio.to_thread(index_writer.stop)
+    await get_clients().aclose()
+    logger.info("Closed shared API clients")
+
 @app.post("/api/chat")
-async def chat(message: str):
-    """Handle chat messages"""
+async def chat(message: str, stream: bool = False):
+    """
+    Handle chat messages.
+
+    With stream=true the answer is sent as Server-Sent Events: a 'sources'
+    event once retrieval finishes, one 'token' event per generated token,
+    then 'done' (or 'error').
+    """
+    if stream:
+        return StreamingResponse(
+            chat_events(message, vector_store, llm_client),
+            media_type="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+        )
     try:
         # Query the vector store
-        results = vector_store.query(message)
-        
-        # Process results and generate response
-        response = {
-            "response": "Based on the HSA regulations, " + results[0]["content"] if results else "I couldn't find relevant information in the documents.",
-            "sources": [r["metadata"]["source"] for r in results[:3]] if results else []
+        results = await vector_store.aquery(message)
+        if not results:
+            return {"response": NO_RESULTS_MESSAGE, "sources": []}
+
+        # Generate an answer grounded in the retrieved passages
+        with span("generate"):
+            tokens = [token async for token in llm_client.astream(build_messages(message, results))]
+        return {
+            "response": "".join(tokens),
+            "sources": [r["metadata"]["source"] for r in results[:3]]
         }
-        
-        return response
     except Exception as e:
         logger.error(f"Error in chat endpoint: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
-@app.post("/api/upload")
-async def upload_file(file: UploadFile = File(...)):
-    """Handle file uploads"""
-    try:
-        # Save the uploaded file temporarily
-        temp_path = f"temp_{file.filename}"
-        with open(temp_path, "wb") as buffer:
-            content = await file.read()
-            buffer.write(content)
-        
-        # Process the file
-        if file.filename.lower().endswith('.pdf'):
-            docs = document_processor.process_pdf(temp_path)
-        else:
-            docs = document_processor.process_text(temp_path)
-        
-        # Add to vector store
-        vector_store.add_documents(docs)
-        
-        # Clean up
-        os.remove(temp_path)
-        
-        return {"message": f"Successfully processed {file.filename}"}
-    except Exception as e:
-        logger.error(f"Error in upload endpoint: {str(e)}")
-        raise HTTPException(status_code=500, detail=str(e))
-
 @app.post("/api/search")
 async def search(query: str):
     """Handle search queries"""
     try:
-        results = vector_store.query(query)
-        return {
-            "results": [
-                {
-                    "content": r["content"],
-                    "source": r["metadata"]["source"],
-                    "score": r["score"]
-                }
-                for r in results
-            ]
-        }
+        results = await vector_store.aquery(query)
+        # JSONResponse encodes on construction, so the span covers the JSON encoding too
+        with span("serialize"):
+            return JSONResponse({
+                "results": [
+                    {
+                        "content": r["content"],
+                        "source": r["metadata"]["source"],
+                        "score": r["score"]
+                    }
+                    for r in results
+                ]
+            })
     except Exception as e:
         logger.error(f"Error in search endpoint: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+# Bounds the work (and response size) of one batch request
+MAX_BATCH_QUERIES = int(os.getenv("MAX_BATCH_QUERIES", "256"))
+
+class BatchSearchRequest(BaseModel):
+    queries: List[str]
+    limit: int = 5
+    # One filter for every query, or one (or null) per query
+    filters: Optional[Union[Dict[str, Any], List[Optional[Dict[str, Any]]]]] = None
+
+@app.post("/api/search/batch")
+async def search_batch(request: BatchSearchRequest):
+    """
+    Run many search queries in one call.
+
+    All uncached queries are embedded in one request and scored against the
+    index together; results come back per query, in request order.
+    """
+    if len(request.queries) > MAX_BATCH_QUERIES:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BATCH_QUERIES} queries per batch")
+    try:
+        batch = await vector_store.aquery_many(request.queries, limit=request.limit, filters=request.filters)
+        with span("serialize"):
+            return JSONResponse({
+                "results": [
+                    [
+                        {
+                            "content": r["content"],
+                            "source": r["metadata"]["source"],
+                            "score": r["score"]
+                        }
+                        for r in results
+                    ]
+                    for results in batch
+                ]
+            })
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Error in batch search endpoint: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/metrics")
+async def metrics():
+    """Stage timings, request latencies, API calls and cache hits in the Prometheus text format"""
+    return Response(REGISTRY.render(), media_type=CONTENT_TYPE)
+
 if __name__ == "__main__":
     uvicorn.run("app:app", host="0.0.0.0", port=8000, reload=True) 
\ No newline at end of file
@@ -0,0 +1,66 @@
+import os
+import time
+import argparse
+import logging
+from typing import List, Callable, Dict, Any
+from langchain.text_splitter import RecursiveCharacterTextSplitter
+from token_chunker import TokenChunker
+from dataset_processor import SUPPORTED_EXTENSIONS
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+DATASET_DIR = os.path.join(os.path.dirname(__file__), "dataset")
+
+def load_corpus(dataset_path: str) -> List[str]:
+    """Text of every text document in the dataset"""
+    texts = []
+    for root, dirs, files in os.walk(dataset_path):
+        dirs[:] = sorted(d for d in dirs if d != "processed")
+        for file in sorted(files):
+            if file.lower().endswith(SUPPORTED_EXTENSIONS) and not file.lower().endswith('.pdf'):
+                with open(os.path.join(root, file), 'r', encoding='utf-8') as f:
+                    texts.append(f.read())
+    return texts
+
+def run(name: str, split: Callable[[str], List[str]], texts: List[str], count_tokens: Callable[[str], int],
+        chunk_tokens: int, repeat: int) -> Dict[str, Any]:
+    """Time one splitter over the corpus and summarise its chunks"""
+    start = time.perf_counter()
+    for _ in range(repeat):
+        chunks = [chunk for text in texts for chunk in split(text)]
+    elapsed = (time.perf_counter() - start) / repeat
+
+    token_counts = [count_tokens(chunk) for chunk in chunks]
+    return {
+        "splitter": name,
+        "ms_per_pass": round(elapsed * 1000, 3),
+        "chunks": len(chunks),
+        "mean_tokens": round(sum(token_counts) / max(len(token_counts), 1), 1),
+        "max_tokens": max(token_counts, default=0),
+        "over_limit": sum(1 for t in token_counts if t > chunk_tokens),
+        "deterministic": chunks == [chunk for text in texts for chunk in split(text)],
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare the token chunker with the character splitter')
+    parser.add_argument('--dataset', default=DATASET_DIR, help='Dataset directory')
+    parser.add_argument('--scale', type=int, default=50, help='Concatenate each document this many times')
+    parser.add_argument('--repeat', type=int, default=5, help='Timed passes per splitter')
+    parser.add_argument('--chunk-tokens', type=int, default=256)
+    parser.add_argument('--overlap-tokens', type=int, default=50)
+    args = parser.parse_args()
+
+    # Scale documents up so timings reflect long regulatory texts, not per-call overhead
+    texts = ["\n\n".join([text] * args.scale) for text in load_corpus(args.dataset)]
+    chunker = TokenChunker(chunk_tokens=args.chunk_tokens, overlap_tokens=args.overlap_tokens)
+    count_tokens = lambda chunk: len(chunker._token_offsets(chunk))
+    character_splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=200)
+
+    logger.info(f"Corpus: {len(texts)} documents, {sum(len(t) for t in texts)} characters")
+    for name, split in (("RecursiveCharacterTextSplitter(1000, 200)", character_splitter.split_text),
+                        (f"TokenChunker({args.chunk_tokens}, {args.overlap_tokens})", chunker.split_text)):
+        logger.info(run(name, split, texts, count_tokens, args.chunk_tokens, args.repeat))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,357 @@
+import os
+import json
+import time
+import random
+import socket
+import asyncio
+import argparse
+import resource
+import tempfile
+import threading
+import logging
+from typing import List, Dict, Any
+import numpy as np
+import httpx
+import uvicorn
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+DATASET_DIR = os.path.join(os.path.dirname(__file__), "dataset")
+DEFAULT_BASELINE = os.path.join(os.path.dirname(__file__), "benchmarks", "e2e_baseline.json")
+
+QUESTIONS = [
+    "What is the minimum width of a fire escape staircase?",
+    "How many fire exits does a high-rise building need?",
+    "What are the setback requirements under the National Building Code?",
+    "When is the NMMC headquarters project scheduled to finish?",
+    "Which milestones are on the science park schedule?",
+    "What does the floor plan show for the ground floor?",
+    "What sprinkler systems are required in Mumbai?",
+    "What is the maximum travel distance to an exit?",
+    "Which design documents cover the National Cancer Institute?",
+    "What refuge area is required for tall buildings?",
+]
+
+# Metrics where a larger value is an improvement; every other compared metric is better smaller
+HIGHER_IS_BETTER = ("throughput_rps", "chunks_per_second", "queries_per_second")
+
+
+def scale_dataset(source: str, target: str, scale: int) -> int:
+    """
+    Copy every dataset file scale times; returns the file count.
+
+    Each text copy tags its lines with a revision number, so copies chunk
+    alike but embed as distinct texts instead of hitting the embedding cache.
+    """
+    count = 0
+    for root, dirs, files in os.walk(source):
+        dirs[:] = sorted(d for d in dirs if d != "processed")
+        for name in sorted(files):
+            if not name.lower().endswith((".txt", ".pdf")):
+                continue
+            with open(os.path.join(root, name), "rb") as f:
+                data = f.read()
+            stem, ext = os.path.splitext(name)
+            out_dir = os.path.join(target, os.path.relpath(root, source))
+            os.makedirs(out_dir, exist_ok=True)
+            for copy in range(scale):
+                copy_data = data
+                if ext.lower() == ".txt":
+                    copy_data = b"\n".join(line + f" (rev {copy})".encode() if line.strip() else line
+                                           for line in data.split(b"\n"))
+                with open(os.path.join(out_dir, f"{stem}_{copy}{ext}"), "wb") as f:
+                    f.write(copy_data)
+                count += 1
+    return count
+
+
+def sample_queries(dataset: str, n: int, seed: int = 0) -> List[str]:
+    """Fixed questions mixed with phrases drawn from the dataset, so some queries repeat and most don't"""
+    rng = random.Random(seed)
+    phrases = []
+    for root, _, files in os.walk(dataset):
+        for name in files:
+            if name.endswith(".txt"):
+                with open(os.path.join(root, name), "r", errors="replace") as f:
+                    words = f.read().split()
+                for start in range(0, max(0, len(words) - 8), 4):
+                    phrases.append(" ".join(words[start:start + 8]))
+    return [rng.choice(QUESTIONS) if rng.random() < 0.3 or not phrases else rng.choice(phrases)
+            for _ in range(n)]
+
+
+def peak_rss_mb() -> Dict[str, float]:
+    """Peak resident set size of this process and of its largest child (e.g. a parse worker)"""
+    return {
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        "peak_child_rss_mb": round(resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024, 1),
+    }
+
+
+def latency_stats(latencies: List[float], prefix: str = "latency") -> Dict[str, float]:
+    ms = np.asarray(latencies) * 1000
+    return {
+        f"{prefix}_p50_ms": round(float(np.percentile(ms, 50)), 2),
+        f"{prefix}_p95_ms": round(float(np.percentile(ms, 95)), 2),
+        f"{prefix}_p99_ms": round(float(np.percentile(ms, 99)), 2),
+    }
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+class ServerThread:
+    def __init__(self, app, port: int):
+        """Uvicorn serving app on a loopback port from a background thread"""
+        self.server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+        self.thread = threading.Thread(target=self.server.run, daemon=True)
+
+    def __enter__(self):
+        self.thread.start()
+        while not self.server.started:
+            time.sleep(0.01)
+        return self
+
+    def __exit__(self, *exc):
+        self.server.should_exit = True
+        self.thread.join()
+
+
+async def drive(base_url: str, kind: str, queries: List[str], concurrency: int,
+                batch_size: int = 32) -> Dict[str, Any]:
+    """
+    Send one request per query (or per batch of queries) with bounded concurrency.
+
+    Args:
+        base_url: API base URL
+        kind: "search", "search_batch" (batch_size queries per request) or
+            "chat" (streamed; also times the first token)
+        queries: Query texts
+        concurrency: Requests in flight
+        batch_size: Queries per /api/search/batch request
+
+    Returns:
+        Throughput, latency percentiles and error count
+    """
+    latencies: List[float] = []
+    first_tokens: List[float] = []
+    errors = 0
+    if kind == "search_batch":
+        pending = iter([queries[i:i + batch_size] for i in range(0, len(queries), batch_size)])
+    else:
+        pending = iter(queries)
+
+    async def worker(client: httpx.AsyncClient):
+        nonlocal errors
+        for query in pending:
+            start = time.perf_counter()
+            try:
+                if kind == "search_batch":
+                    response = await client.post("/api/search/batch", json={"queries": query})
+                    response.raise_for_status()
+                elif kind == "search":
+                    response = await client.post("/api/search", params={"query": query})
+                    response.raise_for_status()
+                else:
+                    first_token = None
+                    async with client.stream("POST", "/api/chat", params={"message": query, "stream": "true"}) as response:
+                        response.raise_for_status()
+                        async for line in response.aiter_lines():
+                            if first_token is None and line == "event: token":
+                                first_token = time.perf_counter() - start
+                    if first_token is not None:
+                        first_tokens.append(first_token)
+                latencies.append(time.perf_counter() - start)
+            except httpx.HTTPError as e:
+                errors += 1
+                logger.warning(f"{kind} request failed: {str(e)}")
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60) as client:
+        start = time.perf_counter()
+        await asyncio.gather(*(worker(client) for _ in range(concurrency)))
+        elapsed = time.perf_counter() - start
+
+    stats: Dict[str, Any] = {"requests": len(latencies), "errors": errors,
+                             "throughput_rps": round(len(latencies) / elapsed, 2) if elapsed else 0.0}
+    if kind == "search_batch" and elapsed:
+        stats["queries_per_second"] = round(len(queries) / elapsed, 2)
+    if latencies:
+        stats.update(latency_stats(latencies))
+    if first_tokens:
+        stats.update(latency_stats(first_tokens, prefix="first_token"))
+    return stats
+
+
+def api_calls(fake_openai, fake_index) -> Dict[str, int]:
+    calls = dict(fake_openai.stats())
+    calls.update({f"index_{method}": count for method, count in fake_index.calls.items()})
+    return calls
+
+
+def call_delta(after: Dict[str, int], before: Dict[str, int]) -> Dict[str, int]:
+    return {key: value - before.get(key, 0) for key, value in after.items() if value - before.get(key, 0)}
+
+
+def run(args) -> Dict[str, Any]:
+    """Ingest the dataset and load the API against fake OpenAI and Pinecone services"""
+    work_dir = tempfile.mkdtemp(prefix="rag_bench_")
+    from fake_services import FakeOpenAIServer, FakePineconeIndex
+
+    fake_openai = FakeOpenAIServer(
+        requests_per_period=args.requests_per_minute,
+        tokens_per_period=args.tokens_per_minute,
+        period=60.0,
+        latency=args.embed_latency_ms / 1000,
+        chat_tokens_per_second=args.llm_tokens_per_second
+    )
+    # Everything the API touches is local, throwaway and pointed at the fakes
+    os.environ.update({
+        "OPENAI_API_KEY": "benchmark",
+        "OPENAI_BASE_URL": fake_openai.base_url,
+        "VECTOR_BACKEND": "local",
+        "LLM_BACKEND": "openai",
+        "EMBEDDING_CACHE_DIR": "",
+        "INDEX_READ_ONLY": "",
+        "LOCAL_INDEX_PATH": os.path.join(work_dir, "local_index"),
+        "BM25_INDEX_PATH": os.path.join(work_dir, "bm25"),
+        "CHUNK_STORE_PATH": os.path.join(work_dir, "segments"),
+        "INDEX_GENERATION_PATH": os.path.join(work_dir, "index.generation"),
+        "UPLOAD_SPOOL_DIR": os.path.join(work_dir, "uploads"),
+    })
+
+    import app as api
+    from dataset_processor import DatasetProcessor
+    # Request logging would dominate the profile; keep this script's own progress lines
+    logging.getLogger().setLevel(logging.WARNING)
+    logger.setLevel(logging.INFO)
+
+    store = api.vector_store
+    store.initialize()
+    fake_index = FakePineconeIndex(
+        dimension=store.dimension,
+        latency=args.index_latency_ms / 1000,
+        requests_per_second=args.index_requests_per_second
+    )
+    store.index = fake_index
+
+    dataset = os.path.join(work_dir, "dataset")
+    files = scale_dataset(args.dataset, dataset, args.scale)
+    results: Dict[str, Any] = {"config": {k: v for k, v in vars(args).items()
+                                          if k not in ("baseline", "save_baseline", "output", "dataset", "tolerance")}}
+
+    before = api_calls(fake_openai, fake_index)
+    start = time.perf_counter()
+    chunks = DatasetProcessor(vector_store=store, parse_workers=args.parse_workers).index_dataset(dataset)
+    elapsed = time.perf_counter() - start
+    results["ingest"] = {"files": files, "chunks": chunks, "seconds": round(elapsed, 2),
+                         "chunks_per_second": round(chunks / elapsed, 1), **peak_rss_mb(),
+                         "api_calls": call_delta(api_calls(fake_openai, fake_index), before)}
+    logger.info(f"ingest: {results['ingest']}")
+
+    with ServerThread(api.app, free_port()) as server:
+        base_url = f"http://127.0.0.1:{server.server.config.port}"
+        # Open connections and compile lazily built structures before timing anything
+        asyncio.run(drive(base_url, "search", sample_queries(args.dataset, args.concurrency, seed=-1), args.concurrency))
+        for phase, kind in enumerate(("search", "chat")):
+            # Each endpoint gets its own query mix, so chat does not just replay cached searches
+            queries = sample_queries(args.dataset, args.queries, seed=args.seed + phase)
+            before = api_calls(fake_openai, fake_index)
+            stats = asyncio.run(drive(base_url, kind, queries, args.concurrency))
+            stats.update(peak_rss_mb())
+            stats["api_calls"] = call_delta(api_calls(fake_openai, fake_index), before)
+            results[kind] = stats
+            logger.info(f"{kind}: {stats}")
+
+        # An evaluation script sending its queries in batches, one request at a time
+        queries = sample_queries(args.dataset, args.queries, seed=args.seed + 2)
+        before = api_calls(fake_openai, fake_index)
+        stats = asyncio.run(drive(base_url, "search_batch", queries, 1, batch_size=args.batch_size))
+        stats["api_calls"] = call_delta(api_calls(fake_openai, fake_index), before)
+        results["search_batch"] = stats
+        logger.info(f"search_batch: {stats}")
+
+    fake_openai.close()
+    return results
+
+
+def compare(results: Dict[str, Any], baseline: Dict[str, Any], tolerance: float) -> List[str]:
+    """
+    Regressions of results against a baseline.
+
+    Latency, memory and API-call counts regress when they grow by more than
+    tolerance (a fraction); throughput regresses when it drops by more than
+    tolerance.
+    """
+    regressions = []
+
+    def check(path: str, current: Any, reference: Any):
+        if isinstance(reference, dict):
+            for key, value in reference.items():
+                check(f"{path}.{key}", (current or {}).get(key, 0), value)
+            return
+        if not isinstance(reference, (int, float)) or path.startswith("config") or reference == 0:
+            return
+        change = (current - reference) / reference
+        if path.endswith(HIGHER_IS_BETTER):
+            change = -change
+        if change > tolerance:
+            regressions.append(f"{path}: {reference} -> {current} ({change:+.0%} worse)")
+
+    for phase in ("ingest", "search", "chat", "search_batch"):
+        check(phase, results.get(phase, {}), baseline.get(phase, {}))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Offline end-to-end benchmark: ingestion plus /api/search, /api/chat and /api/search/batch load')
+    parser.add_argument('--dataset', default=DATASET_DIR, help='Dataset directory')
+    parser.add_argument('--scale', type=int, default=100, help='Copies of each dataset file to ingest')
+    parser.add_argument('--parse-workers', type=int, default=2)
+    parser.add_argument('--queries', type=int, default=200, help='Requests per endpoint')
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--batch-size', type=int, default=32, help='Queries per /api/search/batch request')
+    parser.add_argument('--embed-latency-ms', type=float, default=50)
+    parser.add_argument('--requests-per-minute', type=float, default=3000, help='Fake embeddings request budget')
+    parser.add_argument('--tokens-per-minute', type=float, default=1000000, help='Fake embeddings token budget')
+    parser.add_argument('--llm-tokens-per-second', type=float, default=200)
+    parser.add_argument('--index-latency-ms', type=float, default=20, help='Fake Pinecone round trip')
+    parser.add_argument('--index-requests-per-second', type=float, default=None, help='Fake Pinecone call budget')
+    parser.add_argument('--output', help='Write results JSON here')
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE, help='Baseline JSON to compare against')
+    parser.add_argument('--save-baseline', action='store_true', help='Store these results as the new baseline')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='Allowed relative regression')
+    args = parser.parse_args()
+
+    results = run(args)
+    report = json.dumps(results, indent=2)
+    print(report)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(report + "\n")
+
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(args.baseline), exist_ok=True)
+        with open(args.baseline, "w") as f:
+            f.write(report + "\n")
+        logger.info(f"Saved baseline to {args.baseline}")
+    elif os.path.exists(args.baseline):
+        with open(args.baseline, "r") as f:
+            baseline = json.load(f)
+        if baseline.get("config") != results["config"]:
+            logger.warning("Baseline was recorded with different settings; comparison is indicative only")
+        regressions = compare(results, baseline, args.tolerance)
+        for regression in regressions:
+            logger.error(f"❌ Regression: {regression}")
+        if regressions:
+            raise SystemExit(1)
+        logger.info(f"✅ No regressions beyond {args.tolerance:.0%} against {args.baseline}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+import time
+import argparse
+import tempfile
+import logging
+from typing import Dict, Any
+import numpy as np
+from local_index import LocalVectorIndex
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+def make_corpus(n: int, dimension: int, clusters: int, seed: int = 0):
+    """Clustered unit vectors, a rough stand-in for embeddings of related regulatory chunks"""
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((clusters, dimension)).astype(np.float32)
+    vectors = centers[rng.integers(0, clusters, n)] + 0.6 * rng.standard_normal((n, dimension)).astype(np.float32)
+    queries = vectors[rng.integers(0, n, 100)] + 0.4 * rng.standard_normal((100, dimension)).astype(np.float32)
+    return vectors, queries
+
+def build(vectors: np.ndarray, **kwargs) -> LocalVectorIndex:
+    index = LocalVectorIndex(dimension=vectors.shape[1], path=tempfile.mkdtemp(), ivf_min_size=10 ** 9, **kwargs)
+    for start in range(0, len(vectors), 10000):
+        block = vectors[start:start + 10000]
+        index.upsert([(f"v{start + i}", v) for i, v in enumerate(block)])
+    return index
+
+def run(name: str, index: LocalVectorIndex, queries: np.ndarray, k: int, truth=None) -> Dict[str, Any]:
+    index.query(queries[0], top_k=k)
+    start = time.perf_counter()
+    results = [[m.id for m in index.query(q, top_k=k).matches] for q in queries]
+    elapsed = (time.perf_counter() - start) / len(queries)
+    recall = 1.0 if truth is None else float(np.mean([len(set(r) & set(t)) / k for r, t in zip(results, truth)]))
+    return {"index": name, "ms_per_query": round(elapsed * 1000, 3),
+            "memory_mb": round(index.memory_bytes() / 2 ** 20, 1), f"recall@{k}": round(recall, 4)}, results
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare the exact and int8-quantized local index')
+    parser.add_argument('--vectors', type=int, default=50000)
+    parser.add_argument('--dimension', type=int, default=1536)
+    parser.add_argument('--clusters', type=int, default=500)
+    parser.add_argument('--k', type=int, default=10)
+    parser.add_argument('--rerank-factors', type=int, nargs='+', default=[1, 2, 4])
+    args = parser.parse_args()
+
+    vectors, queries = make_corpus(args.vectors, args.dimension, args.clusters)
+    stats, truth = run("float32 exact", build(vectors), queries, args.k)
+    logger.info(stats)
+    quantized = build(vectors, quantization="int8")
+    for factor in args.rerank_factors:
+        quantized.rerank_factor = factor
+        stats, _ = run(f"int8, re-rank {factor}x", quantized, queries, args.k, truth)
+        logger.info(stats)
+
+if __name__ == "__main__":
+    main()
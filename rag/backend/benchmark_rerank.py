@@ -0,0 +1,186 @@
+import os
+import re
+import time
+import tempfile
+import argparse
+import logging
+from typing import List, Dict, Any, Tuple, Optional
+
+# Throwaway local indexes; embeddings are hashed offline unless --embedder openai
+os.environ.setdefault("VECTOR_BACKEND", "local")
+os.environ.setdefault("EMBEDDING_CACHE_DIR", "")
+
+import numpy as np
+from token_chunker import TokenChunker
+from fake_services import hashed_embedding
+from embedding_client import EmbeddingClient
+from metrics import RERANK_FALLBACKS
+from reranker import Reranker, SCORERS
+from vector_store import VectorStore
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+DATASET_DIR = os.path.join(os.path.dirname(__file__), "dataset")
+
+# Questions about the dataset, each with a phrase only its answering passage contains
+JUDGED_QUESTIONS = [
+    ("How wide do fire exits need to be?", "width of fire exits"),
+    ("Which way should exit doors open?", "exit doors to open outwards"),
+    ("Where are automatic sprinklers required?", "automatic sprinkler systems in basements"),
+    ("What type of fire extinguishers are required?", "co2, abc type"),
+    ("What detectors must the fire alarm system have?", "smoke detectors and heat detectors"),
+    ("Are combustible building materials allowed?", "use of combustible materials"),
+    ("What does the national building code say about ramps?", "ramp specifications"),
+    ("Which structural safety topics does the building code cover?", "seismic zone considerations"),
+    ("What fire safety items are in the National Building Code?", "fire escape routes"),
+    ("What HVAC system does the National Cancer Institute use?", "hepa filters"),
+    ("What is the total area of the cancer institute?", "50,000 sq.m"),
+    ("What sustainability features does the cancer institute have?", "rainwater harvesting"),
+    ("What facade does the cancer institute have?", "double-glazed curtain wall"),
+    ("What is on the ground floor of the NMMC headquarters?", "main lobby with reception"),
+    ("How many people fit in the NMMC meeting rooms?", "4-seater, 8-seater"),
+    ("Where are the fire exits in the NMMC building?", "fire exits and stairwells on both ends"),
+    ("When is the NMMC headquarters handed over?", "project handover: month 24"),
+    ("How many construction workers are on the NMMC project?", "200 workers"),
+    ("What green building rating does the NMMC headquarters target?", "leed platinum"),
+    ("When does construction start at the Science Park?", "construction start: month 10"),
+    ("What happens during Science Park commissioning and handover?", "final inspections and defect rectification"),
+    ("Who is the client for the Science Park?", "navi mumbai development authority"),
+]
+
+
+def _normalize(text: str) -> str:
+    return re.sub(r"\s+", " ", text).lower()
+
+
+def load_chunks(dataset: str, chunk_tokens: int, overlap_tokens: int) -> List[Dict[str, Any]]:
+    """Small token chunks of every dataset text file, so several compete within each document"""
+    chunker = TokenChunker(chunk_tokens=chunk_tokens, overlap_tokens=overlap_tokens)
+    chunks = []
+    for root, dirs, files in os.walk(dataset):
+        dirs[:] = sorted(dirs)
+        for name in sorted(files):
+            if not name.endswith(".txt"):
+                continue
+            path = os.path.join(root, name)
+            with open(path, "r", encoding="utf-8") as f:
+                text = f.read()
+            source = os.path.relpath(path, dataset)
+            for i, content in enumerate(chunker.split_text(text)):
+                chunks.append({"content": content, "metadata": {"source": source, "chunk_index": i}})
+    return chunks
+
+
+class HashedEmbedder:
+    def __init__(self, dimension: int):
+        self.dimension = dimension
+
+    def get_embedding(self, text):
+        return hashed_embedding(text, self.dimension)
+
+    def get_embeddings(self, texts):
+        return [self.get_embedding(t) for t in texts]
+
+    async def aget_embedding(self, text):
+        return self.get_embedding(text)
+
+
+def build_store(chunks: List[Dict[str, Any]], embedder, dimension: int) -> VectorStore:
+    tmp = tempfile.mkdtemp()
+    os.environ["LOCAL_INDEX_PATH"] = os.path.join(tmp, "local_index")
+    os.environ["BM25_INDEX_PATH"] = os.path.join(tmp, "bm25")
+    os.environ["CHUNK_STORE_PATH"] = os.path.join(tmp, "segments")
+    os.environ["INDEX_GENERATION_PATH"] = os.path.join(tmp, "index.generation")
+    store = VectorStore()
+    store.dimension = dimension
+    store.reranker = None
+    store.initialize()
+    store.embedder = embedder
+    embeddings = embedder.get_embeddings([c["content"] for c in chunks])
+    store.add_documents([{**c, "embedding": e} for c, e in zip(chunks, embeddings)])
+    return store
+
+
+def judge(chunks: List[Dict[str, Any]]) -> List[Tuple[str, set]]:
+    """(question, IDs of the chunks containing its answer phrase), skipping phrases the chunker split"""
+    judged = []
+    for question, phrase in JUDGED_QUESTIONS:
+        relevant = {VectorStore.document_id(c, i) for i, c in enumerate(chunks)
+                    if phrase in _normalize(c["content"])}
+        if relevant:
+            judged.append((question, relevant))
+        else:
+            logger.warning(f"No chunk contains '{phrase}'; skipping '{question}'")
+    return judged
+
+
+def run(name: str, store: VectorStore, judged: List[Tuple[str, set]], limit: int,
+        repeat: int, reranker: Optional[Reranker]) -> Dict[str, Any]:
+    """Quality and per-query latency of one configuration; every query misses the result cache"""
+    store.reranker = reranker
+    fallbacks = RERANK_FALLBACKS.value(reason="budget")
+    latencies, reciprocal_ranks, hits = [], [], []
+    for _ in range(repeat):
+        for question, relevant in judged:
+            store.result_cache.bump_generation()
+            start = time.perf_counter()
+            results = store.query(question, limit=limit)
+            latencies.append(time.perf_counter() - start)
+            ranks = [rank for rank, r in enumerate(results, 1) if r["id"] in relevant]
+            reciprocal_ranks.append(1 / ranks[0] if ranks else 0.0)
+            hits.append(bool(ranks) and ranks[0] == 1)
+    latencies_ms = np.array(latencies) * 1000
+    return {
+        "config": name,
+        "hit@1": round(float(np.mean(hits)), 3),
+        f"mrr@{limit}": round(float(np.mean(reciprocal_ranks)), 3),
+        "ms_p50": round(float(np.percentile(latencies_ms, 50)), 3),
+        "ms_p95": round(float(np.percentile(latencies_ms, 95)), 3),
+        "budget_fallbacks": int(RERANK_FALLBACKS.value(reason="budget") - fallbacks),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Re-ranking quality against added latency on the dataset corpus')
+    parser.add_argument('--dataset', default=DATASET_DIR, help='Dataset directory')
+    parser.add_argument('--embedder', choices=["hashed", "openai"], default='hashed',
+                        help='"openai" embeds with the real API (needs OPENAI_API_KEY)')
+    parser.add_argument('--chunk-tokens', type=int, default=64)
+    parser.add_argument('--overlap-tokens', type=int, default=16)
+    parser.add_argument('--limit', type=int, default=5, help='Results per query')
+    parser.add_argument('--candidates', type=int, nargs='+', default=[10, 20, 40])
+    parser.add_argument('--budget-ms', type=float, default=50)
+    parser.add_argument('--scorers', nargs='+', default=list(SCORERS), choices=list(SCORERS))
+    parser.add_argument('--repeat', type=int, default=10, help='Passes over the questions')
+    args = parser.parse_args()
+
+    chunks = load_chunks(args.dataset, args.chunk_tokens, args.overlap_tokens)
+    if args.embedder == "openai":
+        embedder = EmbeddingClient()
+    else:
+        # The store still builds an OpenAI client on initialize; it is never called
+        os.environ.setdefault("OPENAI_API_KEY", "offline")
+        embedder = HashedEmbedder(1536)
+    store = build_store(chunks, embedder, 1536)
+    judged = judge(chunks)
+    logger.info(f"Corpus: {len(chunks)} chunks, {len(judged)} judged questions, {args.embedder} embeddings")
+
+    baseline = run("retrieval order", store, judged, args.limit, args.repeat, None)
+    logger.info(baseline)
+    for kind in args.scorers:
+        scorer = SCORERS[kind]()
+        try:
+            scorer.load()
+        except ImportError as e:
+            logger.warning(f"Skipping {kind}: {str(e)}")
+            continue
+        for candidates in args.candidates:
+            stats = run(f"{kind}, {candidates} candidates", store, judged, args.limit, args.repeat,
+                        Reranker(scorer, candidates=candidates, budget_ms=args.budget_ms))
+            stats["added_ms_p50"] = round(stats["ms_p50"] - baseline["ms_p50"], 3)
+            logger.info(stats)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,413 @@
+import os
+import re
+import json
+import math
+import uuid
+import threading
+from contextlib import contextmanager
+from collections import Counter
+from typing import List, Dict, Any, Optional, Tuple, Iterable
+import numpy as np
+import logging
+
+try:
+    import fcntl
+except ImportError:  # Windows: no cross-process locking
+    fcntl = None
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+DEFAULT_BM25_PATH = os.path.join(os.path.dirname(__file__), "cache", "bm25")
+
+# Clause references ("33(7)(a)"), dotted section numbers ("12.3.1"), plain numbers and words
+_TOKEN = re.compile(r"\d+(?:\.\d+)*(?:\([0-9a-z]+\))+|\d+(?:\.\d+)*|[a-z]+")
+STOPWORDS = frozenset(
+    "a an and are as at be by for from in is it of on or that the this to under what which with".split()
+)
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Lowercased terms for BM25.
+
+    A clause reference also yields each of its parents, so "33(7)(a)" is
+    indexed as "33(7)(a)", "33(7)" and "33" and a query for "Rule 33(7)"
+    matches its sub-clauses.
+    """
+    terms = []
+    for token in _TOKEN.findall(text.lower()):
+        if token in STOPWORDS:
+            continue
+        terms.append(token)
+        while "(" in token:
+            token = token[:token.rindex("(")]
+            terms.append(token)
+    return terms
+
+
+def matches_filter(metadata: Dict[str, Any], filter: Optional[Dict[str, Any]]) -> bool:
+    """Evaluate a Pinecone-style filter ($eq, $in, $and) against one chunk's metadata"""
+    if not filter:
+        return True
+    for field, condition in filter.items():
+        if field == "$and":
+            if not all(matches_filter(metadata, c) for c in condition):
+                return False
+            continue
+        if not isinstance(condition, dict):
+            condition = {"$eq": condition}
+        value = metadata.get(field)
+        values = value if isinstance(value, list) else [value]
+        for op, expected in condition.items():
+            if op == "$eq" and expected not in values:
+                return False
+            if op == "$in" and not any(v in expected for v in values):
+                return False
+            if op not in ("$eq", "$in"):
+                raise ValueError(f"Unsupported filter operator for BM25 index: {op}")
+    return True
+
+
+class BM25Index:
+    def __init__(self, path: Optional[str] = DEFAULT_BM25_PATH, k1: float = 1.5, b: float = 0.75,
+                 compact_min_entries: int = 1000):
+        """
+        In-process BM25 inverted index over chunk text.
+
+        Complements embedding similarity for exact identifiers (rule numbers,
+        clause references, act names) that ada-002 tends to blur. Chunks are
+        added and removed by ID alongside the vector index, so the index stays
+        in step incrementally.
+
+        On disk the index is a snapshot plus an append-only log of the adds and
+        removes since, both named by an epoch recorded in the 'epoch' file.
+        flush() appends only what changed, under a file lock, after replaying
+        entries other processes appended, so the BM25 changes of two writers
+        (the API and update_dataset.py) are merged rather than overwritten.
+        LocalVectorIndex.flush() merges the vector index the same way. Once the
+        log outgrows the snapshot it is folded into a new snapshot under a new
+        epoch.
+
+        Each chunk owns a row; a term's postings are compiled on first use
+        into (rows, term frequencies) arrays, so a query scores every
+        matching chunk with a few numpy operations per term.
+
+        Args:
+            path: Directory the index is persisted to; None keeps it in memory only
+            k1: Term-frequency saturation
+            b: Document-length normalisation
+            compact_min_entries: Log entries kept before the log may be folded into a snapshot
+        """
+        self.path = path
+        self.k1 = k1
+        self.b = b
+        self.compact_min_entries = compact_min_entries
+
+        # id -> {"content", "metadata", "tf": {term: count}, "row"}
+        self._docs: Dict[str, Dict[str, Any]] = {}
+        # term -> {row: term frequency}, plus its compiled arrays (dropped when the term changes)
+        self._postings: Dict[str, Dict[int, int]] = {}
+        self._compiled: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}
+        self._row_ids: List[Optional[str]] = []
+        self._free_rows: List[int] = []
+        self._lengths = np.zeros(0, dtype=np.float32)
+        self._total_length = 0
+        self._lock = threading.RLock()
+
+        # Persistence: the epoch on disk this index reflects, how far into its log it has
+        # read, and the log entries for changes made here since the last flush
+        self._epoch: Optional[str] = None
+        self._log_offset = 0
+        self._log_entries = 0
+        self._pending: List[Dict[str, Any]] = []
+
+        if self.path:
+            self.refresh()
+
+    def __len__(self) -> int:
+        return len(self._docs)
+
+    def _file(self, name: str) -> str:
+        return os.path.join(self.path, name)
+
+    @contextmanager
+    def _file_lock(self, mode: int):
+        """Lock shared between processes using this directory"""
+        os.makedirs(self.path, exist_ok=True)
+        with open(self._file("index.lock"), "a") as lock:
+            if fcntl is not None:
+                fcntl.flock(lock, mode)
+            yield
+
+    def _read_epoch(self) -> Optional[str]:
+        try:
+            with open(self._file("epoch"), "r") as f:
+                return f.read().strip() or None
+        except FileNotFoundError:
+            return None
+
+    def refresh(self) -> int:
+        """
+        Catch up with what other processes flushed: replay their new log entries,
+        or reload from the snapshot if the log was compacted since.
+
+        Returns:
+            Number of log entries applied
+        """
+        if not self.path:
+            return 0
+        with self._lock, self._file_lock(fcntl.LOCK_SH if fcntl else 0):
+            return self._catch_up()
+
+    def _catch_up(self) -> int:
+        # Caller holds both locks
+        epoch = self._read_epoch()
+        if epoch is None or epoch != self._epoch:
+            self._reset()
+            self._epoch = epoch
+            self._load_snapshot()
+        return self._replay_log()
+
+    def _load_snapshot(self):
+        if self._epoch is None:
+            # Written before the log existed: a single index.json, folded into a snapshot on flush
+            legacy = self._file("index.json")
+            if os.path.exists(legacy):
+                with open(legacy, "r") as f:
+                    docs = json.load(f)
+                for id_, doc in docs.items():
+                    self._insert(id_, doc["content"], doc["metadata"], Counter(doc["tf"]))
+                logger.info(f"Loaded BM25 index with {len(self._docs)} chunks from {self.path}")
+            return
+        with open(self._file(f"snapshot.{self._epoch}.json"), "r") as f:
+            docs = json.load(f)
+        for id_, doc in docs.items():
+            self._insert(id_, doc["content"], doc["metadata"], Counter(doc["tf"]))
+        logger.info(f"Loaded BM25 index with {len(self._docs)} chunks from {self.path}")
+
+    def _replay_log(self) -> int:
+        if self._epoch is None:
+            return 0
+        try:
+            with open(self._file(f"log.{self._epoch}.jsonl"), "r") as f:
+                f.seek(self._log_offset)
+                lines = f.readlines()
+                self._log_offset = f.tell()
+        except FileNotFoundError:
+            return 0
+        for line in lines:
+            self._apply(json.loads(line))
+        self._log_entries += len(lines)
+        return len(lines)
+
+    def _apply(self, entry: Dict[str, Any]):
+        """Apply one log entry without logging it again"""
+        if entry["op"] == "add":
+            self._delete(entry["id"])
+            self._insert(entry["id"], entry["content"], entry["metadata"], Counter(entry["tf"]))
+        elif entry["op"] == "remove":
+            self._delete(entry["id"])
+        elif entry["op"] == "clear":
+            self._reset()
+
+    def flush(self):
+        """Append the changes made since the last flush to the on-disk log"""
+        if not self.path:
+            return
+        with self._lock, self._file_lock(fcntl.LOCK_EX if fcntl else 0):
+            pending, self._pending = self._pending, []
+            # Entries other writers appended come first in the log, so apply them before
+            # re-applying ours; every process then replays the same order
+            self._catch_up()
+            for entry in pending:
+                self._apply(entry)
+            if self._epoch is None or (self._log_entries + len(pending) > self.compact_min_entries
+                                       and self._log_entries + len(pending) > len(self._docs)):
+                self._compact()
+            elif pending:
+                with open(self._file(f"log.{self._epoch}.jsonl"), "a") as f:
+                    f.write("".join(json.dumps(entry) + "\n" for entry in pending))
+                    self._log_offset = f.tell()
+                self._log_entries += len(pending)
+
+    def _compact(self):
+        """Fold the log into a new snapshot under a new epoch (caller holds both locks)"""
+        old_epoch, epoch = self._epoch, uuid.uuid4().hex
+        tmp_path = self._file(f"snapshot.{epoch}.json.tmp")
+        with open(tmp_path, "w") as f:
+            json.dump({id_: {"content": d["content"], "metadata": d["metadata"], "tf": d["tf"]}
+                       for id_, d in self._docs.items()}, f)
+        os.replace(tmp_path, self._file(f"snapshot.{epoch}.json"))
+        tmp_path = self._file("epoch.tmp")
+        with open(tmp_path, "w") as f:
+            f.write(epoch)
+        os.replace(tmp_path, self._file("epoch"))
+        self._epoch, self._log_offset, self._log_entries = epoch, 0, 0
+
+        # Readers load under the shared lock, so nobody is reading the old files now
+        old_files = ["index.json"] if old_epoch is None else [f"snapshot.{old_epoch}.json", f"log.{old_epoch}.jsonl"]
+        for name in old_files:
+            try:
+                os.remove(self._file(name))
+            except FileNotFoundError:
+                pass
+
+    def _insert(self, id_: str, content: str, metadata: Dict[str, Any], tf: Counter):
+        if self._free_rows:
+            row = self._free_rows.pop()
+            self._row_ids[row] = id_
+        else:
+            row = len(self._row_ids)
+            self._row_ids.append(id_)
+            if row >= len(self._lengths):
+                lengths = np.zeros(max(1024, 2 * len(self._lengths)), dtype=np.float32)
+                lengths[:len(self._lengths)] = self._lengths
+                self._lengths = lengths
+        length = sum(tf.values())
+        self._lengths[row] = length
+        self._total_length += length
+        self._docs[id_] = {"content": content, "metadata": metadata, "tf": dict(tf), "row": row}
+        for term, count in tf.items():
+            self._postings.setdefault(term, {})[row] = count
+            self._compiled.pop(term, None)
+
+    def add(self, ids: List[str], contents: List[str], metadatas: List[Dict[str, Any]]) -> int:
+        """
+        Index chunks, replacing any already indexed under the same ID.
+
+        Returns:
+            Number of chunks whose indexed content or metadata changed
+        """
+        changed = 0
+        with self._lock:
+            for id_, content, metadata in zip(ids, contents, metadatas):
+                existing = self._docs.get(id_)
+                if existing is not None:
+                    if existing["content"] == content and existing["metadata"] == metadata:
+                        continue
+                    self._delete(id_)
+                tf = Counter(tokenize(content))
+                self._insert(id_, content, metadata, tf)
+                self._log({"op": "add", "id": id_, "content": content, "metadata": metadata, "tf": dict(tf)})
+                changed += 1
+        return changed
+
+    def remove(self, ids: Iterable[str]):
+        with self._lock:
+            for id_ in ids:
+                # Logged even if unknown here: another process may have added it since our last refresh
+                self._delete(id_)
+                self._log({"op": "remove", "id": id_})
+
+    def _log(self, entry: Dict[str, Any]):
+        if self.path:
+            self._pending.append(entry)
+
+    def _delete(self, id_: str) -> bool:
+        doc = self._docs.pop(id_, None)
+        if doc is None:
+            return False
+        row = doc["row"]
+        self._total_length -= int(self._lengths[row])
+        self._lengths[row] = 0
+        self._row_ids[row] = None
+        self._free_rows.append(row)
+        for term in doc["tf"]:
+            postings = self._postings.get(term)
+            if postings is not None:
+                postings.pop(row, None)
+                self._compiled.pop(term, None)
+                if not postings:
+                    del self._postings[term]
+        return True
+
+    def clear(self):
+        with self._lock:
+            self._reset()
+            self._pending = []
+            self._log({"op": "clear"})
+
+    def _reset(self):
+        self._docs, self._postings, self._compiled = {}, {}, {}
+        self._row_ids, self._free_rows = [], []
+        self._lengths = np.zeros(0, dtype=np.float32)
+        self._total_length = 0
+
+    def get(self, id_: str) -> Optional[Dict[str, Any]]:
+        """Stored content and metadata for a chunk"""
+        doc = self._docs.get(id_)
+        return None if doc is None else {"content": doc["content"], "metadata": doc["metadata"]}
+
+    def _term_arrays(self, term: str) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+        compiled = self._compiled.get(term)
+        if compiled is None:
+            postings = self._postings.get(term)
+            if not postings:
+                return None
+            compiled = (np.fromiter(postings.keys(), dtype=np.int64, count=len(postings)),
+                        np.fromiter(postings.values(), dtype=np.float32, count=len(postings)))
+            self._compiled[term] = compiled
+        return compiled
+
+    def search(self, query: str, top_k: int = 20,
+               filter: Optional[Dict[str, Any]] = None) -> List[Tuple[str, float]]:
+        """
+        Top chunks by BM25 score.
+
+        Args:
+            query: Query text
+            top_k: Maximum results
+            filter: Optional Pinecone-style metadata filter
+
+        Returns:
+            (id, score) pairs, best first
+        """
+        terms = set(tokenize(query))
+        with self._lock:
+            n = len(self._docs)
+            if n == 0 or not terms:
+                return []
+            rows_used = len(self._row_ids)
+            # Per-row length normalisation, shared by every term
+            norm = self.k1 * (1 - self.b + self.b * self._lengths[:rows_used] / (self._total_length / n))
+            scores = np.zeros(rows_used, dtype=np.float32)
+            for term in terms:
+                arrays = self._term_arrays(term)
+                if arrays is None:
+                    continue
+                rows, tfs = arrays
+                idf = math.log(1 + (n - len(rows) + 0.5) / (len(rows) + 0.5))
+                scores[rows] += idf * tfs * (self.k1 + 1) / (tfs + norm[rows])
+
+            candidates = np.flatnonzero(scores)
+            if not filter and len(candidates) > top_k:
+                candidates = candidates[np.argpartition(-scores[candidates], top_k - 1)[:top_k]]
+            candidates = candidates[np.argsort(-scores[candidates], kind="stable")]
+
+            results = []
+            for row in candidates.tolist():
+                id_ = self._row_ids[row]
+                if filter and not matches_filter(self._docs[id_]["metadata"], filter):
+                    continue
+                results.append((id_, float(scores[row])))
+                if len(results) >= top_k:
+                    break
+            return results
+
+
+def reciprocal_rank_fusion(ranked_lists: List[List[str]], k: int = 60) -> List[Tuple[str, float]]:
+    """
+    Merge ranked ID lists by reciprocal rank fusion.
+
+    Each list contributes 1 / (k + rank) per ID, so IDs ranked well by
+    several retrievers rise to the top without comparing raw scores.
+
+    Returns:
+        (id, fused score) pairs, best first
+    """
+    fused: Dict[str, float] = {}
+    for ranked in ranked_lists:
+        for rank, id_ in enumerate(ranked, 1):
+            fused[id_] = fused.get(id_, 0.0) + 1.0 / (k + rank)
+    return sorted(fused.items(), key=lambda item: item[1], reverse=True)
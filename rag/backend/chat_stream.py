@@ -0,0 +1,65 @@
+import json
+from typing import List, Dict, Any, AsyncIterator, Optional
+from llm_client import build_messages
+from metrics import span
+import logging
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+NO_RESULTS_MESSAGE = "I couldn't find relevant information in the documents."
+
+
+def format_sse(event: str, data: Any) -> str:
+    """Encode one Server-Sent Event with a JSON payload"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+def format_sources(results: List[Dict[str, Any]], limit: int = 3) -> List[Dict[str, Any]]:
+    """Source citations for the top results, in the order they are numbered in the prompt"""
+    return [
+        {
+            "index": i,
+            "source": r["metadata"].get("source"),
+            "page_number": r["metadata"].get("page_number"),
+            "score": r["score"],
+        }
+        for i, r in enumerate(results[:limit], 1)
+    ]
+
+
+async def chat_events(message: str, vector_store, llm, limit: int = 5,
+                      filters: Optional[Dict[str, Any]] = None) -> AsyncIterator[str]:
+    """
+    Answer a chat message as a stream of Server-Sent Events.
+
+    Retrieval runs first and its sources are sent before any generation
+    starts, so the first byte goes out as soon as retrieval finishes. Each
+    generated token follows as its own event, then a final 'done' event.
+
+    Args:
+        message: User question
+        vector_store: Initialised VectorStore
+        llm: LLMClient or FakeLLMClient
+        limit: Passages retrieved as context
+        filters: Optional metadata filters
+
+    Yields:
+        'sources', 'token', 'done' or 'error' events
+    """
+    try:
+        results = await vector_store.aquery(message, limit=limit, filters=filters)
+        with span("serialize"):
+            sources = format_sse("sources", {"sources": format_sources(results)})
+        yield sources
+
+        if not results:
+            yield format_sse("token", {"token": NO_RESULTS_MESSAGE})
+        else:
+            async for token in llm.astream(build_messages(message, results)):
+                yield format_sse("token", {"token": token})
+        yield format_sse("done", {})
+    except Exception as e:
+        # Headers are already sent, so report the failure in-band
+        logger.error(f"Error streaming chat response: {str(e)}")
+        yield format_sse("error", {"detail": str(e)})
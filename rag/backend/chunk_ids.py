@@ -0,0 +1,31 @@
+import os
+import hashlib
+from typing import Dict, Any
+
+
+def content_hash(content: str) -> str:
+    """SHA-256 of chunk text"""
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+
+def make_chunk_id(source: str, chunk_index: int, content: str) -> str:
+    """
+    Vector ID for a chunk, derived from where it came from and what it says.
+
+    The same chunk always gets the same ID, so re-ingesting is an idempotent
+    upsert, and an ID that already exists in the index means its content is
+    unchanged and needs neither re-embedding nor re-upserting.
+    """
+    source_digest = hashlib.sha256(os.path.normpath(source).encode("utf-8")).hexdigest()[:16]
+    return f"{source_digest}_{chunk_index}_{content_hash(content)[:16]}"
+
+
+def document_id(doc: Dict[str, Any], position: int = 0) -> str:
+    """
+    Vector ID for a document dict: its explicit 'id', else its chunk's 'chunk_id',
+    else the stable ID from its source, chunk index (position if it has none) and content.
+    """
+    metadata = doc.get("metadata", {})
+    return doc.get("id") or metadata.get("chunk_id") or make_chunk_id(
+        metadata.get("source", ""), metadata.get("chunk_index", position), doc["content"]
+    )
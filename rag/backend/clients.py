@@ -0,0 +1,154 @@
+import os
+import threading
+from typing import Dict, Any, Optional
+import httpx
+from config import load_config
+from dotenv import load_dotenv
+import logging
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class ClientRegistry:
+    def __init__(self, settings: Optional[Dict[str, Any]] = None):
+        """
+        Process-wide API clients shared by VectorStore, PineconeClient,
+        EmbeddingClient, LLMClient and the LangChain wrappers.
+
+        Every OpenAI client is built on one keep-alive httpx connection pool
+        (one for sync, one for async callers), and the Pinecone control-plane
+        client and index handles are created once, so repeated request paths
+        reuse sockets instead of repeating TLS handshakes. Clients are created
+        on first use; close()/aclose() release the pools.
+
+        The async clients bind their connections to the event loop that first
+        uses them, which for the API is the server's loop.
+
+        Args:
+            settings: Pool and timeout settings; defaults to the 'api' section of config.yaml
+        """
+        load_dotenv()
+        settings = settings if settings is not None else load_config().get("api", {})
+        self.timeout = float(settings.get("timeout", 30))
+        self.max_connections = int(settings.get("max_connections", 20))
+        self.max_keepalive_connections = int(settings.get("max_keepalive_connections", 10))
+        self.keepalive_expiry = float(settings.get("keepalive_expiry", 30))
+        self.pinecone_pool_threads = int(settings.get("pinecone_pool_threads", 4))
+
+        self._clients: Dict[str, Any] = {}
+        self._indexes: Dict[str, Any] = {}
+        self._lock = threading.RLock()
+
+    def _limits(self) -> httpx.Limits:
+        return httpx.Limits(
+            max_connections=self.max_connections,
+            max_keepalive_connections=self.max_keepalive_connections,
+            keepalive_expiry=self.keepalive_expiry
+        )
+
+    def _get(self, name: str, factory):
+        """Return the named client, creating it once under the lock"""
+        client = self._clients.get(name)
+        if client is None:
+            with self._lock:
+                client = self._clients.get(name)
+                if client is None:
+                    client = factory()
+                    self._clients[name] = client
+                    logger.info(f"Created shared {name} client")
+        return client
+
+    @property
+    def http_client(self) -> httpx.Client:
+        return self._get("http", lambda: httpx.Client(limits=self._limits(), timeout=self.timeout))
+
+    @property
+    def async_http_client(self) -> httpx.AsyncClient:
+        return self._get("async_http", lambda: httpx.AsyncClient(limits=self._limits(), timeout=self.timeout))
+
+    @property
+    def openai(self):
+        from openai import OpenAI
+        return self._get("openai", lambda: OpenAI(
+            api_key=os.getenv("OPENAI_API_KEY"),
+            timeout=self.timeout,
+            http_client=self.http_client
+        ))
+
+    @property
+    def async_openai(self):
+        from openai import AsyncOpenAI
+        return self._get("async_openai", lambda: AsyncOpenAI(
+            api_key=os.getenv("OPENAI_API_KEY"),
+            timeout=self.timeout,
+            http_client=self.async_http_client
+        ))
+
+    @property
+    def embeddings(self):
+        """LangChain OpenAIEmbeddings on the shared OpenAI clients"""
+        from langchain_openai import OpenAIEmbeddings
+        return self._get("langchain_embeddings", lambda: OpenAIEmbeddings(
+            client=self.openai.embeddings,
+            async_client=self.async_openai.embeddings,
+            request_timeout=self.timeout
+        ))
+
+    @property
+    def pinecone(self):
+        from pinecone import Pinecone
+
+        def create():
+            client = Pinecone(api_key=os.getenv("PINECONE_API_KEY"), pool_threads=self.pinecone_pool_threads)
+            # Size the urllib3 pool behind every index handle to match the thread pool
+            client.openapi_config.connection_pool_maxsize = max(self.max_connections, self.pinecone_pool_threads)
+            return client
+        return self._get("pinecone", create)
+
+    def pinecone_index(self, name: str):
+        """Shared handle for a Pinecone index (resolves the index host once)"""
+        index = self._indexes.get(name)
+        if index is None:
+            with self._lock:
+                index = self._indexes.get(name)
+                if index is None:
+                    index = self.pinecone.Index(name)
+                    self._indexes[name] = index
+        return index
+
+    def close(self):
+        """Close the sync connection pools and forget every client"""
+        with self._lock:
+            http = self._clients.get("http")
+            if http is not None:
+                http.close()
+            for name, index in self._indexes.items():
+                try:
+                    # Leaving an index handle's context closes its connection pool
+                    index.__exit__(None, None, None)
+                except OSError as e:
+                    logger.warning(f"Failed to close Pinecone index {name}: {str(e)}")
+            self._clients.clear()
+            self._indexes.clear()
+
+    async def aclose(self):
+        """Close the async connection pool, then the sync ones"""
+        async_http = self._clients.get("async_http")
+        if async_http is not None:
+            await async_http.aclose()
+        self.close()
+
+
+_default_registry: Optional[ClientRegistry] = None
+_default_lock = threading.Lock()
+
+
+def get_clients() -> ClientRegistry:
+    """Return the process-wide client registry"""
+    global _default_registry
+    if _default_registry is None:
+        with _default_lock:
+            if _default_registry is None:
+                _default_registry = ClientRegistry()
+    return _default_registry
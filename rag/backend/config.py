@@ -0,0 +1,32 @@
+import os
+from functools import lru_cache
+from typing import Dict, Any, List
+import yaml
+import logging
+
+logger = logging.getLogger(__name__)
+
+CONFIG_PATH = os.getenv(
+    "RAG_CONFIG_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "config.yaml")
+)
+
+# Metadata every chunk gets from DocumentProcessor, independent of config.yaml
+BASE_FILTER_FIELDS = ["category", "subcategory", "file_type"]
+
+
+@lru_cache(maxsize=1)
+def load_config() -> Dict[str, Any]:
+    """Load the shared RAG configuration (config.yaml at the repository root)"""
+    if not os.path.exists(CONFIG_PATH):
+        logger.warning(f"Config file not found at {CONFIG_PATH}, using defaults")
+        return {}
+    with open(CONFIG_PATH, "r") as f:
+        return yaml.safe_load(f) or {}
+
+
+def filterable_fields() -> List[str]:
+    """Metadata fields stored with each vector and accepted as search filters"""
+    return BASE_FILTER_FIELDS + [
+        field for field in load_config().get("metadata_fields", []) if field not in BASE_FILTER_FIELDS
+    ]
@@ -0,0 +1,123 @@
+import asyncio
+import threading
+import pytest
+from typing import List, Optional, Callable
+
+from fake_services import hashed_embedding
+
+# Longest a gated embedder holds a call, so a failing test doesn't leave a worker thread waiting forever
+GATE_TIMEOUT = 5.0
+
+
+class FakeEmbedder:
+    def __init__(self, dimension: int,
+                 embed: Optional[Callable[[str], List[float]]] = None,
+                 gate: Optional[threading.Event] = None,
+                 delay: float = 0.0):
+        """
+        Embedder stand-in for VectorStore.embedder that never calls the API.
+
+        Args:
+            dimension: Embedding dimensions
+            embed: Embedding for one text (defaults to hashed_embedding)
+            gate: get_embeddings waits on it before answering, to hold a job mid-embedding
+            delay: Seconds each aget_embedding call takes
+        """
+        self.embed = embed or (lambda text: hashed_embedding(text, dimension))
+        self.gate = gate
+        self.delay = delay
+        self.embedded = 0
+        self.calls = 0
+        self.texts: List[str] = []
+        self.in_flight = 0
+        self.peak = 0
+        self._lock = threading.Lock()
+
+    def get_embedding(self, text: str) -> List[float]:
+        return self.embed(text)
+
+    def get_embeddings(self, texts: List[str]) -> List[List[float]]:
+        with self._lock:
+            self.calls += 1
+            self.embedded += len(texts)
+            self.texts.extend(texts)
+        if self.gate is not None:
+            self.gate.wait(GATE_TIMEOUT)
+        return [self.embed(t) for t in texts]
+
+    async def aget_embedding(self, text: str) -> List[float]:
+        # Tracks how many embeddings were awaited at once
+        self.in_flight += 1
+        self.peak = max(self.peak, self.in_flight)
+        try:
+            if self.delay:
+                await asyncio.sleep(self.delay)
+            return self.embed(text)
+        finally:
+            self.in_flight -= 1
+
+    async def aget_embeddings(self, texts: List[str]) -> List[List[float]]:
+        return self.get_embeddings(texts)
+
+
+@pytest.fixture(autouse=True)
+def offline_env(monkeypatch, tmp_path):
+    """Local backend, fake LLM, no API key and every on-disk index under the test's tmp_path"""
+    monkeypatch.setenv("VECTOR_BACKEND", "local")
+    monkeypatch.setenv("OPENAI_API_KEY", "test")
+    monkeypatch.setenv("LLM_BACKEND", "fake")
+    monkeypatch.setenv("EMBEDDING_CACHE_DIR", "")
+    monkeypatch.setenv("LOCAL_INDEX_PATH", str(tmp_path / "local_index"))
+    monkeypatch.setenv("BM25_INDEX_PATH", str(tmp_path / "bm25"))
+    monkeypatch.setenv("INDEX_GENERATION_PATH", str(tmp_path / "index.generation"))
+    monkeypatch.setenv("UPLOAD_SPOOL_DIR", str(tmp_path / "uploads"))
+    monkeypatch.setenv("CHUNK_STORE_PATH", "")
+    monkeypatch.delenv("INDEX_READ_ONLY", raising=False)
+    monkeypatch.delenv("LOCAL_INDEX_QUANTIZATION", raising=False)
+
+
+@pytest.fixture
+def fake_embedder():
+    """The FakeEmbedder class, for tests that build their own"""
+    return FakeEmbedder
+
+
+@pytest.fixture
+def make_store(monkeypatch, tmp_path):
+    """
+    Factory for an initialized local VectorStore with a FakeEmbedder.
+
+    Stores made with the same root share their index directories, like
+    processes sharing a deployment; give each its own root to keep them apart.
+    """
+    from vector_store import VectorStore
+
+    def make(dimension: int = 32, embedder=None, root=None, read_only: bool = False,
+             chunk_store: bool = False, **env):
+        root = root or tmp_path
+        monkeypatch.setenv("LOCAL_INDEX_PATH", str(root / "local_index"))
+        monkeypatch.setenv("BM25_INDEX_PATH", str(root / "bm25"))
+        monkeypatch.setenv("INDEX_GENERATION_PATH", str(root / "index.generation"))
+        monkeypatch.setenv("CHUNK_STORE_PATH", str(root / "segments") if chunk_store else "")
+        monkeypatch.setenv("INDEX_READ_ONLY", "1" if read_only else "")
+        for name, value in env.items():
+            monkeypatch.setenv(name, value)
+        store = VectorStore()
+        store.dimension = dimension
+        store.initialize()
+        store.embedder = embedder or FakeEmbedder(dimension)
+        monkeypatch.setenv("INDEX_READ_ONLY", "")
+        return store
+
+    return make
+
+
+@pytest.fixture
+def make_processor(make_store):
+    """Factory for a DatasetProcessor over make_store(); keyword arguments go to DatasetProcessor"""
+    from dataset_processor import DatasetProcessor
+
+    def make(store=None, **kwargs):
+        return DatasetProcessor(vector_store=store or make_store(), **kwargs)
+
+    return make
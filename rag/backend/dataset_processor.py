@@ -1,7 +1,13 @@
 from document_processor import DocumentProcessor
 from vector_store import VectorStore
+from metrics import span
 import os
-from typing import List, Dict, Any, Optional
+import json
+import queue
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from typing import List, Dict, Any, Optional, Iterator, Tuple
 from langchain.schema import Document
 import logging
 from pathlib import Path
@@ -9,18 +15,106 @@ from pathlib import Path
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+SUPPORTED_EXTENSIONS = ('.pdf', '.txt', '.md')
+
+# Marks the end of a stage's output on a pipeline queue
+_DONE = object()
+
+# Chunks a parser process sends per message when streaming a file to index_files
+STREAM_BATCH_SIZE = 32
+
+# Parser processes are spawned, not forked: index_files starts its embed and upsert
+# threads before the pool starts its workers, and a fork taken while other threads
+# hold locks can deadlock the child
+_MP_CONTEXT = multiprocessing.get_context("spawn")
+
+# One DocumentProcessor per parser process, created on first use
+_worker_processor: Optional[DocumentProcessor] = None
+# Queue a streaming parser process sends chunks through, set when the process starts
+_worker_stream = None
+
+def _parse_pool(workers: int, stream=None) -> ProcessPoolExecutor:
+    """Process pool for parsing; with stream, workers can run _stream_local_file"""
+    return ProcessPoolExecutor(max_workers=workers, mp_context=_MP_CONTEXT,
+                               initializer=_init_stream_worker if stream is not None else None,
+                               initargs=(stream,) if stream is not None else ())
+
+def _init_stream_worker(stream):
+    global _worker_stream
+    _worker_stream = stream
+
+def _get_worker_processor() -> DocumentProcessor:
+    global _worker_processor
+    if _worker_processor is None:
+        _worker_processor = DocumentProcessor()
+    return _worker_processor
+
+def _parse_local_file(file_path: str) -> List[Document]:
+    """Parse and chunk one local file inside a parser process"""
+    if file_path.lower().endswith('.pdf'):
+        return _get_worker_processor().process_pdf(file_path)
+    return _get_worker_processor().process_text(file_path)
+
+def _stream_local_file(file_path: str):
+    """
+    Parse and chunk one local file inside a parser process, sending its chunks
+    to the parent in small batches as they are produced (PDFs page by page).
+    Always ends with (file_path, None, error message or None).
+    """
+    error = None
+    try:
+        processor = _get_worker_processor()
+        if file_path.lower().endswith('.pdf'):
+            chunks = processor.process_pdf(file_path, stream=True)
+        else:
+            chunks = iter(processor.process_text(file_path))
+        batch: List[Document] = []
+        for chunk in chunks:
+            batch.append(chunk)
+            if len(batch) >= STREAM_BATCH_SIZE:
+                _worker_stream.put((file_path, batch, None))
+                batch = []
+        if batch:
+            _worker_stream.put((file_path, batch, None))
+    except Exception as e:
+        error = str(e)
+    _worker_stream.put((file_path, None, error))
+
 class DatasetProcessor:
-    def __init__(self, cloud_config: Optional[Dict[str, Any]] = None):
+    def __init__(self,
+                 cloud_config: Optional[Dict[str, Any]] = None,
+                 parse_workers: Optional[int] = None,
+                 embed_workers: int = 2,
+                 queue_size: int = 8,
+                 download_workers: int = 8,
+                 vector_store: Optional[VectorStore] = None):
+        """
+        Args:
+            cloud_config: Cloud storage credentials, keyed by provider
+            parse_workers: Processes used to parse and chunk files (defaults to CPU count)
+            embed_workers: Threads issuing embedding requests during index_dataset
+            queue_size: Batches buffered between pipeline stages before upstream stages block
+            download_workers: Threads fetching and parsing cloud objects concurrently
+            vector_store: VectorStore to index into; pass the application's own to share it
+        """
         self.processor = DocumentProcessor(cloud_config)
         self.cloud_config = cloud_config
-        self.vector_store = VectorStore()
+        self.vector_store = vector_store or VectorStore()
         self.dataset_path = os.path.join(os.path.dirname(__file__), "dataset")
+        self.parse_workers = parse_workers or os.cpu_count() or 1
+        self.embed_workers = embed_workers
+        self.queue_size = queue_size
+        self.download_workers = download_workers
+        self.etag_manifest_path = os.path.join(self.dataset_path, "processed", "metadata", "cloud_etags.json")
+        # Fetched cloud objects' (manifest key, ETag, produced chunks), by object key; saved once indexed
+        self.pending_etags: Dict[str, Tuple[str, str, bool]] = {}
         
     def initialize(self):
         """Initialize the vector store"""
         self.vector_store.initialize()
         
-    def process_dataset(self, dataset_path: str, is_cloud: bool = False, cloud_type: Optional[str] = None) -> List[Dict[str, Any]]:
+    def process_dataset(self, dataset_path: Optional[str] = None, is_cloud: bool = False, cloud_type: Optional[str] = None,
+                        skip_unchanged: bool = False) -> List[Dict[str, Any]]:
         """
         Process all documents in a dataset, either local or cloud
         
@@ -28,87 +122,341 @@ class DatasetProcessor:
             dataset_path: Path to dataset (local path or cloud path)
             is_cloud: Whether the dataset is in cloud storage
             cloud_type: Type of cloud storage ('aws', 'gcp', 'azure', 'dropbox', 'gdrive')
+            skip_unchanged: Skip cloud objects whose ETag matches the last processed version
         """
+        dataset_path = dataset_path or self.dataset_path
         processed_docs = []
         
         if is_cloud and cloud_type:
             # Process cloud dataset
-            processed_docs.extend(self._process_cloud_dataset(dataset_path, cloud_type))
+            processed_docs.extend(self._process_cloud_dataset(dataset_path, cloud_type, skip_unchanged))
         else:
             # Process local dataset
             processed_docs.extend(self._process_local_dataset(dataset_path))
             
         return processed_docs
 
+    def list_local_files(self, dataset_path: str) -> List[str]:
+        """All supported files under a local dataset directory"""
+        file_paths = []
+        for root, dirs, files in os.walk(dataset_path):
+            # dataset/processed holds bookkeeping such as the update manifest, not documents
+            dirs[:] = sorted(d for d in dirs if d != "processed")
+            file_paths.extend(
+                os.path.join(root, file)
+                for file in sorted(files)
+                if file.lower().endswith(SUPPORTED_EXTENSIONS)
+            )
+        return file_paths
+
     def _process_local_dataset(self, dataset_path: str) -> List[Dict[str, Any]]:
-        """Process all documents in a local dataset directory"""
-        processed_docs = []
+        """Process all documents in a local dataset directory, parsing files in parallel"""
+        file_paths = self.list_local_files(dataset_path)
+        results: Dict[str, List[Document]] = {}
         
-        for root, _, files in os.walk(dataset_path):
-            for file in files:
-                file_path = os.path.join(root, file)
+        with _parse_pool(self.parse_workers) as pool:
+            futures = {pool.submit(_parse_local_file, path): path for path in file_paths}
+            for future in as_completed(futures):
+                file_path = futures[future]
                 try:
-                    if file.lower().endswith('.pdf'):
-                        docs = self.processor.process_pdf(file_path)
-                    elif file.lower().endswith(('.txt', '.md')):
-                        docs = self.processor.process_text(file_path)
-                    else:
-                        continue
-                        
-                    processed_docs.extend(docs)
+                    results[file_path] = future.result()
                 except Exception as e:
                     print(f"Error processing {file_path}: {str(e)}")
-                    
+        
+        # Keep the deterministic walk order regardless of completion order
+        processed_docs = []
+        for file_path in file_paths:
+            processed_docs.extend(results.get(file_path, []))
         return processed_docs
 
-    def _process_cloud_dataset(self, dataset_path: str, cloud_type: str) -> List[Dict[str, Any]]:
-        """Process all documents in a cloud dataset directory"""
-        processed_docs = []
-        
-        # Get list of files from cloud storage
+    def index_dataset(self, dataset_path: Optional[str] = None, batch_size: int = 100) -> int:
+        """
+        Parse, embed and upsert every file in a local dataset.
+
+        Args:
+            dataset_path: Local dataset directory (defaults to the bundled dataset)
+            batch_size: Chunks per embedding request and per upsert
+
+        Returns:
+            Number of chunks upserted
+        """
+        dataset_path = dataset_path or self.dataset_path
+        chunk_ids = self.index_files(self.list_local_files(dataset_path), batch_size)
+        total = sum(len(ids) for ids in chunk_ids.values())
+        logger.info(f"Indexed {total} chunks from {dataset_path}")
+        return total
+
+    def index_files(self, file_paths: List[str], batch_size: int = 100) -> Dict[str, List[str]]:
+        """
+        Parse, embed and upsert local files as an overlapping pipeline.
+
+        Files are parsed in a process pool that streams each file's chunks as
+        they are produced (PDFs page by page); chunks flow through a bounded
+        queue to embedding threads, whose batches flow through a second bounded
+        queue to a single upsert thread. A full queue blocks the stage feeding
+        it, back to the parsers, so memory stays bounded even for a large PDF
+        and total time tracks the slowest stage.
+
+        Args:
+            file_paths: Local files to index
+            batch_size: Chunks per embedding request and per upsert
+
+        Returns:
+            Upserted chunk IDs per successfully processed file, in chunk order
+        """
+        if not self.vector_store.index:
+            self.vector_store.initialize()
+
+        chunk_queue: "queue.Queue[Any]" = queue.Queue(maxsize=self.queue_size * batch_size)
+        upsert_queue: "queue.Queue[Any]" = queue.Queue(maxsize=self.queue_size)
+        failed = threading.Event()
+        errors: List[Exception] = []
+        chunk_ids: Dict[str, List[Tuple[int, str]]] = {}
+        parsed: List[str] = []
+
+        def put(q: "queue.Queue[Any]", item: Any):
+            # Block for backpressure, but give up once another stage has failed
+            while not failed.is_set():
+                try:
+                    q.put(item, timeout=0.5)
+                    return
+                except queue.Full:
+                    continue
+
+        def embed_stage():
+            try:
+                batch: List[Document] = []
+                while not failed.is_set():
+                    try:
+                        item = chunk_queue.get(timeout=0.5)
+                    except queue.Empty:
+                        continue
+                    if item is not _DONE:
+                        batch.append(item)
+                    if batch and (item is _DONE or len(batch) >= batch_size):
+                        with span("ingest_embed"):
+                            # Chunk IDs carry a content hash, so existing IDs need no new embedding
+                            existing = self.vector_store.existing_ids([d.metadata["chunk_id"] for d in batch])
+                            new_docs = [d for d in batch if d.metadata["chunk_id"] not in existing]
+                            embeddings = self.vector_store.embedder.get_embeddings(
+                                [d.page_content for d in new_docs]) if new_docs else []
+                        embedded = dict(zip((d.metadata["chunk_id"] for d in new_docs), embeddings))
+                        put(upsert_queue, [
+                            {
+                                "id": d.metadata["chunk_id"],
+                                "content": d.page_content,
+                                "metadata": d.metadata,
+                                "embedding": embedded.get(d.metadata["chunk_id"])
+                            }
+                            for d in batch
+                        ])
+                        batch = []
+                    if item is _DONE:
+                        return
+            except Exception as e:
+                errors.append(e)
+                failed.set()
+
+        def upsert_stage():
+            try:
+                finished_embedders = 0
+                while finished_embedders < self.embed_workers and not failed.is_set():
+                    try:
+                        item = upsert_queue.get(timeout=0.5)
+                    except queue.Empty:
+                        continue
+                    if item is _DONE:
+                        finished_embedders += 1
+                        continue
+                    new_docs = [doc for doc in item if doc["embedding"] is not None]
+                    with span("ingest_upsert"):
+                        if new_docs:
+                            self.vector_store.add_documents(new_docs, skip_existing=False)
+                        # Chunks whose vectors already exist still need their BM25 entries and any changed metadata
+                        if len(new_docs) < len(item):
+                            self.vector_store.add_existing([doc for doc in item if doc["embedding"] is None])
+                    for doc in item:
+                        chunk_ids.setdefault(doc["metadata"]["source"], []).append(
+                            (doc["metadata"].get("chunk_index", 0), doc["id"]))
+            except Exception as e:
+                errors.append(e)
+                failed.set()
+
+        embedders = [threading.Thread(target=embed_stage, daemon=True) for _ in range(self.embed_workers)]
+        upserter = threading.Thread(target=upsert_stage, daemon=True)
+        for thread in embedders + [upserter]:
+            thread.start()
+
+        # Bounded, so a parser that outruns the embedders blocks instead of buffering a whole document
+        stream = _MP_CONTEXT.Queue(maxsize=self.queue_size)
+        with _parse_pool(self.parse_workers, stream) as pool:
+            futures = {pool.submit(_stream_local_file, path): path for path in file_paths}
+            unfinished = set(file_paths)
+            while unfinished:
+                if failed.is_set():
+                    # Parsers already running still finish; their chunks are drained and dropped
+                    for pending in futures:
+                        pending.cancel()
+                try:
+                    file_path, docs, error = stream.get(timeout=0.5)
+                except queue.Empty:
+                    # A file whose task was cancelled or whose process died sends no end marker
+                    for future, path in futures.items():
+                        if path in unfinished and future.done() and (future.cancelled() or future.exception()):
+                            if not future.cancelled():
+                                print(f"Error processing {path}: {str(future.exception())}")
+                            unfinished.discard(path)
+                    continue
+                if docs is not None:
+                    for doc in docs:
+                        put(chunk_queue, doc)
+                    continue
+                unfinished.discard(file_path)
+                if error is not None:
+                    print(f"Error processing {file_path}: {error}")
+                else:
+                    parsed.append(file_path)
+
+        for _ in embedders:
+            put(chunk_queue, _DONE)
+        for thread in embedders:
+            thread.join()
+            put(upsert_queue, _DONE)
+        upserter.join()
+
+        if errors:
+            logger.error(f"Dataset indexing failed: {str(errors[0])}")
+            raise errors[0]
+        # Embed threads finish batches in any order; report each file's chunks in document order
+        chunk_ids = {source: [id_ for _, id_ in sorted(ids)] for source, ids in chunk_ids.items()}
+        # Files that parsed to no chunks still count as processed
+        for file_path in parsed:
+            chunk_ids.setdefault(file_path, [])
+        return chunk_ids
+
+    def _list_cloud_objects(self, dataset_path: str, cloud_type: str) -> Iterator[Tuple[str, str]]:
+        """Yield (key, etag) for supported objects under a cloud prefix"""
         if cloud_type == 'aws':
             bucket = self.cloud_config['aws']['bucket']
-            s3_client = self.processor.s3_client
-            paginator = s3_client.get_paginator('list_objects_v2')
-            
+            paginator = self.processor.s3_client.get_paginator('list_objects_v2')
             for page in paginator.paginate(Bucket=bucket, Prefix=dataset_path):
                 for obj in page.get('Contents', []):
-                    file_path = obj['Key']
-                    if file_path.lower().endswith(('.pdf', '.txt', '.md')):
-                        try:
-                            docs = self.processor.process_cloud_document(file_path, cloud_type)
-                            processed_docs.extend(docs)
-                        except Exception as e:
-                            print(f"Error processing {file_path}: {str(e)}")
-        
+                    yield obj['Key'], obj.get('ETag', '')
+
         elif cloud_type == 'gcp':
             bucket = self.processor.gcs_client.bucket(self.cloud_config['gcp']['bucket'])
-            blobs = bucket.list_blobs(prefix=dataset_path)
-            
-            for blob in blobs:
-                if blob.name.lower().endswith(('.pdf', '.txt', '.md')):
-                    try:
-                        docs = self.processor.process_cloud_document(blob.name, cloud_type)
-                        processed_docs.extend(docs)
-                    except Exception as e:
-                        print(f"Error processing {blob.name}: {str(e)}")
-        
+            for blob in bucket.list_blobs(prefix=dataset_path):
+                yield blob.name, blob.etag or ''
+
         elif cloud_type == 'azure':
             container = self.processor.azure_client.get_container_client(
                 self.cloud_config['azure']['container']
             )
-            blobs = container.list_blobs(name_starts_with=dataset_path)
-            
-            for blob in blobs:
-                if blob.name.lower().endswith(('.pdf', '.txt', '.md')):
-                    try:
-                        docs = self.processor.process_cloud_document(blob.name, cloud_type)
-                        processed_docs.extend(docs)
-                    except Exception as e:
-                        print(f"Error processing {blob.name}: {str(e)}")
-        
+            for blob in container.list_blobs(name_starts_with=dataset_path):
+                yield blob.name, blob.etag or ''
+
+    def _etag_key(self, cloud_type: str, key: str) -> str:
+        """ETag manifest key: provider, bucket or container, and object key"""
+        location = (self.cloud_config or {}).get(cloud_type, {})
+        return f"{cloud_type}:{location.get('bucket') or location.get('container', '')}:{key}"
+
+    def _process_cloud_dataset(self, dataset_path: str, cloud_type: str, skip_unchanged: bool = False) -> List[Dict[str, Any]]:
+        """
+        Fetch and process all documents under a cloud prefix with a pool of download workers.
+
+        The ETags of the fetched objects are only remembered here; index_documents
+        saves them once the chunks are upserted, so an object whose chunks never
+        reach the index is fetched again on the next incremental run.
+        """
+        etags = self._load_etags()
+        objects = [
+            (key, etag) for key, etag in self._list_cloud_objects(dataset_path, cloud_type)
+            if key.lower().endswith(SUPPORTED_EXTENSIONS)
+        ]
+        if skip_unchanged:
+            pending = [(key, etag) for key, etag in objects
+                       if not etag or etags.get(self._etag_key(cloud_type, key)) != etag]
+            logger.info(f"Skipping {len(objects) - len(pending)} unchanged objects")
+        else:
+            pending = objects
+
+        results: Dict[str, List[Document]] = {}
+        with ThreadPoolExecutor(max_workers=self.download_workers) as pool:
+            futures = {pool.submit(self.processor.process_cloud_document, key, cloud_type): (key, etag)
+                       for key, etag in pending}
+            for future in as_completed(futures):
+                key, etag = futures[future]
+                try:
+                    results[key] = future.result()
+                    if etag:
+                        self.pending_etags[key] = (self._etag_key(cloud_type, key), etag, bool(results[key]))
+                except Exception as e:
+                    print(f"Error processing {key}: {str(e)}")
+
+        # Keep listing order regardless of completion order
+        processed_docs = []
+        for key, _ in pending:
+            processed_docs.extend(results.get(key, []))
         return processed_docs
 
+    def _load_etags(self) -> Dict[str, str]:
+        """ETags of cloud objects as of their last successful processing"""
+        if os.path.exists(self.etag_manifest_path):
+            with open(self.etag_manifest_path, 'r') as f:
+                return json.load(f)
+        return {}
+
+    def _save_etags(self, etags: Dict[str, str]):
+        os.makedirs(os.path.dirname(self.etag_manifest_path), exist_ok=True)
+        temp_path = self.etag_manifest_path + ".tmp"
+        with open(temp_path, 'w') as f:
+            json.dump(etags, f, indent=2, sort_keys=True)
+        os.replace(temp_path, self.etag_manifest_path)
+
+    def index_documents(self, docs: List[Document], batch_size: int = 100) -> int:
+        """
+        Embed and upsert parsed chunks, e.g. those returned by update_dataset.
+
+        Once every batch is upserted, the ETags of the cloud objects the chunks
+        came from (and of fetched objects that produced no chunks) are saved,
+        so the next incremental run skips them.
+
+        Args:
+            docs: Chunks from process_dataset or update_dataset
+            batch_size: Chunks per embedding request and per upsert
+
+        Returns:
+            Number of chunks upserted (chunks already in the index are skipped)
+        """
+        if not self.vector_store.index:
+            self.vector_store.initialize()
+        upserted = 0
+        for start in range(0, len(docs), batch_size):
+            batch = [{"content": d.page_content, "metadata": d.metadata} for d in docs[start:start + batch_size]]
+            with span("ingest_embed"):
+                # Chunk IDs carry a content hash, so existing IDs need no new embedding
+                existing = self.vector_store.existing_ids([self.vector_store.document_id(d) for d in batch])
+                new_docs = [d for d in batch if self.vector_store.document_id(d) not in existing]
+                embeddings = self.vector_store.embedder.get_embeddings(
+                    [d["content"] for d in new_docs]) if new_docs else []
+            with span("ingest_upsert"):
+                if new_docs:
+                    upserted += self.vector_store.add_documents(
+                        [{**d, "embedding": e} for d, e in zip(new_docs, embeddings)], skip_existing=False)
+                if len(new_docs) < len(batch):
+                    self.vector_store.add_existing([d for d in batch if self.vector_store.document_id(d) in existing])
+
+        if self.pending_etags:
+            sources = {d.metadata.get("source") for d in docs}
+            etags = self._load_etags()
+            for key in list(self.pending_etags):
+                etag_key, etag, has_chunks = self.pending_etags[key]
+                if key in sources or not has_chunks:
+                    etags[etag_key] = etag
+                    del self.pending_etags[key]
+            self._save_etags(etags)
+        return upserted
+
     def update_dataset(self, dataset_path: str, is_cloud: bool = False, cloud_type: Optional[str] = None):
         """
         Update the dataset by processing new or modified documents
@@ -117,11 +465,15 @@ class DatasetProcessor:
             dataset_path: Path to dataset (local path or cloud path)
             is_cloud: Whether the dataset is in cloud storage
             cloud_type: Type of cloud storage ('aws', 'gcp', 'azure', 'dropbox', 'gdrive')
+
+        Returns:
+            Chunks of the new or modified documents. Pass them to index_documents;
+            cloud objects count as processed only once it has upserted them.
         """
-        processed_docs = self.process_dataset(dataset_path, is_cloud, cloud_type)
+        processed_docs = self.process_dataset(dataset_path, is_cloud, cloud_type, skip_unchanged=True)
         return processed_docs
 
 if __name__ == "__main__":
     processor = DatasetProcessor()
     processor.initialize()
-    processor.process_dataset() 
\ No newline at end of file
+    processor.index_dataset() 
\ No newline at end of file
@@ -1,57 +1,126 @@
 from langchain_community.document_loaders import PyPDFLoader, TextLoader
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Iterator, Union
 from langchain.schema import Document
+import io
 import json
 import os
 from datetime import datetime
-import boto3
-from google.cloud import storage
-from azure.storage.blob import BlobServiceClient
 import tempfile
-import requests
+from chunk_ids import make_chunk_id
+from token_chunker import TokenChunker
+from config import load_config
+
+# Cloud SDKs are slow to import, so each provider's SDK is imported only when a
+# DocumentProcessor is configured for that provider.
+def _create_s3_client(config: Dict[str, Any]):
+    import boto3
+    return boto3.client(
+        's3',
+        aws_access_key_id=config['access_key'],
+        aws_secret_access_key=config['secret_key'],
+        region_name=config['region']
+    )
+
+def _create_gcs_client(config: Dict[str, Any]):
+    from google.cloud import storage
+    return storage.Client.from_service_account_json(config['credentials_file'])
+
+def _create_azure_client(config: Dict[str, Any]):
+    from azure.storage.blob import BlobServiceClient
+    return BlobServiceClient.from_connection_string(config['connection_string'])
+
+# cloud_config key -> (DocumentProcessor attribute, client factory)
+CLOUD_PROVIDERS = {
+    'aws': ('s3_client', _create_s3_client),
+    'gcp': ('gcs_client', _create_gcs_client),
+    'azure': ('azure_client', _create_azure_client),
+}
 
 class DocumentProcessor:
     def __init__(self, cloud_config: Optional[Dict[str, Any]] = None):
-        self.text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=1000,
-            chunk_overlap=200
+        config = load_config()
+        # Chunks are sized in tokens and never exceed the API token limit
+        self.max_chunks = config.get("max_chunks_per_document")
+        self.text_splitter = TokenChunker(
+            chunk_tokens=min(config.get("chunk_tokens", 256), config.get("api", {}).get("max_tokens", 4000)),
+            overlap_tokens=config.get("chunk_overlap_tokens", 50),
+            max_chunks=self.max_chunks
         )
         self.cloud_config = cloud_config or {}
         self._init_cloud_clients()
 
     def _init_cloud_clients(self):
         """Initialize cloud storage clients based on configuration"""
-        if 'aws' in self.cloud_config:
-            self.s3_client = boto3.client(
-                's3',
-                aws_access_key_id=self.cloud_config['aws']['access_key'],
-                aws_secret_access_key=self.cloud_config['aws']['secret_key'],
-                region_name=self.cloud_config['aws']['region']
-            )
-        
-        if 'gcp' in self.cloud_config:
-            self.gcs_client = storage.Client.from_service_account_json(
-                self.cloud_config['gcp']['credentials_file']
-            )
-        
-        if 'azure' in self.cloud_config:
-            self.azure_client = BlobServiceClient.from_connection_string(
-                self.cloud_config['azure']['connection_string']
-            )
+        for provider, (attribute, create_client) in CLOUD_PROVIDERS.items():
+            if provider in self.cloud_config:
+                setattr(self, attribute, create_client(self.cloud_config[provider]))
 
     def process_cloud_document(self, cloud_path: str, cloud_type: str) -> List[Document]:
         """Process a document from cloud storage"""
-        # Download file to temporary location
+        return self.process_bytes(self.read_cloud_object(cloud_path, cloud_type), cloud_path)
+
+    def read_cloud_object(self, cloud_path: str, cloud_type: str) -> bytes:
+        """Read an object's body straight into memory, without a temporary file"""
+        if cloud_type == 'aws':
+            bucket = self.cloud_config['aws']['bucket']
+            return self.s3_client.get_object(Bucket=bucket, Key=cloud_path)['Body'].read()
+        
+        elif cloud_type == 'gcp':
+            bucket = self.gcs_client.bucket(self.cloud_config['gcp']['bucket'])
+            return bucket.blob(cloud_path).download_as_bytes()
+        
+        elif cloud_type == 'azure':
+            container = self.azure_client.get_container_client(
+                self.cloud_config['azure']['container']
+            )
+            return container.get_blob_client(cloud_path).download_blob().readall()
+        
+        # Providers without an in-memory read go through a temporary file
         with tempfile.NamedTemporaryFile(delete=False) as temp_file:
             temp_path = temp_file.name
+        try:
             self._download_from_cloud(cloud_path, temp_path, cloud_type)
-            
-            # Process based on file type
-            if cloud_path.lower().endswith('.pdf'):
-                return self.process_pdf(temp_path)
-            else:
-                return self.process_text(temp_path)
+            with open(temp_path, 'rb') as f:
+                return f.read()
+        finally:
+            os.remove(temp_path)
+
+    def page_count(self, data: bytes, file_path: str) -> Optional[int]:
+        """Number of pages of a PDF held in memory (None for other file types)"""
+        if not file_path.lower().endswith('.pdf'):
+            return None
+        from pypdf import PdfReader
+        return len(PdfReader(io.BytesIO(data)).pages)
+
+    def process_bytes(self, data: bytes, file_path: str,
+                      stream: bool = False) -> Union[List[Document], Iterator[Document]]:
+        """
+        Chunk a document already held in memory; file_path names its source and type.
+
+        Args:
+            data: File contents
+            file_path: Source name; a '.pdf' suffix selects the PDF parser
+            stream: Return a generator that extracts and chunks PDF pages as it
+                is consumed, like process_pdf(stream=True); streamed PDF chunks
+                carry no 'total_chunks'
+        """
+        if file_path.lower().endswith('.pdf'):
+            from pypdf import PdfReader
+            reader = PdfReader(io.BytesIO(data))
+            pages = (
+                Document(page_content=page.extract_text(), metadata={"page": i})
+                for i, page in enumerate(reader.pages)
+            )
+            if stream:
+                return self._iter_page_chunks(pages, file_path)
+            chunks = list(self._iter_page_chunks(pages, file_path))
+            for chunk in chunks:
+                chunk.metadata["total_chunks"] = len(chunks)
+            return chunks
+
+        text = data.decode('utf-8', errors='replace')
+        chunks = self._process_documents([Document(page_content=text, metadata={"source": file_path})], file_path, "text")
+        return iter(chunks) if stream else chunks
 
     def _download_from_cloud(self, cloud_path: str, local_path: str, cloud_type: str):
         """Download file from cloud storage"""
@@ -73,6 +142,7 @@ class DocumentProcessor:
                 file.write(blob.download_blob().readall())
         
         elif cloud_type == 'dropbox':
+            import requests
             headers = {
                 'Authorization': f"Bearer {self.cloud_config['dropbox']['access_token']}"
             }
@@ -88,19 +158,88 @@ class DocumentProcessor:
             # Google Drive API implementation
             pass
 
-    def process_pdf(self, file_path: str) -> List[Document]:
-        loader = PyPDFLoader(file_path)
-        docs = loader.load()
-        return self._process_documents(docs, file_path, "pdf")
+    def process_pdf(self, file_path: str, stream: bool = False) -> Union[List[Document], Iterator[Document]]:
+        """
+        Chunk a PDF.
+
+        Args:
+            file_path: Path to the PDF
+            stream: Return a generator from iter_pdf_chunks instead of a list.
+                Streamed chunks carry no 'total_chunks', which isn't known until the end.
+        """
+        if stream:
+            return self.iter_pdf_chunks(file_path)
+
+        chunks = list(self.iter_pdf_chunks(file_path))
+        for chunk in chunks:
+            chunk.metadata["total_chunks"] = len(chunks)
+        return chunks
+
+    def iter_pdf_chunks(self, file_path: str) -> Iterator[Document]:
+        """
+        Yield chunks of a PDF page by page without loading the whole document.
+
+        The last, possibly partial, chunk of each page is held back and split
+        again together with the next page, so chunks span page boundaries and
+        keep their overlap across them. Only one page plus that tail is held in
+        memory at a time.
+        """
+        yield from self._iter_page_chunks(PyPDFLoader(file_path).lazy_load(), file_path)
+
+    def _iter_page_chunks(self, pages: Iterator[Document], file_path: str) -> Iterator[Document]:
+        """Chunk a stream of PDF pages, carrying each page's tail into the next"""
+        first_page = next(pages, None)
+        if first_page is None:
+            return
+        metadata = self._base_metadata(first_page.page_content, file_path, "pdf")
+
+        chunk_index = 0
+        carry = ""
+        carry_page = 1
+        page = first_page
+        while page is not None:
+            next_page = next(pages, None)
+            page_number = page.metadata.get("page", 0) + 1
+            text = carry + "\n" + page.page_content if carry else page.page_content
+            splits = self.text_splitter.split_text(text)
+
+            # Attribute each chunk to the page it starts on: text before
+            # len(carry) came from the held-back tail of an earlier page
+            starts, position = [], 0
+            for split in splits:
+                start = text.find(split, position)
+                starts.append(start if start >= 0 else position)
+                position = starts[-1] + 1
+            pages_of = [carry_page if carry and start < len(carry) else page_number for start in starts]
+
+            if next_page is not None and splits:
+                carry, carry_page = splits.pop(), pages_of.pop()
+            else:
+                carry = ""
+            for split, split_page in zip(splits, pages_of):
+                yield Document(
+                    page_content=split,
+                    metadata={
+                        **metadata,
+                        "page_number": split_page,
+                        "chunk_index": chunk_index,
+                        "chunk_id": make_chunk_id(file_path, chunk_index, split)
+                    }
+                )
+                chunk_index += 1
+                if self.max_chunks and chunk_index >= self.max_chunks:
+                    return
+            page = next_page
 
     def process_text(self, file_path: str) -> List[Document]:
         loader = TextLoader(file_path)
         docs = loader.load()
         return self._process_documents(docs, file_path, "text")
 
-    def _process_documents(self, docs: List[Document], file_path: str, file_type: str) -> List[Document]:
+    def _base_metadata(self, first_content: str, file_path: str, file_type: str) -> Dict[str, Any]:
+        """Metadata shared by every chunk of a file"""
         # Extract metadata from file content
-        metadata = self._extract_metadata(docs[0].page_content)
+        metadata = self._extract_metadata(first_content)
         
         # Add file-specific metadata
         metadata.update({
@@ -110,6 +249,10 @@ class DocumentProcessor:
             "category": self._get_category_from_path(file_path),
             "subcategory": self._get_subcategory_from_path(file_path)
         })
+        return metadata
+
+    def _process_documents(self, docs: List[Document], file_path: str, file_type: str) -> List[Document]:
+        metadata = self._base_metadata(docs[0].page_content, file_path, file_type)
 
         # Split documents
         split_docs = self.text_splitter.split_documents(docs)
@@ -121,6 +264,7 @@ class DocumentProcessor:
                 metadata={
                     **metadata,
                     "chunk_index": i,
+                    "chunk_id": make_chunk_id(file_path, i, doc.page_content),
                     "total_chunks": len(split_docs)
                 }
             )
@@ -0,0 +1,207 @@
+import os
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import List, Dict, Optional, Tuple
+import numpy as np
+import logging
+
+try:
+    import fcntl
+except ImportError:  # Windows: appends are serialised per process only
+    fcntl = None
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.dirname(__file__), "cache", "embeddings")
+
+
+class EmbeddingCache:
+    def __init__(self,
+                 cache_dir: Optional[str] = DEFAULT_CACHE_DIR,
+                 dimensions: int = 1536,
+                 max_memory_entries: int = 2000):
+        """
+        Two-tier embedding cache keyed by (model, sha256(text)).
+
+        Recently used vectors live in an in-memory LRU as float32 rows (6 KB
+        each at 1536 dimensions, against ~50 KB as a list of Python floats),
+        converted back to lists on the way out. Every vector is also
+        appended to a float32 file under cache_dir that is read back through a
+        memory map, so the cache survives restarts. Several processes can share
+        one cache_dir: appends are serialised with a file lock, and entries
+        written by other processes are picked up on a miss.
+
+        Args:
+            cache_dir: Directory for the on-disk tier; None keeps the cache in memory only
+            dimensions: Embedding dimensions stored on disk
+            max_memory_entries: Capacity of the in-memory LRU tier
+        """
+        self.cache_dir = cache_dir
+        self.dimensions = dimensions
+        self.max_memory_entries = max_memory_entries
+
+        self._memory: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._rows: Dict[str, int] = {}
+        self._mmap: Optional[np.memmap] = None
+        # Bytes of index.tsv already read
+        self._index_offset = 0
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        if self.cache_dir:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            self._vectors_path = os.path.join(self.cache_dir, "vectors.f32")
+            self._index_path = os.path.join(self.cache_dir, "index.tsv")
+            self._load_index()
+
+    @staticmethod
+    def make_key(text: str, model: str) -> str:
+        """Build the content-addressed cache key for text embedded with model"""
+        return f"{model}:{hashlib.sha256(text.encode('utf-8')).hexdigest()}"
+
+    def _load_index(self):
+        """Read the key -> row index of the on-disk tier, continuing from the last read"""
+        if not os.path.exists(self._index_path):
+            return
+        row_bytes = self.dimensions * 4
+        stored_rows = os.path.getsize(self._vectors_path) // row_bytes if os.path.exists(self._vectors_path) else 0
+        loaded = len(self._rows)
+        with open(self._index_path, "rb") as f:
+            f.seek(self._index_offset)
+            for line in f:
+                # A torn last line is left for the next read
+                if not line.endswith(b"\n"):
+                    break
+                self._index_offset += len(line)
+                parts = line.decode("utf-8").rstrip("\n").split("\t")
+                # Ignore rows whose vector never made it to disk
+                if len(parts) == 2 and parts[1].isdigit() and int(parts[1]) < stored_rows:
+                    self._rows[parts[0]] = int(parts[1])
+        if loaded == 0:
+            logger.info(f"Loaded {len(self._rows)} cached embeddings from {self.cache_dir}")
+
+    def _index_grew(self) -> bool:
+        """Whether another process appended index lines since the last read"""
+        try:
+            return os.path.getsize(self._index_path) > self._index_offset
+        except OSError:
+            return False
+
+    def _read_row(self, row: int) -> np.ndarray:
+        """Read one vector from the memory-mapped file, remapping if the file grew"""
+        if self._mmap is None or row >= self._mmap.shape[0]:
+            rows = os.path.getsize(self._vectors_path) // (self.dimensions * 4)
+            self._mmap = np.memmap(self._vectors_path, dtype=np.float32, mode="r",
+                                   shape=(rows, self.dimensions))
+        # Copied out of the mapping so a cached row doesn't pin an old, smaller map
+        return np.array(self._mmap[row])
+
+    def _remember(self, key: str, embedding: np.ndarray):
+        """Insert into the LRU tier, evicting the least recently used entry"""
+        self._memory[key] = embedding
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_entries:
+            self._memory.popitem(last=False)
+            self.evictions += 1
+
+    def get(self, text: str, model: str) -> Optional[List[float]]:
+        """Return the cached embedding for text, or None"""
+        return self.get_many([text], model)[0]
+
+    def get_many(self, texts: List[str], model: str) -> List[Optional[List[float]]]:
+        """Look up many texts at once; misses come back as None in their position"""
+        results: List[Optional[List[float]]] = []
+        with self._lock:
+            refreshed = False
+            for text in texts:
+                key = self.make_key(text, model)
+                embedding = self._memory.get(key)
+                if embedding is None and key not in self._rows and self.cache_dir and not refreshed:
+                    # Entries cached by other processes sharing the directory
+                    refreshed = True
+                    if self._index_grew():
+                        self._load_index()
+                if embedding is not None:
+                    self._memory.move_to_end(key)
+                    self.hits += 1
+                elif key in self._rows:
+                    embedding = self._read_row(self._rows[key])
+                    self._remember(key, embedding)
+                    self.hits += 1
+                    self.disk_hits += 1
+                else:
+                    self.misses += 1
+                results.append(None if embedding is None else embedding.tolist())
+        return results
+
+    def put(self, text: str, model: str, embedding: List[float]):
+        """Cache a single embedding"""
+        self.put_many([text], model, [embedding])
+
+    def put_many(self, texts: List[str], model: str, embeddings: List[List[float]]):
+        """Cache embeddings for texts, appending new vectors to the on-disk tier"""
+        with self._lock:
+            new_entries: List[Tuple[str, List[float]]] = []
+            for text, embedding in zip(texts, embeddings):
+                key = self.make_key(text, model)
+                self._remember(key, np.asarray(embedding, dtype=np.float32))
+                if self.cache_dir and key not in self._rows and len(embedding) == self.dimensions:
+                    new_entries.append((key, embedding))
+            if new_entries:
+                self._append_to_disk(new_entries)
+
+    def _append_to_disk(self, entries: List[Tuple[str, List[float]]]):
+        """Append vectors then their index lines, so a crash never indexes a missing row"""
+        lock = None
+        try:
+            lock = open(os.path.join(self.cache_dir, "append.lock"), "a")
+            if fcntl is not None:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+            # Catch up first: rows appended by other processes shift our first row
+            self._load_index()
+            entries = [(key, embedding) for key, embedding in entries if key not in self._rows]
+            if not entries:
+                return
+            with open(self._vectors_path, "ab") as f:
+                first_row = f.tell() // (self.dimensions * 4)
+                f.write(np.asarray([e for _, e in entries], dtype=np.float32).tobytes())
+            with open(self._index_path, "a") as f:
+                for offset, (key, _) in enumerate(entries):
+                    f.write(f"{key}\t{first_row + offset}\n")
+                    self._rows[key] = first_row + offset
+            self._index_offset = os.path.getsize(self._index_path)
+        except OSError as e:
+            logger.error(f"Failed to persist embeddings to cache: {str(e)}")
+        finally:
+            if lock is not None:
+                lock.close()
+
+    def stats(self) -> Dict[str, int]:
+        """Cache counters for logging and monitoring"""
+        return {
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "memory_entries": len(self._memory),
+            "disk_entries": len(self._rows),
+        }
+
+
+_default_cache: Optional[EmbeddingCache] = None
+
+
+def get_embedding_cache() -> EmbeddingCache:
+    """Return the process-wide embedding cache, configured from the environment"""
+    global _default_cache
+    if _default_cache is None:
+        cache_dir = os.getenv("EMBEDDING_CACHE_DIR", DEFAULT_CACHE_DIR) or None
+        max_entries = int(os.getenv("EMBEDDING_CACHE_MAX_ENTRIES", "2000"))
+        _default_cache = EmbeddingCache(cache_dir=cache_dir, max_memory_entries=max_entries)
+    return _default_cache
@@ -0,0 +1,241 @@
+import os
+import time
+import asyncio
+from typing import List, Optional
+from openai import OpenAI, AsyncOpenAI, APIConnectionError, APIStatusError, RateLimitError
+from embedding_cache import EmbeddingCache
+from clients import get_clients
+from rate_limiter import RateLimitScheduler
+from metrics import count_call
+import logging
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+EMBEDDING_MODEL = "text-embedding-ada-002"
+
+# OpenAI accepts at most 2048 inputs and ~300k tokens per embeddings request;
+# stay comfortably below both.
+MAX_BATCH_SIZE = 2048
+MAX_BATCH_TOKENS = 250000
+
+
+def _is_retryable(error: Exception) -> bool:
+    """Rate limits, connection failures, timeouts and 5xx responses; a bad request or key fails the same way again"""
+    # APITimeoutError is an APIConnectionError
+    if isinstance(error, (RateLimitError, APIConnectionError)):
+        return True
+    return isinstance(error, APIStatusError) and error.status_code >= 500
+
+
+class EmbeddingClient:
+    def __init__(self,
+                 openai_client: Optional[OpenAI] = None,
+                 model: str = EMBEDDING_MODEL,
+                 max_batch_tokens: int = MAX_BATCH_TOKENS,
+                 max_retries: int = 3,
+                 cache: Optional[EmbeddingCache] = None,
+                 scheduler: Optional[RateLimitScheduler] = None):
+        """
+        Wrap the OpenAI embeddings endpoint with batching and retries.
+
+        Args:
+            openai_client: OpenAI client to use; defaults to the shared pooled client
+            model: Embedding model name
+            max_batch_tokens: Token budget for a single embeddings request
+            max_retries: Attempts per sub-batch before giving up; the OpenAI clients
+                are used with their own retries off, so this is the only retry count
+            cache: Optional embedding cache consulted before calling the API
+            scheduler: Optional rate-limit scheduler pacing sync requests; with one,
+                throttled (429) requests are retried by the scheduler only, not again here
+        """
+        self.openai_client = openai_client or get_clients().openai
+        self.model = model
+        self.max_batch_tokens = max_batch_tokens
+        self.max_retries = max_retries
+        self.scheduler = scheduler
+        self.cache = cache
+        self._async_client: Optional[AsyncOpenAI] = None
+        self._encoding = None
+
+    @property
+    def async_client(self) -> AsyncOpenAI:
+        """Shared pooled AsyncOpenAI client, looked up on first use"""
+        if self._async_client is None:
+            self._async_client = get_clients().async_openai
+        return self._async_client
+
+    @staticmethod
+    def _without_sdk_retries(client):
+        """The shared client with the SDK's retries off for one request, so failed batches are retried here only"""
+        return client.with_options(max_retries=0) if hasattr(client, "with_options") else client
+
+    def count_tokens(self, text: str) -> int:
+        """Count tokens for text, falling back to a character estimate without tiktoken"""
+        if self._encoding is None:
+            try:
+                import tiktoken
+                self._encoding = tiktoken.encoding_for_model(self.model)
+            except Exception as e:
+                logger.warning(f"tiktoken unavailable, estimating token counts: {str(e)}")
+                self._encoding = False
+        if self._encoding:
+            return len(self._encoding.encode(text, disallowed_special=()))
+        return len(text) // 4 + 1
+
+    def get_embedding(self, text: str) -> List[float]:
+        """Get embedding for a single text"""
+        return self.get_embeddings([text])[0]
+
+    def get_embeddings(self, texts: List[str]) -> List[List[float]]:
+        """
+        Get embeddings for many texts using as few requests as possible.
+
+        Args:
+            texts: Texts to embed
+
+        Returns:
+            One embedding per text, in the same order as the input
+        """
+        if self.cache is None:
+            return self._embed_uncached(texts)
+
+        embeddings = self.cache.get_many(texts, self.model)
+        missing_texts = self._missing_texts(texts, embeddings)
+        if missing_texts:
+            self._fill_missing(texts, embeddings, missing_texts, self._embed_uncached(missing_texts))
+        return embeddings
+
+    async def aget_embedding(self, text: str) -> List[float]:
+        """Get embedding for a single text without blocking the event loop"""
+        return (await self.aget_embeddings([text]))[0]
+
+    async def aget_embeddings(self, texts: List[str]) -> List[List[float]]:
+        """Async counterpart of get_embeddings using the AsyncOpenAI client"""
+        if self.cache is None:
+            return await self._aembed_uncached(texts)
+
+        embeddings = self.cache.get_many(texts, self.model)
+        missing_texts = self._missing_texts(texts, embeddings)
+        if missing_texts:
+            self._fill_missing(texts, embeddings, missing_texts, await self._aembed_uncached(missing_texts))
+        return embeddings
+
+    @staticmethod
+    def _missing_texts(texts: List[str], embeddings: List[Optional[List[float]]]) -> List[str]:
+        """Distinct texts that missed the cache, so repeats in the input are embedded once"""
+        return list(dict.fromkeys(t for t, e in zip(texts, embeddings) if e is None))
+
+    def _fill_missing(self, texts: List[str], embeddings: List[Optional[List[float]]],
+                      missing_texts: List[str], fresh_embeddings: List[List[float]]):
+        """Cache freshly computed embeddings and slot them into the result list"""
+        self.cache.put_many(missing_texts, self.model, fresh_embeddings)
+        fresh = dict(zip(missing_texts, fresh_embeddings))
+        for i, text in enumerate(texts):
+            if embeddings[i] is None:
+                embeddings[i] = fresh[text]
+
+    def _embed_uncached(self, texts: List[str]) -> List[List[float]]:
+        """Call the API for every text, batch by batch"""
+        embeddings: List[List[float]] = []
+        for batch in self._split_batches(texts):
+            embeddings.extend(self._embed_batch(batch))
+        return embeddings
+
+    def _split_batches(self, texts: List[str]) -> List[List[str]]:
+        """Group consecutive texts into batches capped by input count and token budget"""
+        batches = []
+        current: List[str] = []
+        current_tokens = 0
+        for text in texts:
+            tokens = self.count_tokens(text)
+            if current and (current_tokens + tokens > self.max_batch_tokens
+                            or len(current) >= MAX_BATCH_SIZE):
+                batches.append(current)
+                current, current_tokens = [], 0
+            current.append(text)
+            current_tokens += tokens
+        if current:
+            batches.append(current)
+        return batches
+
+    def _embed_batch(self, batch: List[str]) -> List[List[float]]:
+        """Embed one batch, retrying only this batch on failure"""
+        attempt = 1
+        while True:
+            try:
+                count_call("openai", "embeddings")
+                return self._ordered_embeddings(self._create_embeddings(batch))
+            except (APIConnectionError, APIStatusError) as e:
+                time.sleep(self._retry_delay(batch, attempt, e, paced=True))
+                attempt += 1
+
+    @staticmethod
+    def _ordered_embeddings(response) -> List[List[float]]:
+        # The API reports each vector's input position; don't rely on response order
+        return [d.embedding for d in sorted(response.data, key=lambda d: d.index)]
+
+    def _retry_delay(self, batch: List[str], attempt: int, error: Exception, paced: bool) -> float:
+        """
+        Seconds to wait before retrying a failed batch, shared by the sync and async paths.
+
+        Args:
+            batch: The batch that failed
+            attempt: Attempts made so far, from 1
+            error: What the last attempt raised
+            paced: Whether the request went through the rate-limit scheduler
+
+        Returns:
+            Backoff delay; raises error instead if it is not worth retrying or the
+            batch is out of attempts
+        """
+        # A throttle that reaches a paced request has exhausted the scheduler's own retries
+        gave_up = paced and self.scheduler is not None and self.scheduler.is_throttled(error)
+        if attempt >= self.max_retries or gave_up or not _is_retryable(error):
+            logger.error(f"Failed to get embeddings for batch of {len(batch)}: {str(error)}")
+            raise error
+        delay = 2 ** (attempt - 1)
+        logger.warning(f"Embedding batch of {len(batch)} failed (attempt {attempt}), retrying in {delay}s: {str(error)}")
+        return delay
+
+    def _create_embeddings(self, batch: List[str]):
+        """One embeddings request, paced by the scheduler when there is one"""
+        client = self._without_sdk_retries(self.openai_client)
+        if self.scheduler is None:
+            return client.embeddings.create(model=self.model, input=batch)
+
+        def request():
+            embeddings = client.embeddings
+            if not hasattr(embeddings, "with_raw_response"):
+                return embeddings.create(model=self.model, input=batch)
+            # The raw response carries the rate-limit headers
+            raw = embeddings.with_raw_response.create(
+                model=self.model,
+                input=batch
+            )
+            self.scheduler.record_headers(raw.headers)
+            return raw.parse()
+
+        return self.scheduler.call(request, tokens=sum(self.count_tokens(t) for t in batch))
+
+    async def _aembed_uncached(self, texts: List[str]) -> List[List[float]]:
+        """Call the API asynchronously for every text, batch by batch"""
+        embeddings: List[List[float]] = []
+        for batch in self._split_batches(texts):
+            embeddings.extend(await self._aembed_batch(batch))
+        return embeddings
+
+    async def _aembed_batch(self, batch: List[str]) -> List[List[float]]:
+        """Async counterpart of _embed_batch"""
+        attempt = 1
+        while True:
+            try:
+                count_call("openai", "embeddings")
+                response = await self._without_sdk_retries(self.async_client).embeddings.create(
+                    model=self.model,
+                    input=batch
+                )
+                return self._ordered_embeddings(response)
+            except (APIConnectionError, APIStatusError) as e:
+                await asyncio.sleep(self._retry_delay(batch, attempt, e, paced=False))
+                attempt += 1
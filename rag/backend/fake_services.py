@@ -0,0 +1,220 @@
+import re
+import json
+import time
+import zlib
+import base64
+import threading
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import List, Dict, Any, Optional, Callable
+import numpy as np
+from local_index import LocalVectorIndex
+from rate_limiter import TokenBucket
+import logging
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+_WORD = re.compile(r"[a-z0-9]+")
+
+
+def hashed_embedding(text: str, dimension: int = 1536) -> List[float]:
+    """Deterministic unit vector from hashed words, so related texts land close together"""
+    vector = np.zeros(dimension, dtype=np.float32)
+    for word in _WORD.findall(text.lower()):
+        vector[zlib.crc32(word.encode("utf-8")) % dimension] += 1.0
+    norm = np.linalg.norm(vector)
+    return (vector / norm if norm else vector).tolist()
+
+
+class FakeOpenAIServer:
+    def __init__(self,
+                 requests_per_period: float = 3000,
+                 tokens_per_period: float = 1000000,
+                 period: float = 60.0,
+                 latency: float = 0.01,
+                 dimension: int = 1536,
+                 embed: Optional[Callable[[str], List[float]]] = None,
+                 chat_tokens_per_second: float = 200.0,
+                 answer: str = "Based on the HSA regulations [1], the requirement applies as stated in the cited clause."):
+        """
+        Local stand-in for the OpenAI API on a loopback port.
+
+        Serves /v1/embeddings and streaming /v1/chat/completions. Embedding
+        requests draw on request and token budgets per period the way OpenAI
+        meters them: over budget they get 429 with Retry-After, and every
+        response carries x-ratelimit-* headers. Point an OpenAI client at
+        base_url to use it.
+
+        Args:
+            requests_per_period: Embedding request budget per period
+            tokens_per_period: Embedding token budget per period
+            period: Budget period in seconds
+            latency: Seconds each accepted embeddings request takes
+            dimension: Embedding dimensions
+            embed: Embedding for one input text (defaults to hashed_embedding)
+            chat_tokens_per_second: Rate at which chat answers are streamed
+            answer: Chat answer text, streamed word by word
+        """
+        self.requests = TokenBucket(requests_per_period / period, requests_per_period)
+        self.tokens = TokenBucket(tokens_per_period / period, tokens_per_period)
+        self.latency = latency
+        self.embed = embed or (lambda text: hashed_embedding(text, dimension))
+        self.chat_tokens_per_second = chat_tokens_per_second
+        self.answer = answer
+        self.served = 0
+        self.rejected = 0
+        self.embedded_inputs = 0
+        self.chat_completions = 0
+        self._lock = threading.Lock()
+
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                if self.path.endswith("/chat/completions"):
+                    server.stream_chat(self)
+                    return
+                inputs = body["input"] if isinstance(body["input"], list) else [body["input"]]
+                status, payload, headers = server.handle(inputs, body["model"], body.get("encoding_format"))
+                data = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.httpd.daemon_threads = True
+        self.base_url = f"http://127.0.0.1:{self.httpd.server_port}/v1"
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+
+    def handle(self, inputs: List[str], model: str, encoding_format: Optional[str] = None):
+        """Status, JSON payload and headers for one embeddings request"""
+        tokens = sum(len(text) // 4 + 1 for text in inputs)
+        with self._lock:
+            wait = max(self.requests.wait_time(1), self.tokens.wait_time(tokens))
+            if wait == 0:
+                self.requests.consume(1)
+                self.tokens.consume(tokens)
+                self.served += 1
+                self.embedded_inputs += len(inputs)
+            else:
+                self.rejected += 1
+            headers = {
+                "x-ratelimit-limit-requests": str(int(self.requests.capacity)),
+                "x-ratelimit-limit-tokens": str(int(self.tokens.capacity)),
+                "x-ratelimit-remaining-requests": str(max(0, int(self.requests.level))),
+                "x-ratelimit-remaining-tokens": str(max(0, int(self.tokens.level))),
+            }
+        if wait > 0:
+            headers["retry-after"] = f"{wait:.3f}"
+            return 429, {"error": {"message": "Rate limit reached", "type": "requests",
+                                   "code": "rate_limit_exceeded"}}, headers
+        time.sleep(self.latency)
+        data = []
+        for i, text in enumerate(inputs):
+            embedding: Any = self.embed(text)
+            if encoding_format == "base64":
+                embedding = base64.b64encode(np.asarray(embedding, dtype=np.float32).tobytes()).decode("ascii")
+            data.append({"object": "embedding", "index": i, "embedding": embedding})
+        return 200, {"object": "list", "data": data, "model": model,
+                     "usage": {"prompt_tokens": tokens, "total_tokens": tokens}}, headers
+
+    def stream_chat(self, handler: BaseHTTPRequestHandler):
+        """Stream the canned answer as chat.completion.chunk Server-Sent Events"""
+        with self._lock:
+            self.chat_completions += 1
+        handler.send_response(200)
+        handler.send_header("Content-Type", "text/event-stream")
+        handler.end_headers()
+        for i, word in enumerate(self.answer.split(" ")):
+            time.sleep(1.0 / self.chat_tokens_per_second)
+            chunk = {"id": "chatcmpl-fake", "object": "chat.completion.chunk", "created": 0, "model": "fake",
+                     "choices": [{"index": 0, "delta": {"content": word if i == 0 else " " + word},
+                                  "finish_reason": None}]}
+            handler.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode())
+            handler.wfile.flush()
+        handler.wfile.write(b"data: [DONE]\n\n")
+        handler.wfile.flush()
+        handler.close_connection = True
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "embedding_requests": self.served,
+            "embedding_inputs": self.embedded_inputs,
+            "embedding_rejected": self.rejected,
+            "chat_completions": self.chat_completions,
+        }
+
+    def close(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+class FakePineconeIndex:
+    def __init__(self, dimension: int = 1536, latency: float = 0.02,
+                 requests_per_second: Optional[float] = None):
+        """
+        In-process stand-in for a Pinecone Index handle.
+
+        Wraps an in-memory LocalVectorIndex and adds a fixed round-trip latency
+        to every call. With requests_per_second, calls queue for a shared
+        budget the way a rate-limited pod would hold them back. Calls are
+        counted per method.
+
+        Args:
+            dimension: Vector dimensions
+            latency: Seconds added to every call
+            requests_per_second: Optional call budget across all methods
+        """
+        self.index = LocalVectorIndex(dimension=dimension, path=None)
+        self.latency = latency
+        self.budget = TokenBucket(requests_per_second, requests_per_second) if requests_per_second else None
+        self.calls: Counter = Counter()
+        self._lock = threading.Lock()
+
+    def _round_trip(self, method: str):
+        with self._lock:
+            self.calls[method] += 1
+            wait = 0.0
+            if self.budget is not None:
+                wait = self.budget.wait_time(1)
+                self.budget.consume(1)
+        time.sleep(self.latency + wait)
+
+    def upsert(self, vectors, namespace: Optional[str] = None):
+        self._round_trip("upsert")
+        return self.index.upsert(vectors, namespace=namespace)
+
+    def query(self, vector, top_k: int = 5, include_metadata: bool = True,
+              filter: Optional[Dict[str, Any]] = None, namespace: Optional[str] = None, **kwargs):
+        self._round_trip("query")
+        return self.index.query(vector, top_k=top_k, include_metadata=include_metadata,
+                                filter=filter, namespace=namespace)
+
+    def update(self, id: str, values: Optional[List[float]] = None,
+               set_metadata: Optional[Dict[str, Any]] = None, namespace: Optional[str] = None):
+        self._round_trip("update")
+        return self.index.update(id, values=values, set_metadata=set_metadata, namespace=namespace)
+
+    def fetch(self, ids: List[str], namespace: Optional[str] = None):
+        self._round_trip("fetch")
+        return self.index.fetch(ids, namespace=namespace)
+
+    def delete(self, ids: Optional[List[str]] = None, delete_all: bool = False, namespace: Optional[str] = None):
+        self._round_trip("delete")
+        return self.index.delete(ids=ids, delete_all=delete_all, namespace=namespace)
+
+    def describe_index_stats(self, namespace: Optional[str] = None):
+        self._round_trip("describe_index_stats")
+        return self.index.describe_index_stats(namespace=namespace)
+
+    def flush(self):
+        """Nothing to persist: a remote index stores writes server-side"""
@@ -0,0 +1,81 @@
+import os
+from contextlib import contextmanager
+from typing import Optional, Tuple
+import logging
+
+try:
+    import fcntl
+except ImportError:  # Windows: no cross-process locking
+    fcntl = None
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+DEFAULT_GENERATION_PATH = os.path.join(os.path.dirname(__file__), "cache", "index.generation")
+
+
+class IndexGeneration:
+    def __init__(self, path: str = DEFAULT_GENERATION_PATH):
+        """
+        Counter shared through a file between the index writer and reader processes.
+
+        The writer bumps it after every flush of the on-disk indexes; readers
+        compare its inode and mtime on each query (one stat call) and remap the indexes
+        when it moves. A lock file keeps a reader from loading index files
+        while the writer is halfway through replacing them.
+
+        Args:
+            path: File holding the counter
+        """
+        self.path = path
+        self._seen: Optional[Tuple[int, int]] = self._stamp()
+
+    def _stamp(self) -> Optional[Tuple[int, int]]:
+        # Every bump replaces the file, so the inode changes even within one mtime tick
+        try:
+            stat = os.stat(self.path)
+            return stat.st_ino, stat.st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+    def read(self) -> int:
+        try:
+            with open(self.path, "r") as f:
+                return int(f.read().strip() or 0)
+        except (FileNotFoundError, ValueError):
+            return 0
+
+    def bump(self) -> int:
+        """Publish a new generation (atomically) and return it"""
+        generation = self.read() + 1
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            f.write(str(generation))
+        os.replace(tmp_path, self.path)
+        self._seen = self._stamp()
+        return generation
+
+    @contextmanager
+    def _locked(self, mode: int):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        with open(f"{self.path}.lock", "a") as lock:
+            if fcntl is not None:
+                fcntl.flock(lock, mode)
+            yield
+
+    def publishing(self):
+        """Held by the writer while it flushes index files and bumps the generation"""
+        return self._locked(fcntl.LOCK_EX if fcntl else 0)
+
+    def reading(self):
+        """Held by a reader while it loads index files"""
+        return self._locked(fcntl.LOCK_SH if fcntl else 0)
+
+    def changed(self) -> bool:
+        """True once per new generation published since the last call"""
+        stamp = self._stamp()
+        if stamp == self._seen:
+            return False
+        self._seen = stamp
+        return True
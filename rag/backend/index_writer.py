@@ -0,0 +1,397 @@
+import os
+import json
+import time
+import uuid
+import shutil
+import itertools
+import threading
+from concurrent.futures import ThreadPoolExecutor, Future, wait, FIRST_COMPLETED
+from typing import List, Dict, Any, Optional, Callable, Union, BinaryIO
+from langchain.schema import Document
+from document_processor import DocumentProcessor
+from vector_store import VectorStore
+from metrics import span
+import logging
+
+try:
+    import fcntl
+except ImportError:  # Windows: a second writer is not detected
+    fcntl = None
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+DEFAULT_SPOOL_DIR = os.path.join(os.path.dirname(__file__), "cache", "uploads")
+
+# Uploads are copied into the spool this many bytes at a time
+COPY_CHUNK_SIZE = 1024 * 1024
+
+# Chunks embedded between progress updates and cancellation checks
+EMBED_BATCH_SIZE = 100
+
+FINAL_STATES = ("done", "failed", "cancelled")
+
+
+class JobCancelled(Exception):
+    """Raised inside a running job once its cancellation has been requested"""
+
+
+def _status_path(spool_dir: str, job_id: str) -> str:
+    return os.path.join(spool_dir, "jobs", f"{job_id}.json")
+
+
+def _write_status(spool_dir: str, job_id: str, status: Dict[str, Any]):
+    """Replace a job's status record atomically, so readers never see a partial one"""
+    path = _status_path(spool_dir, job_id)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    status["updated_at"] = time.time()
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(status, f)
+    os.replace(tmp_path, path)
+
+
+def _valid_job_id(job_id: str) -> bool:
+    # Job IDs end up in paths; only accept what enqueue_upload generates
+    return len(job_id) == 32 and all(c in "0123456789abcdef" for c in job_id)
+
+
+def enqueue_upload(filename: str, data: Union[bytes, BinaryIO], spool_dir: str = DEFAULT_SPOOL_DIR) -> str:
+    """
+    Queue an uploaded file for indexing.
+
+    The file is copied under incoming/ in fixed-size chunks (never held in
+    memory whole) and renamed into pending/ in one step, so the writer
+    never sees a partial upload. The job starts in the 'queued' state.
+
+    Args:
+        filename: Original file name; it becomes the chunks' source
+        data: File contents, or a binary file object to copy from
+        spool_dir: Spool directory shared with the writer
+
+    Returns:
+        Job ID
+    """
+    job_id = uuid.uuid4().hex
+    filename = os.path.basename(filename or "") or "upload"
+    staging = os.path.join(spool_dir, "incoming", job_id)
+    os.makedirs(staging)
+    with open(os.path.join(staging, filename), "wb") as f:
+        if isinstance(data, bytes):
+            f.write(data)
+        else:
+            shutil.copyfileobj(data, f, COPY_CHUNK_SIZE)
+        size = f.tell()
+    _write_status(spool_dir, job_id, {"job_id": job_id, "status": "queued", "filename": filename,
+                                      "bytes": size, "created_at": time.time()})
+    os.makedirs(os.path.join(spool_dir, "pending"), exist_ok=True)
+    os.replace(staging, os.path.join(spool_dir, "pending", job_id))
+    return job_id
+
+
+def job_status(job_id: str, spool_dir: str = DEFAULT_SPOOL_DIR) -> Optional[Dict[str, Any]]:
+    """
+    Current status record of a job, or None if there is no such job.
+
+    'status' is one of queued, running, done, failed or cancelled. A running
+    job carries 'stage' (parsing, embedding or indexing) and 'progress'
+    ({"done", "total", "unit"}: PDF pages parsed while embedding, chunks
+    otherwise; 'total' is None until known); a finished one carries 'chunks'
+    or 'error'.
+    """
+    if not _valid_job_id(job_id):
+        return None
+    try:
+        with open(_status_path(spool_dir, job_id), "r") as f:
+            status = json.load(f)
+    except FileNotFoundError:
+        return None
+    if status["status"] not in FINAL_STATES and os.path.exists(os.path.join(spool_dir, "cancel", job_id)):
+        status["cancel_requested"] = True
+    return status
+
+
+def cancel_job(job_id: str, spool_dir: str = DEFAULT_SPOOL_DIR) -> Optional[Dict[str, Any]]:
+    """
+    Cancel a job; returns its status afterwards, or None if there is no such job.
+
+    A queued job is withdrawn from pending/ at once. A running job is
+    flagged and stops at its next cancellation check; chunks are upserted
+    in one final step, so a cancelled job never leaves a partial document
+    behind. Once that step has started the job runs to completion.
+    Finished jobs are left as they are.
+    """
+    status = job_status(job_id, spool_dir)
+    if status is None or status["status"] in FINAL_STATES:
+        return status
+    withdrawn = os.path.join(spool_dir, "incoming", f"{job_id}.cancelled")
+    try:
+        # The writer claims jobs with the same kind of rename: whoever moves the directory owns the job
+        os.replace(os.path.join(spool_dir, "pending", job_id), withdrawn)
+    except FileNotFoundError:
+        os.makedirs(os.path.join(spool_dir, "cancel"), exist_ok=True)
+        open(os.path.join(spool_dir, "cancel", job_id), "w").close()
+        return job_status(job_id, spool_dir)
+    shutil.rmtree(withdrawn, ignore_errors=True)
+    status.update(status="cancelled")
+    _write_status(spool_dir, job_id, status)
+    logger.info(f"Cancelled queued upload {job_id}")
+    return status
+
+
+class IndexWriter:
+    def __init__(self,
+                 vector_store: Optional[VectorStore] = None,
+                 spool_dir: Optional[str] = None,
+                 poll_interval: float = 1.0,
+                 workers: Optional[int] = None):
+        """
+        The single process allowed to modify the on-disk indexes.
+
+        API endpoints queue uploads with enqueue_upload and return at once;
+        the writer takes queued jobs in arrival order onto a pool of worker
+        threads. Parsing and embedding run concurrently across jobs, upserts
+        one at a time, and every flush bumps the index generation so
+        read-only workers remap. A lock file in the spool directory keeps a
+        second writer from starting.
+
+        Args:
+            vector_store: Writable VectorStore to index into
+            spool_dir: Spool directory shared with the API workers (defaults to
+                UPLOAD_SPOOL_DIR, else cache/uploads)
+            poll_interval: Seconds between checks for new uploads
+            workers: Jobs processed at once (defaults to INGEST_WORKERS, else 2)
+        """
+        self.vector_store = vector_store or VectorStore()
+        self.document_processor = DocumentProcessor()
+        self.spool_dir = spool_dir or os.getenv("UPLOAD_SPOOL_DIR") or DEFAULT_SPOOL_DIR
+        self.poll_interval = poll_interval
+        self.workers = workers or int(os.getenv("INGEST_WORKERS", "2"))
+        self._lock_file = None
+        self._upsert_lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._stop: Optional[threading.Event] = None
+
+    def index_upload(self, filename: str, data: bytes,
+                     progress: Optional[Callable[[str, int, Optional[int], str], None]] = None,
+                     cancelled: Optional[Callable[[], bool]] = None) -> int:
+        """
+        Chunk, embed and index one uploaded file.
+
+        Args:
+            filename: File name used as the chunks' source (and to pick the parser)
+            data: File contents
+            progress: Called with (stage, done, total, unit) as work advances: pages
+                parsed of the PDF's pages, else chunks embedded of the file's
+                chunks; total is None while it is unknown
+            cancelled: Polled between embedding batches; returning True raises JobCancelled
+
+        Returns:
+            Number of chunks in the file
+        """
+        progress = progress or (lambda stage, done, total, unit: None)
+        cancelled = cancelled or (lambda: False)
+        store = self.vector_store
+        if not store.index:
+            store.initialize()
+
+        pages = self.document_processor.page_count(data, filename)
+        unit = "chunks" if pages is None else "pages"
+        progress("parsing", 0, pages, unit)
+        chunks: List[Document] = []
+        new_chunks: List[Document] = []
+        embeddings: List[List[float]] = []
+
+        def embed(batch: List[Document]):
+            if cancelled():
+                raise JobCancelled()
+            with span("upload_embed"):
+                # Chunk IDs carry a content hash: chunks already indexed need no new embedding
+                existing = store.existing_ids([c.metadata["chunk_id"] for c in batch])
+                batch = [c for c in batch if c.metadata["chunk_id"] not in existing]
+                if batch:
+                    embeddings.extend(store.embedder.get_embeddings([c.page_content for c in batch]))
+            new_chunks.extend(batch)
+            # A streamed PDF's chunk count is only known after its last page, so its pages are counted
+            done = len(chunks) if pages is None else chunks[-1].metadata["page_number"]
+            progress("embedding", done, total, unit)
+
+        # PDF pages are chunked as they are parsed, and each batch is embedded before
+        # later pages are extracted, so the first request doesn't wait for the last page.
+        # Other files are chunked in one go, which gives the chunk total up front
+        if pages is None:
+            parsed = self.document_processor.process_bytes(data, filename)
+            chunk_stream, total = iter(parsed), len(parsed)
+        else:
+            chunk_stream, total = self.document_processor.process_bytes(data, filename, stream=True), pages
+        while True:
+            with span("upload_parse"):
+                batch = list(itertools.islice(chunk_stream, EMBED_BATCH_SIZE))
+            if not batch:
+                break
+            chunks.extend(batch)
+            embed(batch)
+        if cancelled():
+            raise JobCancelled()
+        progress("indexing", 0, len(chunks), "chunks")
+        # Streamed PDF chunks only learn the total once the last page is parsed
+        for c in chunks:
+            c.metadata.setdefault("total_chunks", len(chunks))
+
+        embedded = dict(zip((c.metadata["chunk_id"] for c in new_chunks), embeddings))
+        docs = [
+            {
+                "id": c.metadata["chunk_id"],
+                "content": c.page_content,
+                "metadata": c.metadata,
+                "embedding": embedded.get(c.metadata["chunk_id"])
+            }
+            for c in chunks
+        ]
+        new_docs = [doc for doc in docs if doc["embedding"] is not None]
+        with span("upload_upsert"), self._upsert_lock:
+            if new_docs:
+                store.add_documents(new_docs, skip_existing=False)
+            # Chunks whose vectors already exist still need their BM25 entries and any changed metadata
+            if len(new_docs) < len(docs):
+                store.add_existing([doc for doc in docs if doc["embedding"] is None])
+        return len(chunks)
+
+    def _acquire(self):
+        """Take the writer lock or fail if another writer holds it"""
+        os.makedirs(self.spool_dir, exist_ok=True)
+        self._lock_file = open(os.path.join(self.spool_dir, "writer.lock"), "a")
+        if fcntl is None:
+            return
+        try:
+            fcntl.flock(self._lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            self._lock_file.close()
+            self._lock_file = None
+            raise RuntimeError(f"Another index writer is running on {self.spool_dir}")
+
+    def _requeue_interrupted(self):
+        """Put jobs a previous writer was running when it died back in the queue"""
+        running = os.path.join(self.spool_dir, "running")
+        if not os.path.isdir(running):
+            return
+        os.makedirs(os.path.join(self.spool_dir, "pending"), exist_ok=True)
+        for job_id in os.listdir(running):
+            os.replace(os.path.join(running, job_id), os.path.join(self.spool_dir, "pending", job_id))
+            logger.warning(f"Requeued interrupted upload {job_id}")
+
+    def pending_jobs(self) -> List[str]:
+        """Queued job IDs, oldest first"""
+        pending = os.path.join(self.spool_dir, "pending")
+        if not os.path.isdir(pending):
+            return []
+        jobs = []
+        for job_id in os.listdir(pending):
+            try:
+                jobs.append((os.stat(os.path.join(pending, job_id)).st_mtime_ns, job_id))
+            except FileNotFoundError:  # claimed or cancelled meanwhile
+                continue
+        return [job_id for _, job_id in sorted(jobs)]
+
+    def process_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Claim and index one queued upload, keeping its status record current.
+
+        Returns:
+            The final status record, or None if the job was cancelled (or
+            claimed) before this call got to it
+        """
+        job_dir = os.path.join(self.spool_dir, "running", job_id)
+        os.makedirs(os.path.dirname(job_dir), exist_ok=True)
+        try:
+            os.replace(os.path.join(self.spool_dir, "pending", job_id), job_dir)
+        except FileNotFoundError:
+            return None
+
+        cancel_flag = os.path.join(self.spool_dir, "cancel", job_id)
+        status = job_status(job_id, self.spool_dir) or {"job_id": job_id}
+        status.update(status="running", started_at=time.time())
+        _write_status(self.spool_dir, job_id, status)
+
+        def progress(stage: str, done: int, total: Optional[int], unit: str):
+            status.update(stage=stage, progress={"done": done, "total": total, "unit": unit})
+            _write_status(self.spool_dir, job_id, status)
+
+        try:
+            filename = os.listdir(job_dir)[0]
+            with open(os.path.join(job_dir, filename), "rb") as f:
+                data = f.read()
+            status["chunks"] = self.index_upload(filename, data, progress=progress,
+                                                 cancelled=lambda: os.path.exists(cancel_flag))
+            status["status"] = "done"
+            logger.info(f"Indexed upload {job_id} ({filename}): {status['chunks']} chunks")
+        except JobCancelled:
+            status["status"] = "cancelled"
+            logger.info(f"Cancelled running upload {job_id}")
+        except Exception as e:
+            status.update(status="failed", error=str(e))
+            logger.error(f"Failed to index upload {job_id}: {str(e)}")
+
+        status.pop("cancel_requested", None)
+        _write_status(self.spool_dir, job_id, status)
+        shutil.rmtree(job_dir, ignore_errors=True)
+        if os.path.exists(cancel_flag):
+            os.remove(cancel_flag)
+        return status
+
+    def process_pending(self) -> int:
+        """Index every queued upload on the worker pool; returns the number of jobs processed"""
+        jobs = self.pending_jobs()
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="ingest") as pool:
+            results = list(pool.map(self.process_job, jobs))
+        return sum(1 for result in results if result is not None)
+
+    def run(self, stop: Optional[threading.Event] = None):
+        """Process uploads until stop is set"""
+        stop = stop or threading.Event()
+        self._acquire()
+        try:
+            self._requeue_interrupted()
+            if not self.vector_store.index:
+                self.vector_store.initialize()
+            logger.info(f"Index writer watching {self.spool_dir} with {self.workers} workers")
+            in_flight: Dict[str, Future] = {}
+            with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="ingest") as pool:
+                while not stop.is_set():
+                    for job_id in [j for j, future in in_flight.items() if future.done()]:
+                        del in_flight[job_id]
+                    # Jobs wait in pending/ (where cancelling them is free) until a worker is free
+                    for job_id in self.pending_jobs():
+                        if len(in_flight) >= self.workers:
+                            break
+                        if job_id not in in_flight:
+                            in_flight[job_id] = pool.submit(self.process_job, job_id)
+                    if in_flight:
+                        wait(list(in_flight.values()), timeout=self.poll_interval, return_when=FIRST_COMPLETED)
+                    else:
+                        stop.wait(self.poll_interval)
+        finally:
+            self._lock_file.close()
+            self._lock_file = None
+
+    def start(self) -> threading.Thread:
+        """Run the writer on a background thread of this process (a standalone API server)"""
+        self._stop = threading.Event()
+
+        def target():
+            try:
+                self.run(self._stop)
+            except Exception as e:
+                logger.error(f"Index writer stopped: {str(e)}")
+
+        self._thread = threading.Thread(target=target, name="index-writer", daemon=True)
+        self._thread.start()
+        return self._thread
+
+    def stop(self, timeout: float = 30.0):
+        """Stop a writer started with start(), letting running jobs finish"""
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join(timeout)
+        self._thread = None
@@ -0,0 +1,119 @@
+import os
+import asyncio
+from typing import List, Dict, Any, Optional, AsyncIterator
+from config import load_config
+from clients import get_clients
+from metrics import count_call
+import logging
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+CHAT_MODEL = "gpt-3.5-turbo"
+
+SYSTEM_PROMPT = (
+    "You are an assistant for {partner} answering questions about {state} building regulations. "
+    "Answer only from the numbered context passages and cite them as [1], [2], ... "
+    "If the context does not contain the answer, say so."
+)
+
+
+def build_messages(question: str, results: List[Dict[str, Any]]) -> List[Dict[str, str]]:
+    """
+    Chat messages for a question grounded in retrieved passages.
+
+    Args:
+        question: User question
+        results: Matches from VectorStore.query (content, metadata, score)
+
+    Returns:
+        List of OpenAI chat messages
+    """
+    scope = load_config().get("scope", {})
+    system = SYSTEM_PROMPT.format(partner=scope.get("partner", "HSA"),
+                                  state=scope.get("state", "Maharashtra"))
+    context = "\n\n".join(
+        f"[{i}] ({r['metadata'].get('source', 'unknown')})\n{r['content']}"
+        for i, r in enumerate(results, 1)
+    )
+    return [
+        {"role": "system", "content": system},
+        {"role": "user", "content": f"Context:\n{context}\n\nQuestion: {question}"},
+    ]
+
+
+class LLMClient:
+    def __init__(self, model: Optional[str] = None, max_tokens: int = 512, temperature: float = 0.0):
+        """
+        Streaming chat completions from OpenAI.
+
+        Args:
+            model: Chat model name; defaults to CHAT_MODEL or the CHAT_MODEL env var
+            max_tokens: Maximum tokens generated per answer
+            temperature: Sampling temperature
+        """
+        self.model = model or os.getenv("CHAT_MODEL", CHAT_MODEL)
+        self.max_tokens = max_tokens
+        self.temperature = temperature
+        self._client = None
+
+    @property
+    def client(self):
+        """Shared pooled AsyncOpenAI client, looked up on first use"""
+        if self._client is None:
+            self._client = get_clients().async_openai
+        return self._client
+
+    async def astream(self, messages: List[Dict[str, str]]) -> AsyncIterator[str]:
+        """Yield answer tokens as the model produces them"""
+        try:
+            count_call("openai", "chat")
+            stream = await self.client.chat.completions.create(
+                model=self.model,
+                messages=messages,
+                max_tokens=self.max_tokens,
+                temperature=self.temperature,
+                stream=True
+            )
+            async for chunk in stream:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+        except Exception as e:
+            logger.error(f"Error streaming chat completion: {str(e)}")
+            raise
+
+
+class FakeLLMClient:
+    def __init__(self, tokens_per_second: float = 50.0, response: Optional[str] = None):
+        """
+        Local stand-in for LLMClient that emits tokens at a fixed rate.
+
+        Without a fixed response it answers with the first context passage,
+        so output is deterministic for a given retrieval result.
+
+        Args:
+            tokens_per_second: Emission rate
+            response: Fixed answer text to stream
+        """
+        self.tokens_per_second = tokens_per_second
+        self.response = response
+
+    async def astream(self, messages: List[Dict[str, str]]) -> AsyncIterator[str]:
+        text = self.response
+        if text is None:
+            context = messages[-1]["content"].split("Context:\n", 1)[-1].split("\n\nQuestion:", 1)[0]
+            passage = context.split("\n", 1)[-1].split("\n\n[", 1)[0].strip()
+            text = f"Based on the HSA regulations [1], {passage}" if passage else "I couldn't find relevant information in the documents."
+        for i, word in enumerate(text.split(" ")):
+            await asyncio.sleep(1.0 / self.tokens_per_second)
+            yield word if i == 0 else " " + word
+
+
+def get_llm_client():
+    """LLM client for the configured backend: LLM_BACKEND=openai (default) or fake"""
+    backend = os.getenv("LLM_BACKEND", "openai").lower()
+    if backend == "fake":
+        return FakeLLMClient(tokens_per_second=float(os.getenv("FAKE_LLM_TOKENS_PER_SECOND", "50")))
+    if backend != "openai":
+        raise ValueError(f"Unknown LLM_BACKEND '{backend}'. Use 'openai' or 'fake'.")
+    return LLMClient()
@@ -0,0 +1,739 @@
+import os
+import json
+import uuid
+import tempfile
+import threading
+from contextlib import contextmanager
+from types import SimpleNamespace
+from typing import List, Dict, Any, Optional, Iterable, Set, Tuple
+import numpy as np
+import logging
+
+try:
+    import fcntl
+except ImportError:  # Windows: no cross-process locking
+    fcntl = None
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+DEFAULT_INDEX_PATH = os.path.join(os.path.dirname(__file__), "cache", "local_index")
+
+# Record log entries kept before the log may be folded into records.json
+LOG_COMPACT_MIN_ENTRIES = 1000
+
+
+class LocalVectorIndex:
+    def __init__(self,
+                 dimension: int = 1536,
+                 path: Optional[str] = DEFAULT_INDEX_PATH,
+                 ivf_min_size: int = 50000,
+                 nprobe: int = 8,
+                 quantization: Optional[str] = None,
+                 rerank_factor: int = 4,
+                 read_only: bool = False):
+        """
+        In-process cosine-similarity index that mirrors the subset of the
+        Pinecone Index API used by VectorStore (upsert, update, query, fetch,
+        delete, describe_index_stats).
+
+        Vectors are L2-normalised and kept in one contiguous float32 matrix.
+        Below ivf_min_size vectors a query is an exact matrix-vector product
+        plus argpartition; at or above it the rows are partitioned into
+        k-means cells (IVF) and only the nprobe closest cells are scored.
+
+        Scalar metadata values are kept in an inverted index, so a filtered
+        query scores only the rows that match the filter.
+
+        With quantization="int8" the in-memory matrix holds int8 codes with a
+        per-dimension scale (4x smaller), and the exact float32 vectors live
+        in a memory-mapped file (a private scratch file in a writer,
+        vectors.f32 in a reader). The first pass scans the codes; the top
+        top_k * rerank_factor candidates are re-scored exactly from the mapped
+        file.
+
+        flush() persists only what changed: new and modified rows are written
+        in place in vectors.f32, and their IDs and metadata are appended to a
+        record log beside records.json, which is rewritten only once the log
+        outgrows the index. It holds a lock file while it writes, and if
+        another process (the API and update_dataset.py both write) flushed
+        since, it reloads the directory and re-applies the IDs changed here
+        on top, so neither writer's changes are lost.
+
+        With read_only=True the persisted vectors are mapped, not copied, so
+        every reader process serving the same directory shares one copy in
+        the page cache; upsert and delete raise.
+
+        Args:
+            dimension: Vector dimensions
+            path: Directory the index is persisted to; None keeps it in memory only
+            ivf_min_size: Corpus size at which IVF partitioning kicks in
+            nprobe: Number of IVF cells scored per query
+            quantization: None for an exact float32 matrix, or "int8"
+            rerank_factor: Candidates re-scored exactly per requested result when quantized
+            read_only: Map the persisted index read-only (for reader processes)
+        """
+        if quantization not in (None, "int8"):
+            raise ValueError(f"Unsupported quantization '{quantization}'. Use None or 'int8'.")
+        self.dimension = dimension
+        self.path = path
+        self.ivf_min_size = ivf_min_size
+        self.nprobe = nprobe
+        self.quantization = quantization
+        self.rerank_factor = rerank_factor
+        self.read_only = read_only
+
+        # Scan matrix: normalised float32 vectors, or their int8 codes when quantized
+        self._vectors = np.zeros((0, dimension), dtype=np.int8 if quantization else np.float32)
+        # Quantized only: exact float32 rows in a memory-mapped file, and the code scale per dimension
+        self._exact: Optional[np.memmap] = None
+        self._exact_file = None
+        self._scale = np.full(dimension, 1.0 / 127, dtype=np.float32)
+        self._calibrated_at = 0
+        self._size = 0
+        self._ids: List[str] = []
+        self._metadata: List[Dict[str, Any]] = []
+        self._rows: Dict[str, int] = {}
+        # field -> value -> IDs with that value
+        self._inverted: Dict[str, Dict[Any, Set[str]]] = {}
+        self._lock = threading.RLock()
+
+        # IVF state: one centroid per cell and the cell each row belongs to
+        self._centroids: Optional[np.ndarray] = None
+        self._assignments = np.zeros(0, dtype=np.int32)
+        self._ivf_built_at = 0
+
+        # Persistence: rows changed since the last flush, the row count last logged,
+        # and the epoch naming the record log that belongs to records.json
+        self._dirty: Set[int] = set()
+        self._logged_size = 0
+        self._epoch: Optional[str] = None
+        self._log_entries = 0
+        # Read-only: how far into the record log this process has read, and which records.json it loaded
+        self._log_offset = 0
+        self._records_stamp: Optional[Tuple[int, int]] = None
+        # Writers: IDs changed here since the last flush (and whether the index was cleared),
+        # re-applied on top of what other processes flushed meanwhile; the on-disk state last seen
+        self._touched: Set[str] = set()
+        self._cleared = False
+        self._synced: Optional[Tuple[Any, int]] = None
+
+        if self.path:
+            with self._file_lock(fcntl.LOCK_SH if fcntl else 0):
+                if os.path.exists(os.path.join(self.path, "records.json")):
+                    self._load()
+                self._synced = self._disk_state()
+
+    @contextmanager
+    def _file_lock(self, mode: int):
+        """Lock shared between processes using this directory"""
+        os.makedirs(self.path, exist_ok=True)
+        with open(os.path.join(self.path, "index.lock"), "a") as lock:
+            if fcntl is not None:
+                fcntl.flock(lock, mode)
+            yield
+
+    def _disk_state(self) -> Tuple[Any, int]:
+        """Which records.json is on disk and how long its record log is, to spot other writers' flushes"""
+        log_size = 0
+        if self._epoch is not None and os.path.exists(self._log_path()):
+            log_size = os.path.getsize(self._log_path())
+        return self._stamp(os.path.join(self.path, "records.json")), log_size
+
+    def _reload(self):
+        """Replace the in-memory tables with what is on disk"""
+        self._size = self._logged_size = 0
+        self._ids, self._metadata, self._rows = [], [], {}
+        self._inverted = {}
+        self._centroids = None
+        self._ivf_built_at = self._calibrated_at = 0
+        self._dirty = set()
+        self._epoch, self._log_entries, self._log_offset = None, 0, 0
+        self._records_stamp = None
+        if os.path.exists(os.path.join(self.path, "records.json")):
+            self._load()
+
+    def _load(self):
+        """Load a previously flushed index from disk"""
+        records_path = os.path.join(self.path, "records.json")
+        self._records_stamp = self._stamp(records_path)
+        with open(records_path, "r") as f:
+            records = json.load(f)
+        ids, metadata = records["ids"], records["metadata"]
+        self._epoch = records.get("epoch")
+        self._log_offset = self._log_entries = 0
+        self._apply_log(ids, metadata, self._read_log())
+        size = len(ids)
+        mapped_path = os.path.join(self.path, "vectors.f32")
+        if os.path.exists(mapped_path):
+            capacity = os.path.getsize(mapped_path) // (4 * self.dimension)
+            vectors = np.memmap(mapped_path, dtype=np.float32, mode="r", shape=(capacity, self.dimension))[:size]
+        else:
+            # Written before vectors.f32 was the format; the first flush rewrites it
+            vectors = np.load(os.path.join(self.path, "vectors.npy"), mmap_mode="r" if self.read_only else None)
+            self._dirty = set(range(size))
+        if vectors.shape[0] < size:
+            raise ValueError(f"Local index at {self.path} lists {size} vectors but stores {vectors.shape[0]}")
+        if self.read_only:
+            # Serve straight from the mapping; quantized readers only build their int8 codes
+            if self.quantization:
+                self._exact = vectors
+                self._vectors = np.zeros((size, self.dimension), dtype=np.int8)
+                self._size = size
+                self._calibrate()
+            else:
+                self._vectors = vectors[:size]
+        elif self.quantization:
+            self._open_exact(max(size, 1024))
+            self._exact[:size] = vectors
+            self._vectors = np.zeros((self._exact.shape[0], self.dimension), dtype=np.int8)
+            self._size = size
+            self._calibrate()
+        else:
+            self._vectors = np.array(vectors, dtype=np.float32)
+        self._size = self._logged_size = size
+        self._ids = ids
+        self._metadata = metadata
+        self._rows = {id_: row for row, id_ in enumerate(self._ids)}
+        for id_, metadata in zip(self._ids, self._metadata):
+            self._index_metadata(id_, metadata)
+        self._assignments = np.zeros(self._vectors.shape[0], dtype=np.int32)
+        logger.info(f"Loaded local index with {self._size} vectors from {self.path}")
+
+    def _log_path(self) -> str:
+        return os.path.join(self.path, f"records.{self._epoch}.log")
+
+    @staticmethod
+    def _stamp(path: str) -> Optional[Tuple[int, int]]:
+        # records.json is replaced, never rewritten in place, so its inode changes on every snapshot
+        try:
+            stat = os.stat(path)
+            return stat.st_ino, stat.st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+    def _read_log(self) -> List[Dict[str, Any]]:
+        """Record log entries written since this process last read the log"""
+        if self._epoch is None or not os.path.exists(self._log_path()):
+            return []
+        entries = []
+        with open(self._log_path(), "r") as f:
+            f.seek(self._log_offset)
+            while True:
+                line = f.readline()
+                # A torn last line (a flush still being written) is read next time
+                if not line.endswith("\n"):
+                    break
+                entries.append(json.loads(line))
+                self._log_offset = f.tell()
+        self._log_entries += len(entries)
+        return entries
+
+    @staticmethod
+    def _apply_log(ids: List[str], metadata: List[Dict[str, Any]], entries: List[Dict[str, Any]]):
+        """Apply record log entries to ID and metadata lists"""
+        for entry in entries:
+            if "size" in entry:
+                del ids[entry["size"]:], metadata[entry["size"]:]
+                ids.extend([None] * (entry["size"] - len(ids)))
+                metadata.extend([{}] * (entry["size"] - len(metadata)))
+            else:
+                ids[entry["row"]], metadata[entry["row"]] = entry["id"], entry["metadata"]
+
+    def refresh(self) -> int:
+        """
+        Catch the index up with what other writers have flushed since it loaded.
+
+        A read-only index applies new record log entries to the ID, metadata and
+        inverted index tables, and re-reads only the rows they name from
+        vectors.f32; records.json is parsed again only after a writer has folded
+        its log into a new snapshot. A writer reloads and re-applies its own
+        unflushed changes on top, as flush() does.
+
+        Returns:
+            Number of rows refreshed
+        """
+        if not self.path:
+            return 0
+        if not self.read_only:
+            with self._lock, self._file_lock(fcntl.LOCK_SH if fcntl else 0):
+                if self._disk_state() == self._synced:
+                    return 0
+                self._catch_up()
+                self._synced = self._disk_state()
+                return self._size
+        with self._lock, self._file_lock(fcntl.LOCK_SH if fcntl else 0):
+            if self._stamp(os.path.join(self.path, "records.json")) != self._records_stamp:
+                self._reload()
+                return self._size
+            entries = self._read_log()
+            if not entries:
+                return 0
+
+            # Rows written or cut off by the entries; drop their old records first, since
+            # an ID can move between two of them
+            old_size = self._size
+            low = min([e["size"] for e in entries if "size" in e] + [old_size])
+            rows = set(range(low, old_size)) | {e["row"] for e in entries if "row" in e}
+            for row in rows:
+                if row < old_size:
+                    id_ = self._ids[row]
+                    self._unindex_metadata(id_, self._metadata[row])
+                    if self._rows.get(id_) == row:
+                        del self._rows[id_]
+            self._apply_log(self._ids, self._metadata, entries)
+            self._size = len(self._ids)
+            rows = sorted(row for row in rows if row < self._size)
+            for row in rows:
+                self._rows[self._ids[row]] = row
+                self._index_metadata(self._ids[row], self._metadata[row])
+
+            # The writer may have grown the file since it was mapped
+            mapped_path = os.path.join(self.path, "vectors.f32")
+            capacity = os.path.getsize(mapped_path) // (4 * self.dimension)
+            vectors = np.memmap(mapped_path, dtype=np.float32, mode="r", shape=(capacity, self.dimension))
+            if self._assignments.shape[0] < self._size:
+                assignments = np.zeros(max(self._size, 2 * self._assignments.shape[0]), dtype=np.int32)
+                assignments[:old_size] = self._assignments[:old_size]
+                self._assignments = assignments
+            if self.quantization:
+                self._exact = vectors
+                if self._vectors.shape[0] < self._size:
+                    codes = np.zeros((max(self._size, 2 * self._vectors.shape[0]), self.dimension), dtype=np.int8)
+                    codes[:old_size] = self._vectors[:old_size]
+                    self._vectors = codes
+                if self._size >= 2 * self._calibrated_at:
+                    self._calibrate()
+                elif rows:
+                    self._vectors[rows] = self._encode(np.asarray(vectors[rows]))
+            else:
+                self._vectors = vectors[:self._size]
+            if self._centroids is not None and rows:
+                self._assignments[rows] = np.argmax(self._exact_rows(rows) @ self._centroids.T, axis=1)
+        logger.info(f"Refreshed {len(rows)} rows of local index at {self.path}")
+        return len(rows)
+
+    def flush(self):
+        """Persist the rows changed since the last flush"""
+        if not self.path or self.read_only:
+            return
+        with self._lock, self._file_lock(fcntl.LOCK_EX if fcntl else 0):
+            if self._disk_state() != self._synced:
+                self._catch_up()
+            dirty = sorted(row for row in self._dirty if row < self._size)
+            self._write_vectors(dirty)
+
+            # Vectors first, then the records that point at them
+            entries = []
+            if self._size != self._logged_size:
+                entries.append({"size": self._size})
+            entries += [{"row": row, "id": self._ids[row], "metadata": self._metadata[row]} for row in dirty]
+            if self._epoch is None or self._log_entries + len(entries) > max(LOG_COMPACT_MIN_ENTRIES, self._size):
+                self._write_records()
+            elif entries:
+                with open(self._log_path(), "a") as f:
+                    f.write("".join(json.dumps(entry) + "\n" for entry in entries))
+                self._log_entries += len(entries)
+            self._dirty.clear()
+            self._touched.clear()
+            self._cleared = False
+            self._logged_size = self._size
+            self._synced = self._disk_state()
+
+            stale = os.path.join(self.path, "vectors.npy")
+            if os.path.exists(stale):
+                os.remove(stale)
+
+    def _catch_up(self):
+        """Reload what other writers flushed, then re-apply the changes made here (caller holds both locks)"""
+        present = sorted((id_ for id_ in self._touched if id_ in self._rows), key=self._rows.get)
+        rows = np.asarray([self._rows[id_] for id_ in present], dtype=np.int64)
+        # Copied out before the reload reuses the scratch file
+        vectors = np.array(self._exact_rows(rows)) if present else None
+        metadata = [self._metadata[row] for row in rows.tolist()]
+        deleted = [id_ for id_ in self._touched if id_ not in self._rows]
+        cleared = self._cleared
+
+        self._reload()
+        if cleared:
+            self.delete(delete_all=True)
+        if deleted:
+            self.delete(ids=deleted)
+        if present:
+            self.upsert(list(zip(present, vectors, metadata)))
+        logger.info(f"Merged {len(present) + len(deleted)} changed IDs into the local index other writers "
+                    f"flushed at {self.path}")
+
+    def _write_vectors(self, rows: List[int]):
+        """Write rows of the exact float32 vectors in place in vectors.f32, one write per run of adjacent rows"""
+        mapped_path = os.path.join(self.path, "vectors.f32")
+        row_bytes = self.dimension * 4
+        with open(mapped_path, "r+b" if os.path.exists(mapped_path) else "w+b") as f:
+            start = 0
+            while start < len(rows):
+                end = start
+                while end + 1 < len(rows) and rows[end + 1] == rows[end] + 1:
+                    end += 1
+                f.seek(rows[start] * row_bytes)
+                f.write(self._exact_rows(slice(rows[start], rows[end] + 1)).astype(np.float32).tobytes())
+                start = end + 1
+
+    def _write_records(self):
+        """Fold the record log into a new records.json under a new epoch"""
+        old_log = self._log_path() if self._epoch is not None else None
+        epoch = uuid.uuid4().hex
+        tmp_path = os.path.join(self.path, "records.json.tmp")
+        with open(tmp_path, "w") as f:
+            json.dump({"epoch": epoch, "ids": self._ids, "metadata": self._metadata}, f)
+        os.replace(tmp_path, os.path.join(self.path, "records.json"))
+        self._epoch, self._log_entries = epoch, 0
+        if old_log is not None and os.path.exists(old_log):
+            os.remove(old_log)
+
+    def _open_exact(self, capacity: int):
+        """Map (or grow) the scratch float32 file backing a quantized writer"""
+        if self._exact is not None:
+            self._exact.flush()
+            self._exact = None
+        if self._exact_file is None:
+            # Anonymous file, removed by the OS once closed. Not vectors.f32 itself: rows
+            # reach that only in flush(), under the lock, so writers can't overwrite each other
+            self._exact_file = tempfile.TemporaryFile()
+        nbytes = capacity * self.dimension * 4
+        if os.fstat(self._exact_file.fileno()).st_size < nbytes:
+            self._exact_file.truncate(nbytes)
+        self._exact = np.memmap(self._exact_file, dtype=np.float32, mode="r+", shape=(capacity, self.dimension))
+
+    def _reserve(self, extra: int):
+        """Grow the matrix geometrically so appends stay amortised O(1)"""
+        needed = self._size + extra
+        if needed <= self._vectors.shape[0]:
+            return
+        capacity = max(needed, 2 * self._vectors.shape[0], 1024)
+        vectors = np.zeros((capacity, self.dimension), dtype=self._vectors.dtype)
+        vectors[:self._size] = self._vectors[:self._size]
+        assignments = np.zeros(capacity, dtype=np.int32)
+        assignments[:self._size] = self._assignments[:self._size]
+        self._vectors, self._assignments = vectors, assignments
+        if self.quantization:
+            self._open_exact(capacity)
+
+    def _calibrate(self):
+        """Fit the per-dimension int8 scale to the stored vectors and re-encode every row"""
+        exact = self._exact[:self._size]
+        max_abs = np.zeros(self.dimension, dtype=np.float32)
+        for start in range(0, self._size, 65536):
+            np.maximum(max_abs, np.abs(exact[start:start + 65536]).max(axis=0), out=max_abs)
+        max_abs[max_abs == 0] = 1.0
+        self._scale = max_abs / 127
+        for start in range(0, self._size, 65536):
+            block = exact[start:start + 65536]
+            self._vectors[start:start + block.shape[0]] = self._encode(block)
+        self._calibrated_at = self._size
+
+    def _encode(self, vectors: np.ndarray) -> np.ndarray:
+        """int8 codes for normalised vectors; values beyond the fitted range are clipped"""
+        return np.clip(np.rint(vectors / self._scale), -127, 127).astype(np.int8)
+
+    def _exact_rows(self, rows) -> np.ndarray:
+        """Exact float32 vectors for rows (a slice or index array)"""
+        return np.asarray(self._exact[rows] if self.quantization else self._vectors[rows])
+
+    def _scan_scores(self, q: np.ndarray, rows: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        Similarity of q to every stored row (or just rows): exact, or approximate from int8 codes.
+
+        q is one vector (d,) or a matrix of query columns (d, m); scores are (n,) or (n, m).
+        """
+        if not self.quantization:
+            matrix = self._vectors[:self._size] if rows is None else self._vectors[rows]
+            return matrix @ q
+        # codes @ (scale * q) approximates vectors @ q; cast in blocks to bound the float32 copy
+        scaled_q = (self._scale.reshape((-1,) + (1,) * (q.ndim - 1)) * q).astype(np.float32)
+        total = self._size if rows is None else len(rows)
+        scores = np.empty((total,) + q.shape[1:], dtype=np.float32)
+        for start in range(0, total, 2048):
+            block = self._vectors[start:min(start + 2048, total)] if rows is None else self._vectors[rows[start:start + 2048]]
+            scores[start:start + block.shape[0]] = block.astype(np.float32) @ scaled_q
+        return scores
+
+    def memory_bytes(self) -> int:
+        """Bytes held in memory by the scan matrix (excludes the mapped float32 file)"""
+        return int(self._vectors[:self._size].nbytes)
+
+    @staticmethod
+    def _normalize(vectors: np.ndarray) -> np.ndarray:
+        norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return vectors / norms
+
+    @staticmethod
+    def _parse_vector(vector: Any):
+        """Accept Pinecone-style dicts as well as (id, values[, metadata]) tuples"""
+        if isinstance(vector, dict):
+            return vector["id"], vector["values"], vector.get("metadata") or {}
+        id_, values, *rest = vector
+        return id_, values, (rest[0] if rest else {}) or {}
+
+    def _check_writable(self):
+        if self.read_only:
+            raise RuntimeError(f"Local index at {self.path} is open read-only")
+
+    def upsert(self, vectors: Iterable[Any], namespace: Optional[str] = None):
+        """Insert or overwrite vectors by ID"""
+        self._check_writable()
+        parsed = [self._parse_vector(v) for v in vectors]
+        if not parsed:
+            return SimpleNamespace(upserted_count=0)
+        values = self._normalize(np.asarray([p[1] for p in parsed], dtype=np.float32))
+
+        with self._lock:
+            self._reserve(len(parsed))
+            codes = self._encode(values) if self.quantization else values
+            for (id_, _, metadata), vector, code in zip(parsed, values, codes):
+                row = self._rows.get(id_)
+                if row is None:
+                    row = self._size
+                    self._size += 1
+                    self._ids.append(id_)
+                    self._metadata.append(metadata)
+                    self._rows[id_] = row
+                else:
+                    self._unindex_metadata(id_, self._metadata[row])
+                    self._metadata[row] = metadata
+                self._index_metadata(id_, metadata)
+                self._dirty.add(row)
+                self._touched.add(id_)
+                self._vectors[row] = code
+                if self.quantization:
+                    self._exact[row] = vector
+                if self._centroids is not None:
+                    self._assignments[row] = int(np.argmax(self._centroids @ vector))
+            # Refit the scale while the corpus is small, and whenever it has doubled since
+            if self.quantization and self._size >= 2 * self._calibrated_at:
+                self._calibrate()
+        return SimpleNamespace(upserted_count=len(parsed))
+
+    def delete(self, ids: Optional[List[str]] = None, delete_all: bool = False,
+               namespace: Optional[str] = None):
+        """Delete vectors by ID, or everything with delete_all=True"""
+        self._check_writable()
+        with self._lock:
+            if delete_all:
+                self._size = 0
+                self._ids, self._metadata, self._rows = [], [], {}
+                self._inverted = {}
+                self._centroids = None
+                self._calibrated_at = 0
+                self._dirty.clear()
+                self._touched.clear()
+                self._cleared = True
+                return
+            for id_ in ids or []:
+                row = self._rows.pop(id_, None)
+                if row is None:
+                    continue
+                self._unindex_metadata(id_, self._metadata[row])
+                self._touched.add(id_)
+                # Move the last row into the hole to keep the matrix contiguous
+                last = self._size - 1
+                if row != last:
+                    self._vectors[row] = self._vectors[last]
+                    if self.quantization:
+                        self._exact[row] = self._exact[last]
+                    self._assignments[row] = self._assignments[last]
+                    self._ids[row] = self._ids[last]
+                    self._metadata[row] = self._metadata[last]
+                    self._rows[self._ids[row]] = row
+                    self._dirty.add(row)
+                self._ids.pop()
+                self._metadata.pop()
+                self._size -= 1
+
+    def update(self, id: str, values: Optional[List[float]] = None,
+               set_metadata: Optional[Dict[str, Any]] = None, namespace: Optional[str] = None):
+        """Overwrite a vector's values and/or merge fields into its metadata, like Pinecone's update"""
+        self._check_writable()
+        with self._lock:
+            row = self._rows.get(id)
+            if row is None:
+                return {}
+            if values is not None:
+                self.upsert([(id, values, self._metadata[row])])
+            if set_metadata:
+                self._unindex_metadata(id, self._metadata[row])
+                self._metadata[row] = {**self._metadata[row], **set_metadata}
+                self._index_metadata(id, self._metadata[row])
+                self._dirty.add(row)
+                self._touched.add(id)
+        return {}
+
+    def fetch(self, ids: List[str], namespace: Optional[str] = None):
+        """Return stored vectors for the IDs that exist"""
+        with self._lock:
+            found = {}
+            for id_ in ids:
+                row = self._rows.get(id_)
+                if row is not None:
+                    found[id_] = SimpleNamespace(id=id_, values=self._exact_rows(row).tolist(),
+                                                 metadata=self._metadata[row])
+        return SimpleNamespace(vectors=found)
+
+    def describe_index_stats(self, namespace: Optional[str] = None):
+        return SimpleNamespace(
+            dimension=self.dimension,
+            total_vector_count=self._size,
+            namespaces={"": SimpleNamespace(vector_count=self._size)}
+        )
+
+    @staticmethod
+    def _indexable_values(value: Any) -> List[Any]:
+        """Hashable scalars to index for a metadata value (lists index each element)"""
+        values = value if isinstance(value, list) else [value]
+        return [v for v in values if isinstance(v, (str, int, float, bool))]
+
+    def _index_metadata(self, id_: str, metadata: Dict[str, Any]):
+        for field, value in metadata.items():
+            if field == "content":
+                continue
+            for v in self._indexable_values(value):
+                self._inverted.setdefault(field, {}).setdefault(v, set()).add(id_)
+
+    def _unindex_metadata(self, id_: str, metadata: Dict[str, Any]):
+        for field, value in metadata.items():
+            for v in self._indexable_values(value):
+                ids = self._inverted.get(field, {}).get(v)
+                if ids is not None:
+                    ids.discard(id_)
+                    if not ids:
+                        del self._inverted[field][v]
+
+    def _match_filter(self, filter: Dict[str, Any]) -> Set[str]:
+        """IDs matching a Pinecone-style filter ($eq, $in, $and) via the inverted index"""
+        matched: Optional[Set[str]] = None
+        for field, condition in filter.items():
+            if field == "$and":
+                ids = set.intersection(*(self._match_filter(c) for c in condition)) if condition else set(self._rows)
+            else:
+                if not isinstance(condition, dict):
+                    condition = {"$eq": condition}
+                ids = set(self._rows)
+                for op, value in condition.items():
+                    if op == "$eq":
+                        ids &= self._inverted.get(field, {}).get(value, set())
+                    elif op == "$in":
+                        values = self._inverted.get(field, {})
+                        ids &= set().union(*(values.get(v, set()) for v in value))
+                    else:
+                        raise ValueError(f"Unsupported filter operator for local index: {op}")
+            matched = ids if matched is None else matched & ids
+        return matched if matched is not None else set(self._rows)
+
+    def query(self, vector: List[float], top_k: int = 5, include_metadata: bool = True,
+              filter: Optional[Dict[str, Any]] = None, namespace: Optional[str] = None, **kwargs):
+        """Return the top_k most similar vectors by cosine similarity, optionally filtered on metadata"""
+        q = self._normalize(np.asarray(vector, dtype=np.float32))
+        with self._lock:
+            if self._size == 0:
+                return SimpleNamespace(matches=[])
+            if filter:
+                # Score only the rows the inverted index admits
+                candidates = np.fromiter(sorted(self._rows[id_] for id_ in self._match_filter(filter)), dtype=np.int64)
+                if candidates.size == 0:
+                    return SimpleNamespace(matches=[])
+            else:
+                candidates = self._ivf_candidates(q) if self._size >= self.ivf_min_size else None
+            scores = self._scan_scores(q, candidates)
+            return SimpleNamespace(matches=self._top_matches(q, scores, candidates, top_k, include_metadata))
+
+    def query_many(self, vectors: List[List[float]], top_k: int = 5, include_metadata: bool = True,
+                   filter: Optional[Dict[str, Any]] = None, namespace: Optional[str] = None, **kwargs):
+        """
+        Run several queries sharing top_k and filter in one pass.
+
+        The queries are scored as one matrix-matrix product, so the stored
+        vectors are streamed from memory once per batch instead of once per
+        query. IVF-sized indexes probe different cells per query and fall
+        back to one query at a time.
+
+        Returns:
+            One query() result per vector, in input order
+        """
+        if not len(vectors):
+            return []
+        queries = self._normalize(np.asarray(vectors, dtype=np.float32))
+        with self._lock:
+            if self._size == 0:
+                return [SimpleNamespace(matches=[]) for _ in range(len(queries))]
+            if filter:
+                candidates = np.fromiter(sorted(self._rows[id_] for id_ in self._match_filter(filter)), dtype=np.int64)
+                if candidates.size == 0:
+                    return [SimpleNamespace(matches=[]) for _ in range(len(queries))]
+            elif self._size >= self.ivf_min_size:
+                return [self.query(q, top_k=top_k, include_metadata=include_metadata) for q in queries]
+            else:
+                candidates = None
+            rows = self._size if candidates is None else candidates.size
+            # Bound the (rows x queries) score matrix to ~64 MB
+            group = max(1, (1 << 24) // max(rows, 1))
+            results = []
+            for start in range(0, len(queries), group):
+                block = queries[start:start + group]
+                scores = self._scan_scores(block.T, candidates)
+                for i, q in enumerate(block):
+                    results.append(SimpleNamespace(
+                        matches=self._top_matches(q, scores[:, i], candidates, top_k, include_metadata)))
+            return results
+
+    def _top_matches(self, q: np.ndarray, scores: np.ndarray, candidates: Optional[np.ndarray],
+                     top_k: int, include_metadata: bool) -> List[SimpleNamespace]:
+        """Best top_k rows by scan scores, re-scored exactly first when quantized"""
+        k = min(top_k * self.rerank_factor if self.quantization else top_k, scores.shape[0])
+        top = np.argpartition(-scores, k - 1)[:k] if k < scores.shape[0] else np.arange(scores.shape[0])
+        rows = top if candidates is None else candidates[top]
+        if self.quantization:
+            # Re-score the shortlist exactly from the mapped float32 rows (read in row order)
+            order = np.argsort(rows)
+            rows, top = rows[order], top[order]
+            scores = scores.copy()
+            scores[top] = self._exact_rows(rows) @ q
+        keep = np.argsort(-scores[top])[:top_k]
+        top, rows = top[keep], rows[keep]
+        return [
+            SimpleNamespace(
+                id=self._ids[row],
+                score=float(score),
+                metadata=self._metadata[row] if include_metadata else None
+            )
+            for row, score in zip(rows.tolist(), scores[top].tolist())
+        ]
+
+    def _ivf_candidates(self, q: np.ndarray) -> np.ndarray:
+        """Rows in the nprobe cells whose centroids are closest to q"""
+        # Re-cluster whenever the corpus has doubled since the last build
+        if self._centroids is None or self._size >= 2 * self._ivf_built_at:
+            self._build_ivf()
+        cells = np.argpartition(-(self._centroids @ q), min(self.nprobe, len(self._centroids)) - 1)[:self.nprobe]
+        return np.flatnonzero(np.isin(self._assignments[:self._size], cells))
+
+    def _build_ivf(self, iterations: int = 10):
+        """Spherical k-means over a sample of rows, then assign every row to a cell"""
+        vectors = self._exact_rows(slice(0, self._size)) if self.quantization else self._vectors[:self._size]
+        nlist = max(1, int(np.sqrt(self._size)))
+        rng = np.random.default_rng(0)
+        sample = vectors[rng.choice(self._size, size=min(self._size, nlist * 64), replace=False)]
+        centroids = sample[rng.choice(sample.shape[0], size=nlist, replace=False)].copy()
+        for _ in range(iterations):
+            labels = np.argmax(sample @ centroids.T, axis=1)
+            for cell in range(nlist):
+                members = sample[labels == cell]
+                if len(members):
+                    centroids[cell] = members.sum(axis=0)
+            centroids = self._normalize(centroids)
+
+        for start in range(0, self._size, 65536):
+            block = vectors[start:start + 65536]
+            self._assignments[start:start + block.shape[0]] = np.argmax(block @ centroids.T, axis=1)
+        self._centroids = centroids
+        self._ivf_built_at = self._size
+        logger.info(f"Built IVF partitioning with {nlist} cells over {self._size} vectors")
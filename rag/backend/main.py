@@ -1,10 +1,12 @@
-from fastapi import FastAPI, UploadFile, File
+from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from rag_service import RAGService
+from index_writer import IndexWriter
+from upload_api import create_upload_router
+from clients import get_clients
 from typing import List
-import os
+import asyncio
 from pydantic import BaseModel
-import tempfile
 
 app = FastAPI()
 
@@ -17,31 +19,29 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Initialize RAG service
+# Initialize RAG service; each worker process connects on startup, not at import
 rag_service = RAGService()
-rag_service.initialize()
+# Uploads are queued and indexed in the background; see upload_api for the job endpoints
+index_writer = IndexWriter(vector_store=rag_service.vector_store)
+app.include_router(create_upload_router(index_writer.spool_dir))
+
+@app.on_event("startup")
+async def startup_event():
+    rag_service.initialize()
+    # Read-only workers (serve.py) leave uploads to the writer process
+    if not rag_service.vector_store.read_only:
+        index_writer.start()
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Stop the in-process index writer and release pooled connections"""
+    await asyncio.to_thread(index_writer.stop)
+    await get_clients().aclose()
 
 class SearchQuery(BaseModel):
     query: str
     k: int = 4
 
-@app.post("/api/upload")
-async def upload_document(file: UploadFile = File(...)):
-    # Create a temporary file
-    with tempfile.NamedTemporaryFile(delete=False) as temp_file:
-        content = await file.read()
-        temp_file.write(content)
-        temp_file.flush()
-        
-        # Process the file based on its extension
-        file_type = "pdf" if file.filename.endswith(".pdf") else "text"
-        rag_service.process_and_store_document(temp_file.name, file_type)
-        
-        # Clean up
-        os.unlink(temp_file.name)
-    
-    return {"message": "Document processed successfully"}
-
 @app.post("/api/search")
 async def search_documents(query: SearchQuery):
     results = rag_service.search(query.query, query.k)
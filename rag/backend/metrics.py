@@ -0,0 +1,272 @@
+import time
+import asyncio
+import threading
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import List, Dict, Any, Optional, Tuple, Callable, Iterable, Iterator
+import logging
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Seconds; spans from a cached lookup (~50us) up to a slow LLM call
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# (labels, value) pairs of one metric family
+Samples = List[Tuple[Dict[str, str], float]]
+# A collector returns (name, type, help, samples) families computed at scrape time
+Collector = Callable[[], Iterable[Tuple[str, str, str, Samples]]]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(str(value))}"' for name, value in labels.items()) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class Counter:
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()):
+        """
+        Monotonic counter, one value per label combination.
+
+        Args:
+            name: Metric name (conventionally ending in _total)
+            documentation: HELP text
+            labelnames: Label names every increment must supply
+        """
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, Any]) -> Tuple[str, ...]:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def collect(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(dict(zip(self.labelnames, key)))} {_format_value(value)}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = (),
+                 buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        """
+        Cumulative histogram of observed values, one per label combination.
+
+        Args:
+            name: Metric name (conventionally ending in _seconds)
+            documentation: HELP text
+            labelnames: Label names every observation must supply
+            buckets: Upper bounds of the buckets, ascending; +Inf is added
+        """
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # Per label key: non-cumulative bucket counts (last one is +Inf), sum
+        self._series: Dict[Tuple[str, ...], Tuple[List[int], List[float]]] = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, Any]) -> Tuple[str, ...]:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = ([0] * (len(self.buckets) + 1), [0.0])
+            series[0][index] += 1
+            series[1][0] += value
+
+    @contextmanager
+    def time(self, **labels) -> Iterator[None]:
+        """Observe the wall-clock duration of the block, also when it raises"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def count(self, **labels) -> int:
+        series = self._series.get(self._key(labels))
+        return sum(series[0]) if series else 0
+
+    def collect(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, (counts, total) in sorted(self._series.items()):
+                labels = dict(zip(self.labelnames, key))
+                cumulative = 0
+                for bound, count in zip(self.buckets + (float("inf"),), counts):
+                    cumulative += count
+                    bucket_labels = _format_labels({**labels, "le": _format_value(bound)})
+                    lines.append(f"{self.name}_bucket{bucket_labels} {cumulative}")
+                lines.append(f"{self.name}_sum{_format_labels(labels)} {_format_value(total[0])}")
+                lines.append(f"{self.name}_count{_format_labels(labels)} {cumulative}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        """
+        Metrics of one process, rendered in the Prometheus text format.
+
+        Each worker process keeps its own registry; scrape every worker (or
+        put one worker behind /metrics) rather than expecting totals across them.
+        """
+        self._metrics: List[Any] = []
+        self._collectors: List[Collector] = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def register_collector(self, collector: Collector):
+        """Add a callback for values that already live elsewhere (e.g. cache hit counters)"""
+        self._collectors.append(collector)
+
+    def render(self) -> str:
+        """All metrics in the Prometheus text exposition format (version 0.0.4)"""
+        lines: List[str] = []
+        for metric in self._metrics:
+            lines.extend(metric.collect())
+        for collector in self._collectors:
+            try:
+                families = list(collector())
+            except Exception as e:
+                logger.error(f"Metrics collector failed: {str(e)}")
+                continue
+            for name, kind, documentation, samples in families:
+                lines.append(f"# HELP {name} {documentation}")
+                lines.append(f"# TYPE {name} {kind}")
+                lines.extend(f"{name}{_format_labels(labels)} {_format_value(value)}" for labels, value in samples)
+        return "\n".join(lines) + "\n"
+
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+REGISTRY = Registry()
+
+STAGE_SECONDS = REGISTRY.register(Histogram(
+    "rag_stage_seconds", "Time spent in each hot-path stage", ("stage",)))
+REQUEST_SECONDS = REGISTRY.register(Histogram(
+    "rag_request_seconds", "HTTP request latency until the last body byte", ("method", "path", "status")))
+API_CALLS = REGISTRY.register(Counter(
+    "rag_api_calls_total", "Calls to external services", ("service", "operation")))
+RERANK_FALLBACKS = REGISTRY.register(Counter(
+    "rag_rerank_fallbacks_total", "Queries answered in retrieval order because re-ranking failed or ran over budget",
+    ("reason",)))
+
+
+def span(stage: str):
+    """
+    Time a hot-path stage into rag_stage_seconds.
+
+    Usable around sync and async code alike:
+
+        with span("query_embed"):
+            embedding = await embedder.aget_embedding(query)
+    """
+    return STAGE_SECONDS.time(stage=stage)
+
+
+def count_call(service: str, operation: str, amount: int = 1):
+    """Count one call to an external service (OpenAI, the vector index, ...)"""
+    API_CALLS.inc(amount, service=service, operation=operation)
+
+
+def cache_collector(caches: Dict[str, Callable[[], Optional[Dict[str, int]]]]) -> Collector:
+    """
+    Collector exporting caches' hit/miss counters as rag_cache_requests_total.
+
+    Args:
+        caches: 'cache' label value -> function returning a dict with 'hits' and
+            'misses' (or None while that cache is disabled)
+    """
+    def collect():
+        samples: Samples = []
+        for name, stats in caches.items():
+            values = stats()
+            if values:
+                samples.append(({"cache": name, "result": "hit"}, values["hits"]))
+                samples.append(({"cache": name, "result": "miss"}, values["misses"]))
+        return [("rag_cache_requests_total", "counter", "Cache lookups by result", samples)]
+    return collect
+
+
+class RequestMetricsMiddleware:
+    def __init__(self, app, profiler=None, paths: Optional[Iterable[str]] = None):
+        """
+        ASGI middleware timing every HTTP request into rag_request_seconds.
+
+        The timer stops when the app returns, i.e. after the last body chunk
+        of a streamed response, not at the first byte. Paths outside 'paths'
+        (e.g. 404 probes) are recorded as 'other' to keep label cardinality
+        bounded. With a RequestProfiler, requests it selects are sampled and
+        slow ones leave a flamegraph-ready stack dump.
+
+        Args:
+            app: ASGI application
+            profiler: Optional profiler.RequestProfiler
+            paths: Paths recorded under their own label (all when omitted)
+        """
+        self.app = app
+        self.profiler = profiler
+        self.paths = set(paths) if paths is not None else None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = [500]
+
+        async def send_with_status(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+            await send(message)
+
+        path = scope["path"]
+        if self.paths is not None and path not in self.paths:
+            path = "other"
+        sampler = None
+        if self.profiler is not None:
+            header = dict(scope.get("headers") or []).get(b"x-profile", b"").decode("latin-1")
+            sampler = self.profiler.start(header)
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            elapsed = time.perf_counter() - start
+            REQUEST_SECONDS.observe(elapsed, method=scope["method"], path=path, status=str(status[0]))
+            if sampler is not None:
+                # Writing the dump is file I/O; keep it off the event loop
+                await asyncio.to_thread(self.profiler.finish, sampler, f"{scope['method']} {scope['path']}", elapsed)
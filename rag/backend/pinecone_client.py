@@ -1,7 +1,9 @@
 import os
 from typing import List, Dict, Any, Optional
-from pinecone import Pinecone
-from openai import OpenAI
+from embedding_client import EmbeddingClient
+from embedding_cache import get_embedding_cache
+from clients import get_clients
+from chunk_ids import document_id
 from dotenv import load_dotenv
 import logging
 
@@ -20,7 +22,8 @@ class PineconeClient:
         
         # OpenAI configuration
         self.openai_api_key = os.getenv("OPENAI_API_KEY")
-        self.openai_client = OpenAI(api_key=self.openai_api_key)
+        self.openai_client = get_clients().openai
+        self.embedding_client = EmbeddingClient(self.openai_client, cache=get_embedding_cache())
         
         if not all([self.api_key, self.environment, self.index_name, self.openai_api_key]):
             raise ValueError("Missing required environment variables")
@@ -28,8 +31,8 @@ class PineconeClient:
     def initialize(self):
         """Initialize Pinecone client and create index if it doesn't exist"""
         try:
-            # Initialize Pinecone client
-            self.client = Pinecone(api_key=self.api_key)
+            # Shared Pinecone client and index handle (pooled connections)
+            self.client = get_clients().pinecone
             
             # Create index if it doesn't exist
             if self.index_name not in self.client.list_indexes().names():
@@ -41,7 +44,7 @@ class PineconeClient:
                 logger.info(f"Created new Pinecone index: {self.index_name}")
             
             # Get index
-            self.index = self.client.Index(self.index_name)
+            self.index = get_clients().pinecone_index(self.index_name)
             logger.info(f"Connected to Pinecone index: {self.index_name}")
             
         except Exception as e:
@@ -57,15 +60,35 @@ class PineconeClient:
     def get_embedding(self, text: str):
         """Get embedding for text using OpenAI"""
         try:
-            response = self.openai_client.embeddings.create(
-                model="text-embedding-ada-002",
-                input=text
-            )
-            return response.data[0].embedding
+            return self.embedding_client.get_embedding(text)
+        except Exception as e:
+            logger.error(f"Failed to get embedding: {str(e)}")
+            raise
+
+    async def aget_embedding(self, text: str) -> List[float]:
+        """Get embedding for text using the async OpenAI client"""
+        try:
+            return await self.embedding_client.aget_embedding(text)
         except Exception as e:
             logger.error(f"Failed to get embedding: {str(e)}")
             raise
 
+    def get_embeddings(self, texts: List[str]) -> List[List[float]]:
+        """Get embeddings for many texts in token-capped batched requests, preserving order"""
+        try:
+            return self.embedding_client.get_embeddings(texts)
+        except Exception as e:
+            logger.error(f"Failed to get embeddings: {str(e)}")
+            raise
+
+    async def aget_embeddings(self, texts: List[str]) -> List[List[float]]:
+        """Async counterpart of get_embeddings"""
+        try:
+            return await self.embedding_client.aget_embeddings(texts)
+        except Exception as e:
+            logger.error(f"Failed to get embeddings: {str(e)}")
+            raise
+
     def store_documents(self, documents: List[Dict[str, Any]], batch_size: int = 100) -> None:
         """
         Store document chunks in Pinecone.
@@ -79,15 +102,24 @@ class PineconeClient:
             for i in range(0, len(documents), batch_size):
                 batch = documents[i:i + batch_size]
                 
+                # IDs are derived from source, position and content, so unchanged
+                # chunks that are already stored can be skipped entirely
+                ids = [document_id(doc, i + n) for n, doc in enumerate(batch)]
+                existing = set(self.get_index().fetch(ids=ids).vectors.keys())
+                pending = [(id_, doc) for id_, doc in zip(ids, batch) if id_ not in existing]
+                if not pending:
+                    logger.info(f"Skipped {len(batch)} unchanged documents")
+                    continue
+                
                 # Generate embeddings for the batch
-                texts = [doc['content'] for doc in batch]
-                embeddings = self.get_embedding(texts[0])  # Assuming all documents in the batch have the same embedding
+                texts = [doc['content'] for _, doc in pending]
+                embeddings = self.get_embeddings(texts)
                 
                 # Prepare vectors for upsert
                 vectors = []
-                for doc, embedding in zip(batch, embeddings):
+                for (id_, doc), embedding in zip(pending, embeddings):
                     vector = {
-                        'id': doc.get('id', f"doc_{i}_{len(vectors)}"),
+                        'id': id_,
                         'values': embedding,
                         'metadata': {
                             'content': doc['content'], # Store raw content
@@ -98,7 +130,7 @@ class PineconeClient:
                 
                 # Upsert to Pinecone
                 self.get_index().upsert(vectors=vectors)
-                logger.info(f"Stored {len(vectors)} documents in Pinecone")
+                logger.info(f"Stored {len(vectors)} documents in Pinecone, skipped {len(batch) - len(vectors)} unchanged")
                 
         except Exception as e:
             logger.error(f"Error storing documents in Pinecone: {str(e)}")
@@ -12,8 +12,8 @@ def main():
     processor = DatasetProcessor()
     processor.initialize()
     
-    # Process the dataset
-    processor.process_dataset()
+    # Parse, embed and upsert the dataset
+    processor.index_dataset()
     
     logger.info("Sample documents processed and added to Pinecone!")
 
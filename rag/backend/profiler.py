@@ -0,0 +1,145 @@
+import os
+import re
+import sys
+import time
+import threading
+from collections import Counter
+from typing import Dict, Optional
+import logging
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+DEFAULT_PROFILE_DIR = os.path.join(os.path.dirname(__file__), "logs", "profiles")
+
+_UNSAFE = re.compile(r"[^A-Za-z0-9_.-]+")
+
+
+def fold_stack(frame, thread_name: str) -> str:
+    """One stack in the collapsed format, root first: thread;module:function;..."""
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        module = os.path.splitext(os.path.basename(code.co_filename))[0]
+        names.append(f"{module}:{code.co_name}")
+        frame = frame.f_back
+    names.append(thread_name)
+    return ";".join(reversed(names))
+
+
+class StackSampler:
+    def __init__(self, interval: float = 0.005):
+        """
+        Sampling profiler for one slow request, without a C extension.
+
+        A daemon thread snapshots every other thread's Python stack each
+        interval via sys._current_frames and counts identical stacks. The
+        result is the collapsed ("folded") format that flamegraph.pl,
+        speedscope and inferno read directly. Stacks carry their thread's
+        name as the root, so event loop time and worker threads (embedding,
+        index queries run via asyncio.to_thread) show up side by side.
+
+        Args:
+            interval: Seconds between samples
+        """
+        self.interval = interval
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _run(self):
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            names: Dict[int, str] = {t.ident: t.name for t in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id != own:
+                    self.stacks[fold_stack(frame, names.get(thread_id, str(thread_id)))] += 1
+            self.samples += 1
+
+    def start(self) -> "StackSampler":
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> Counter:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        return self.stacks
+
+    def folded(self) -> str:
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+    def dump(self, directory: str, name: str) -> str:
+        """
+        Write the collected stacks to <directory>/<timestamp>-<name>.folded.
+
+        Args:
+            directory: Output directory, created if missing
+            name: Label for the file name (e.g. the request path)
+
+        Returns:
+            Path of the written file
+        """
+        os.makedirs(directory, exist_ok=True)
+        stamp = time.strftime("%Y%m%d-%H%M%S")
+        path = os.path.join(directory, f"{stamp}-{_UNSAFE.sub('_', name).strip('_') or 'request'}-{os.getpid()}.folded")
+        with open(path, "w") as f:
+            f.write(self.folded())
+        return path
+
+
+class RequestProfiler:
+    def __init__(self,
+                 mode: Optional[str] = None,
+                 slow_ms: Optional[float] = None,
+                 directory: Optional[str] = None,
+                 interval: float = 0.005):
+        """
+        Decides which requests to sample and keeps the stacks of the slow ones.
+
+        Modes (PROFILE_REQUESTS): 'off' never samples; 'header' samples requests
+        sent with an 'X-Profile: 1' header; 'all' samples every request. Only
+        one request is sampled at a time, so profiling under load costs one
+        sampler thread. A sampled request taking at least slow_ms
+        (PROFILE_SLOW_MS, default 500) has its stacks written to directory
+        (PROFILE_DIR, default logs/profiles); faster ones are discarded.
+
+        Args:
+            mode: 'off', 'header' or 'all'
+            slow_ms: Duration in milliseconds from which stacks are kept
+            directory: Where .folded files are written
+            interval: Seconds between samples
+        """
+        self.mode = (mode if mode is not None else os.getenv("PROFILE_REQUESTS", "off")).lower()
+        if self.mode not in ("off", "header", "all"):
+            logger.warning(f"Unknown PROFILE_REQUESTS mode {self.mode!r}, profiling disabled")
+            self.mode = "off"
+        self.slow_ms = slow_ms if slow_ms is not None else float(os.getenv("PROFILE_SLOW_MS", "500"))
+        self.directory = directory or os.getenv("PROFILE_DIR") or DEFAULT_PROFILE_DIR
+        self.interval = interval
+        self._busy = threading.Lock()
+
+    def start(self, header: Optional[str] = None) -> Optional[StackSampler]:
+        """A running sampler if this request should be profiled, else None"""
+        if self.mode == "off" or (self.mode == "header" and header not in ("1", "true")):
+            return None
+        if not self._busy.acquire(blocking=False):
+            return None
+        return StackSampler(self.interval).start()
+
+    def finish(self, sampler: StackSampler, name: str, elapsed: float) -> Optional[str]:
+        """Stop sampling; returns the dump path if the request was slow enough to keep"""
+        try:
+            sampler.stop()
+            if elapsed * 1000 < self.slow_ms or not sampler.stacks:
+                return None
+            path = sampler.dump(self.directory, name)
+            logger.info(f"Profiled slow request {name} ({elapsed * 1000:.0f} ms, {sampler.samples} samples): {path}")
+            return path
+        except OSError as e:
+            logger.error(f"Failed to write profile for {name}: {str(e)}")
+            return None
+        finally:
+            self._busy.release()
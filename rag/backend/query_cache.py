@@ -0,0 +1,118 @@
+import re
+import time
+import json
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+import logging
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+class QueryResultCache:
+    def __init__(self, max_entries: int = 1024, ttl: float = 300.0):
+        """
+        LRU cache of query results with a TTL.
+
+        Entries are stamped with the index generation they were computed
+        against; bumping the generation (on any write to the index) drops
+        every older entry, so a result is never served after the index changed.
+
+        Args:
+            max_entries: Maximum cached results before evicting the least recently used
+            ttl: Seconds a result stays valid
+        """
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.generation = 0
+        self._entries: "OrderedDict[Tuple, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def normalize(query: str) -> str:
+        """Case- and whitespace-insensitive form of a query"""
+        return _WHITESPACE.sub(" ", query).strip().lower()
+
+    def make_key(self, kind: str, query: str, k: int, filters: Optional[Dict[str, Any]] = None) -> Tuple:
+        """Cache key for one kind of lookup (e.g. 'query' or 'similarity_search')"""
+        return (kind, self.normalize(query), k, json.dumps(filters, sort_keys=True, default=str) if filters else "")
+
+    @staticmethod
+    def _copy(result: Any) -> Any:
+        """
+        Copy of a list of results down to each result's metadata dict.
+
+        Callers add to the metadata of what they are served (scores, Documents
+        built from it), so neither side may share those dicts with the cache.
+        """
+        if not isinstance(result, list):
+            return result
+        copied = []
+        for item in result:
+            if isinstance(item, dict):
+                item = dict(item)
+                if isinstance(item.get("metadata"), dict):
+                    item["metadata"] = dict(item["metadata"])
+            elif isinstance(getattr(item, "metadata", None), dict):
+                # Documents are pydantic models, whose copy() takes field overrides
+                item = item.copy(update={"metadata": dict(item.metadata)})
+            copied.append(item)
+        return copied
+
+    def get(self, key: Tuple) -> Optional[Any]:
+        """Return a copy of a cached, unexpired result or None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires_at, result = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return self._copy(result)
+
+    def put(self, key: Tuple, result: Any, generation: Optional[int] = None):
+        """
+        Cache a result.
+
+        Args:
+            key: Key from make_key
+            result: Result to cache; a copy is stored
+            generation: Generation the result was computed against; results from
+                before the latest bump are discarded instead of cached
+        """
+        with self._lock:
+            if generation is not None and generation != self.generation:
+                return
+            self._entries[key] = (time.monotonic() + self.ttl, self._copy(result))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def bump_generation(self) -> int:
+        """Invalidate all cached results after the index changed"""
+        with self._lock:
+            self.generation += 1
+            self._entries.clear()
+            return self.generation
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "entries": len(self._entries),
+            "generation": self.generation,
+        }
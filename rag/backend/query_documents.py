@@ -1,12 +1,18 @@
 from vector_store import VectorStore
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 import json
 from datetime import datetime
 
 class DocumentQuerier:
-    def __init__(self):
-        self.vector_store = VectorStore()
-        self.vector_store.initialize()
+    def __init__(self, vector_store: Optional[VectorStore] = None):
+        """
+        Args:
+            vector_store: Initialised VectorStore to share; a new one is created and initialised if omitted
+        """
+        if vector_store is None:
+            vector_store = VectorStore()
+            vector_store.initialize()
+        self.vector_store = vector_store
 
     def search(self, query: str, filters: Dict[str, Any] = None, k: int = 4) -> List[Dict[str, Any]]:
         """
@@ -17,32 +23,35 @@ class DocumentQuerier:
             filters: Dictionary of metadata filters (e.g., {"category": "design_documents"})
             k: Number of results to return
         """
-        # Get results from vector store
-        results = self.vector_store.similarity_search(query, k=k)
-        
-        # Apply filters if provided
-        if filters:
-            results = self._filter_results(results, filters)
+        # Filters are applied by the index during the search, so up to k matching chunks come back
+        results = self.vector_store.query(query, limit=k, filters=filters)
         
         # Format results
         return self._format_results(results)
 
-    def _filter_results(self, results: List[Any], filters: Dict[str, Any]) -> List[Any]:
-        """Filter results based on metadata"""
-        filtered_results = []
-        for doc in results:
-            if all(doc.metadata.get(k) == v for k, v in filters.items()):
-                filtered_results.append(doc)
-        return filtered_results
+    def search_many(self, queries: List[str], filters: Optional[List[Optional[Dict[str, Any]]]] = None,
+                    k: int = 4) -> List[List[Dict[str, Any]]]:
+        """
+        Search many queries in one batch (one embeddings request, one index pass per distinct filter)
+
+        Args:
+            queries: Search queries
+            filters: Metadata filters, one dict (or None) per query
+            k: Number of results to return per query
+
+        Returns:
+            Formatted results per query, in input order
+        """
+        return [self._format_results(results) for results in self.vector_store.query_many(queries, limit=k, filters=filters)]
 
-    def _format_results(self, results: List[Any]) -> List[Dict[str, Any]]:
+    def _format_results(self, results: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
         """Format results for output"""
         formatted_results = []
-        for doc in results:
+        for result in results:
             formatted_results.append({
-                "content": doc.page_content,
-                "metadata": doc.metadata,
-                "relevance_score": doc.metadata.get("score", 0)
+                "content": result["content"],
+                "metadata": result["metadata"],
+                "relevance_score": result["score"]
             })
         return formatted_results
 
@@ -65,16 +74,16 @@ def main():
         }
     ]
     
-    for q in queries:
+    batch_results = querier.search_many([q['query'] for q in queries], [q['filters'] for q in queries])
+    for q, results in zip(queries, batch_results):
         print(f"\nQuery: {q['query']}")
         print(f"Filters: {q['filters']}")
-        results = querier.search(q['query'], q['filters'])
         print("\nResults:")
         for r in results:
             print(f"\nContent: {r['content'][:200]}...")
             print(f"Source: {r['metadata']['source']}")
-            print(f"Category: {r['metadata']['category']}")
-            print(f"Subcategory: {r['metadata']['subcategory']}")
+            print(f"Category: {r['metadata'].get('category', 'N/A')}")
+            print(f"Subcategory: {r['metadata'].get('subcategory', 'N/A')}")
             print(f"Version: {r['metadata'].get('version', 'N/A')}")
             print(f"Last Updated: {r['metadata'].get('last_updated', 'N/A')}")
 
@@ -1,27 +1,54 @@
 from document_processor import DocumentProcessor
 from vector_store import VectorStore
 from langchain.schema import Document
-from typing import List, Literal
+from typing import List, Literal, Optional
 import os
+import itertools
 from dotenv import load_dotenv
 
 load_dotenv()
 
 class RAGService:
-    def __init__(self):
+    def __init__(self, vector_store: Optional[VectorStore] = None):
         self.document_processor = DocumentProcessor()
-        self.vector_store = VectorStore()
+        self.vector_store = vector_store or VectorStore()
 
     def initialize(self):
         self.vector_store.initialize()
 
-    def process_and_store_document(self, file_path: str, file_type: Literal["pdf", "text"]) -> None:
+    def process_and_store_document(self, file_path: str, file_type: Literal["pdf", "text"],
+                                   batch_size: int = 100) -> int:
+        """
+        Chunk, embed and index one file, batch by batch.
+
+        PDFs are streamed: each batch of chunks is embedded and upserted while
+        later pages are still unread, so a large PDF never sits in memory whole.
+
+        Returns:
+            Number of chunks indexed
+        """
         if file_type == "pdf":
-            documents = self.document_processor.process_pdf(file_path)
+            chunks = self.document_processor.process_pdf(file_path, stream=True)
         else:
-            documents = self.document_processor.process_text(file_path)
-        
-        self.vector_store.add_documents(documents)
+            chunks = iter(self.document_processor.process_text(file_path))
+
+        if not self.vector_store.index:
+            self.vector_store.initialize()
+        total = 0
+        while True:
+            batch = [{"content": c.page_content, "metadata": c.metadata} for c in itertools.islice(chunks, batch_size)]
+            if not batch:
+                return total
+            # Chunk IDs carry a content hash, so existing IDs need no new embedding
+            existing = self.vector_store.existing_ids([self.vector_store.document_id(d) for d in batch])
+            new_docs = [d for d in batch if self.vector_store.document_id(d) not in existing]
+            if new_docs:
+                embeddings = self.vector_store.embedder.get_embeddings([d["content"] for d in new_docs])
+                self.vector_store.add_documents([{**d, "embedding": e} for d, e in zip(new_docs, embeddings)],
+                                               skip_existing=False)
+            if len(new_docs) < len(batch):
+                self.vector_store.add_existing([d for d in batch if self.vector_store.document_id(d) in existing])
+            total += len(batch)
 
     def search(self, query: str, k: int = 4) -> List[Document]:
         return self.vector_store.similarity_search(query, k) 
\ No newline at end of file
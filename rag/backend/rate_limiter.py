@@ -0,0 +1,222 @@
+import re
+import time
+import random
+import threading
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Mapping, Optional, TypeVar
+import logging
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+_DURATION_PART = re.compile(r"(\d+(?:\.\d+)?)(ms|s|m|h)")
+_DURATION_SECONDS = {"ms": 0.001, "s": 1.0, "m": 60.0, "h": 3600.0}
+
+
+def parse_duration(value: str) -> Optional[float]:
+    """Seconds in an OpenAI reset header ('20ms', '1.5s', '6m0s') or a plain number"""
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        pass
+    parts = _DURATION_PART.findall(value or "")
+    if not parts:
+        return None
+    return sum(float(amount) * _DURATION_SECONDS[unit] for amount, unit in parts)
+
+
+class TokenBucket:
+    def __init__(self, rate: float, capacity: float, clock: Callable[[], float] = time.monotonic):
+        """
+        Continuously refilling budget; not thread-safe on its own.
+
+        Args:
+            rate: Units added per second
+            capacity: Maximum units held (the allowed burst)
+            clock: Monotonic time source
+        """
+        self.rate = rate
+        self.capacity = capacity
+        self.clock = clock
+        self.level = capacity
+        self.updated = clock()
+
+    def _refill(self, now: float):
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float) -> float:
+        """Seconds until amount units are available (requests larger than capacity wait for a full bucket)"""
+        self._refill(self.clock())
+        deficit = min(amount, self.capacity) - self.level
+        return max(0.0, deficit / self.rate) if self.rate > 0 else 0.0
+
+    def consume(self, amount: float):
+        self._refill(self.clock())
+        self.level -= amount
+
+
+class RateLimitScheduler:
+    def __init__(self,
+                 requests_per_period: float,
+                 tokens_per_period: float,
+                 period: float = 60.0,
+                 max_concurrency: int = 8,
+                 max_throttle_retries: int = 8,
+                 base_backoff: float = 0.5,
+                 max_backoff: float = 60.0,
+                 clock: Callable[[], float] = time.monotonic,
+                 sleep: Callable[[float], None] = time.sleep):
+        """
+        Paces calls to a rate-limited API against both a request and a token budget.
+
+        Each call first takes a concurrency slot, then waits until both token
+        buckets can cover it. Rate-limit headers from responses re-sync the
+        buckets with the provider's view (limits and remaining budget), so
+        callers run at the provider limit instead of a fixed, conservative
+        delay. Concurrency adapts AIMD-style: it grows by one after a window
+        of successful calls and halves on every throttled (429) call. Only
+        throttled calls back off, with jittered exponential delays (or the
+        server's Retry-After), during which every caller pauses.
+
+        Args:
+            requests_per_period: Request budget per period
+            tokens_per_period: Token budget per period
+            period: Budget period in seconds (OpenAI limits are per minute)
+            max_concurrency: Upper bound on calls in flight
+            max_throttle_retries: Throttled attempts per call before giving up
+            base_backoff: First backoff delay in seconds
+            max_backoff: Backoff ceiling in seconds
+            clock: Monotonic time source
+            sleep: Sleep function
+        """
+        self.period = period
+        self.max_concurrency = max_concurrency
+        self.max_throttle_retries = max_throttle_retries
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.clock = clock
+        self.sleep = sleep
+
+        self.requests = TokenBucket(requests_per_period / period, requests_per_period, clock)
+        self.tokens = TokenBucket(tokens_per_period / period, tokens_per_period, clock)
+        self.concurrency = max(1, min(4, max_concurrency))
+        self._in_flight = 0
+        self._successes = 0
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+        self._slot_freed = threading.Condition(self._lock)
+
+        self.calls = 0
+        self.throttled = 0
+
+    @classmethod
+    def from_config(cls, api_settings: Dict[str, Any], **kwargs) -> "RateLimitScheduler":
+        """Scheduler for the config.yaml 'api' section (rate_limit is requests per minute)"""
+        return cls(
+            requests_per_period=float(api_settings.get("rate_limit", 100)),
+            tokens_per_period=float(api_settings.get("tokens_per_minute", 1000000)),
+            period=60.0,
+            max_concurrency=int(api_settings.get("max_concurrency", 8)),
+            **kwargs
+        )
+
+    @contextmanager
+    def slot(self, tokens: int):
+        """Hold a concurrency slot and the request/token budget for one call"""
+        with self._slot_freed:
+            while self._in_flight >= self.concurrency:
+                self._slot_freed.wait()
+            self._in_flight += 1
+        try:
+            while True:
+                with self._lock:
+                    wait = max(self._paused_until - self.clock(),
+                               self.requests.wait_time(1), self.tokens.wait_time(tokens))
+                    if wait <= 0:
+                        self.requests.consume(1)
+                        self.tokens.consume(tokens)
+                        self.calls += 1
+                        break
+                self.sleep(wait)
+            yield
+        finally:
+            with self._slot_freed:
+                self._in_flight -= 1
+                self._slot_freed.notify()
+
+    def record_headers(self, headers: Optional[Mapping[str, str]]):
+        """Adopt limits and remaining budget from x-ratelimit-* response headers"""
+        if not headers:
+            return
+        with self._lock:
+            for kind, bucket in (("requests", self.requests), ("tokens", self.tokens)):
+                limit = headers.get(f"x-ratelimit-limit-{kind}")
+                if limit is not None:
+                    bucket.capacity = float(limit)
+                    bucket.rate = bucket.capacity / self.period
+                remaining = headers.get(f"x-ratelimit-remaining-{kind}")
+                if remaining is not None:
+                    # Calls still in flight are spent locally but not yet on the server
+                    bucket._refill(self.clock())
+                    bucket.level = min(bucket.level, float(remaining))
+
+    def _on_success(self):
+        with self._slot_freed:
+            self._successes += 1
+            if self._successes >= self.concurrency and self.concurrency < self.max_concurrency:
+                self.concurrency += 1
+                self._successes = 0
+                self._slot_freed.notify()
+
+    def _on_throttled(self, attempt: int, retry_after: Optional[float]):
+        with self._lock:
+            self.throttled += 1
+            self._successes = 0
+            self.concurrency = max(1, self.concurrency // 2)
+            delay = min(self.max_backoff, self.base_backoff * 2 ** (attempt - 1))
+            delay = max(retry_after or 0.0, random.uniform(delay / 2, delay))
+            self._paused_until = max(self._paused_until, self.clock() + delay)
+        logger.warning(f"Rate limited (attempt {attempt}), backing off {delay:.2f}s; concurrency now {self.concurrency}")
+
+    @staticmethod
+    def is_throttled(error: Exception) -> bool:
+        return getattr(error, "status_code", None) == 429
+
+    def call(self, fn: Callable[[], T], tokens: int = 0) -> T:
+        """
+        Run fn within the budget, retrying it while it is throttled.
+
+        Args:
+            fn: Zero-argument call to the API; non-throttle errors propagate unchanged
+            tokens: Tokens the call consumes
+
+        Returns:
+            fn's result
+        """
+        for attempt in range(1, self.max_throttle_retries + 1):
+            with self.slot(tokens):
+                try:
+                    result = fn()
+                except Exception as e:
+                    if not self.is_throttled(e) or attempt == self.max_throttle_retries:
+                        raise
+                    response = getattr(e, "response", None)
+                    headers = getattr(response, "headers", None)
+                    self.record_headers(headers)
+                    retry_after = parse_duration(headers.get("retry-after")) if headers else None
+                    self._on_throttled(attempt, retry_after)
+                    continue
+            self._on_success()
+            return result
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "calls": self.calls,
+            "throttled": self.throttled,
+            "concurrency": self.concurrency,
+            "requests_per_period": self.requests.capacity,
+            "tokens_per_period": self.tokens.capacity,
+        }
@@ -0,0 +1,406 @@
+import os
+import json
+import mmap
+import threading
+import uuid
+from typing import List, Dict, Any, Optional, Iterable, Tuple
+import numpy as np
+import logging
+
+try:
+    import fcntl
+except ImportError:  # Windows: writers are serialised per process only
+    fcntl = None
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+DEFAULT_SEGMENT_PATH = os.path.join(os.path.dirname(__file__), "cache", "segments")
+
+SEGMENT_VERSION = 1
+# Per row: text start, text length, id start, id length
+OFFSET_COLUMNS = 4
+# Data files, each also written per metadata field as meta_<field>.i32
+DATA_FILES = ("text.bin", "ids.bin", "offsets.i64", "vectors.f32", "deleted.u8")
+
+
+class SegmentStore:
+    def __init__(self, path: str = DEFAULT_SEGMENT_PATH, dimension: int = 1536,
+                 compact_ratio: float = 0.25, compact_min_rows: int = 1000):
+        """
+        Append-only on-disk store of chunk text, vectors and metadata, read through mmap.
+
+        Layout of the segment directory:
+            text.bin      chunk text, UTF-8, appended back to back
+            ids.bin       chunk IDs, UTF-8, appended back to back
+            offsets.i64   per row (text start, text length, id start, id length)
+            vectors.f32   row-major float32 matrix (rows are 4 * dimension bytes)
+            meta_<f>.i32  one column per metadata field: index into the field's
+                          vocabulary in segment.json, -1 when absent
+            deleted.u8    tombstone flag per row
+            segment.json  manifest: row count, byte sizes, fields, vocabularies
+
+        Writers append data files first and replace segment.json last, so a
+        crash leaves at most an ignored tail. Readers map the files read-only
+        and never copy them: opening is O(1), and every process serving the
+        same directory shares the page cache. Readers pick up appends from
+        other processes when the manifest changes.
+
+        Compaction and clear() write a new set of data files, named
+        <epoch>.<file>, and switch to them by replacing the manifest, so a
+        reader never maps a half-rewritten file.
+
+        Args:
+            path: Segment directory
+            dimension: Vector dimensions
+            compact_ratio: Compact after a write once superseded or deleted rows
+                exceed this fraction of all rows...
+            compact_min_rows: ...and this many rows
+        """
+        self.path = path
+        self.dimension = dimension
+        self.compact_ratio = compact_ratio
+        self.compact_min_rows = compact_min_rows
+        self._lock = threading.RLock()
+        self._manifest: Dict[str, Any] = {}
+        self._manifest_mtime: Optional[int] = None
+        # Row -> ID for every decoded row and ID -> row for live ones, brought up to date incrementally
+        self._row_ids: List[str] = []
+        self._id_rows: Dict[str, int] = {}
+        self._rows_epoch: Optional[str] = None
+        self._rows_stale = True
+        self._maps: Dict[str, Any] = {}
+        os.makedirs(self.path, exist_ok=True)
+        self._open()
+
+    def _file(self, name: str) -> str:
+        return os.path.join(self.path, name)
+
+    def _data_file(self, name: str, manifest: Optional[Dict[str, Any]] = None) -> str:
+        """Path of a data file of the manifest's epoch (segments from before epochs use bare names)"""
+        epoch = (manifest if manifest is not None else self._manifest).get("epoch")
+        return self._file(f"{epoch}.{name}" if epoch else name)
+
+    @staticmethod
+    def _empty_manifest(dimension: int) -> Dict[str, Any]:
+        return {"version": SEGMENT_VERSION, "dimension": dimension, "count": 0, "text_bytes": 0, "id_bytes": 0,
+                "fields": [], "vocab": {}, "epoch": uuid.uuid4().hex}
+
+    def _open(self):
+        """(Re)map the committed part of every file"""
+        for attempt in range(3):
+            try:
+                self._map_manifest()
+                break
+            except FileNotFoundError:
+                # A compaction replaced the files between reading the manifest and mapping them
+                if attempt == 2:
+                    raise
+        self._rows_stale = True
+
+    def _map_manifest(self):
+        manifest_path = self._file("segment.json")
+        if os.path.exists(manifest_path):
+            mtime = os.stat(manifest_path).st_mtime_ns
+            with open(manifest_path, "r") as f:
+                manifest = json.load(f)
+            if manifest["dimension"] != self.dimension:
+                raise ValueError(f"Segment at {self.path} has dimension {manifest['dimension']}, not {self.dimension}")
+        else:
+            mtime = None
+            manifest = self._empty_manifest(self.dimension)
+
+        count = manifest["count"]
+        maps = {
+            "text": self._map_bytes(self._data_file("text.bin", manifest), manifest["text_bytes"]),
+            "ids": self._map_bytes(self._data_file("ids.bin", manifest), manifest["id_bytes"]),
+            "offsets": self._map_array(self._data_file("offsets.i64", manifest), np.int64, (count, OFFSET_COLUMNS)),
+            "vectors": self._map_array(self._data_file("vectors.f32", manifest), np.float32, (count, self.dimension)),
+            "deleted": self._map_array(self._data_file("deleted.u8", manifest), np.uint8, (count,)),
+        }
+        for field in manifest["fields"]:
+            maps[f"meta_{field}"] = self._map_array(self._data_file(f"meta_{field}.i32", manifest), np.int32, (count,))
+        self._manifest, self._manifest_mtime, self._maps = manifest, mtime, maps
+
+    @staticmethod
+    def _map_bytes(path: str, size: int):
+        if size == 0:
+            return b""
+        with open(path, "rb") as f:
+            return mmap.mmap(f.fileno(), size, access=mmap.ACCESS_READ)
+
+    @staticmethod
+    def _map_array(path: str, dtype, shape: Tuple[int, ...]) -> np.ndarray:
+        if shape[0] == 0:
+            return np.zeros(shape, dtype=dtype)
+        return np.memmap(path, dtype=dtype, mode="r", shape=shape)
+
+    def refresh(self):
+        """Re-map if another process committed new rows since the last look"""
+        try:
+            mtime = os.stat(self._file("segment.json")).st_mtime_ns
+        except FileNotFoundError:
+            return
+        if mtime != self._manifest_mtime:
+            with self._lock:
+                self._open()
+
+    def __len__(self) -> int:
+        return len(self._rows())
+
+    def __contains__(self, id_: str) -> bool:
+        return id_ in self._rows()
+
+    def _rows(self) -> Dict[str, int]:
+        """
+        Live ID -> row map.
+
+        Only rows committed since the last call are decoded; tombstones are
+        re-applied from the flag column, which auto-compaction keeps short.
+        """
+        if not self._rows_stale:
+            return self._id_rows
+        with self._lock:
+            if not self._rows_stale:
+                return self._id_rows
+            manifest, maps = self._manifest, self._maps
+            count = manifest["count"]
+            if manifest.get("epoch") != self._rows_epoch or count < len(self._row_ids):
+                # Cleared or compacted: row numbers changed
+                self._row_ids, self._id_rows = [], {}
+                self._rows_epoch = manifest.get("epoch")
+            row_ids, id_rows, ids = self._row_ids, self._id_rows, maps["ids"]
+            first = len(row_ids)
+            for row, (start, length) in enumerate(maps["offsets"][first:count, 2:4].tolist(), first):
+                id_ = ids[start:start + length].decode("utf-8")
+                row_ids.append(id_)
+                # A later row for the same ID supersedes the earlier one
+                id_rows[id_] = row
+            for row in np.flatnonzero(maps["deleted"][:count]).tolist():
+                if id_rows.get(row_ids[row]) == row:
+                    del id_rows[row_ids[row]]
+            self._rows_stale = False
+        return self._id_rows
+
+    def _record(self, row: int) -> Dict[str, Any]:
+        start, length = (int(v) for v in self._maps["offsets"][row, :2])
+        metadata = {}
+        for field in self._manifest["fields"]:
+            code = int(self._maps[f"meta_{field}"][row])
+            if code >= 0:
+                metadata[field] = self._manifest["vocab"][field][code]
+        return {"content": self._maps["text"][start:start + length].decode("utf-8"), "metadata": metadata}
+
+    def get(self, id_: str) -> Optional[Dict[str, Any]]:
+        """Content and metadata of one chunk, or None"""
+        with self._lock:
+            row = self._rows().get(id_)
+            return None if row is None else self._record(row)
+
+    def get_many(self, ids: Iterable[str]) -> Dict[str, Dict[str, Any]]:
+        """Content and metadata for every ID present in the store"""
+        self.refresh()
+        found = {}
+        # Under the lock, so a compaction can't renumber rows between lookup and read
+        with self._lock:
+            rows = self._rows()
+            for id_ in ids:
+                row = rows.get(id_)
+                if row is not None:
+                    found[id_] = self._record(row)
+        return found
+
+    def get_vectors(self, ids: List[str]) -> Dict[str, np.ndarray]:
+        """Stored vectors for the IDs present (views into the mapped matrix)"""
+        found = {}
+        with self._lock:
+            rows = self._rows()
+            for id_ in ids:
+                row = rows.get(id_)
+                if row is not None:
+                    found[id_] = self._maps["vectors"][row]
+        return found
+
+    def _writer_lock(self):
+        """Exclusive lock across processes for the duration of an append"""
+        handle = open(self._file("segment.lock"), "a")
+        if fcntl is not None:
+            fcntl.flock(handle, fcntl.LOCK_EX)
+        return handle
+
+    def append(self, records: List[Dict[str, Any]]):
+        """
+        Append chunks; an ID that is already stored is superseded by the new row.
+
+        Args:
+            records: Dicts with 'id', 'content', 'values' (vector) and 'metadata'
+                (scalar values only; other values are skipped)
+        """
+        if not records:
+            return
+        with self._lock:
+            lock = self._writer_lock()
+            try:
+                # Another writer may have committed since we last mapped
+                self.refresh()
+                manifest = json.loads(json.dumps(self._manifest))
+                count = manifest["count"]
+                self._write_rows(manifest, records)
+
+                # Supersede earlier rows with the same IDs (and duplicates within this batch)
+                rows = self._rows()
+                latest = {}
+                for i, record in enumerate(records):
+                    latest[record["id"]] = count + i
+                superseded = [rows[id_] for id_ in latest if id_ in rows]
+                superseded += [count + i for i, r in enumerate(records) if latest[r["id"]] != count + i]
+                self._mark_deleted(manifest, superseded)
+                self._commit(manifest)
+                self._maybe_compact()
+            finally:
+                lock.close()
+
+    def _write_rows(self, manifest: Dict[str, Any], records: List[Dict[str, Any]]):
+        """Write records after the manifest's committed rows and advance the manifest (not yet committed)"""
+        count = manifest["count"]
+        vocab_index = {f: {self._vocab_key(v): i for i, v in enumerate(values)}
+                       for f, values in manifest["vocab"].items()}
+
+        texts = [r["content"].encode("utf-8") for r in records]
+        ids = [r["id"].encode("utf-8") for r in records]
+        offsets = np.zeros((len(records), OFFSET_COLUMNS), dtype=np.int64)
+        offsets[:, 1] = [len(t) for t in texts]
+        offsets[:, 0] = manifest["text_bytes"] + np.concatenate(([0], np.cumsum(offsets[:-1, 1])))
+        offsets[:, 3] = [len(i) for i in ids]
+        offsets[:, 2] = manifest["id_bytes"] + np.concatenate(([0], np.cumsum(offsets[:-1, 3])))
+        vectors = np.asarray([r["values"] for r in records], dtype=np.float32).reshape(len(records), self.dimension)
+
+        columns: Dict[str, np.ndarray] = {}
+        for i, record in enumerate(records):
+            for field, value in record["metadata"].items():
+                if not isinstance(value, (str, int, float, bool)):
+                    continue
+                if field not in manifest["fields"]:
+                    # New column: earlier rows have no value
+                    manifest["fields"].append(field)
+                    manifest["vocab"][field] = []
+                    vocab_index[field] = {}
+                    self._write_at(manifest, f"meta_{field}.i32", 0, np.full(count, -1, dtype=np.int32).tobytes())
+                codes = vocab_index[field]
+                key = self._vocab_key(value)
+                if key not in codes:
+                    codes[key] = len(manifest["vocab"][field])
+                    manifest["vocab"][field].append(value)
+                columns.setdefault(field, np.full(len(records), -1, dtype=np.int32))[i] = codes[key]
+
+        self._write_at(manifest, "text.bin", manifest["text_bytes"], b"".join(texts))
+        self._write_at(manifest, "ids.bin", manifest["id_bytes"], b"".join(ids))
+        self._write_at(manifest, "offsets.i64", count * OFFSET_COLUMNS * 8, offsets.tobytes())
+        self._write_at(manifest, "vectors.f32", count * self.dimension * 4, vectors.tobytes())
+        self._write_at(manifest, "deleted.u8", count, bytes(len(records)))
+        for field in manifest["fields"]:
+            column = columns.get(field, np.full(len(records), -1, dtype=np.int32))
+            self._write_at(manifest, f"meta_{field}.i32", count * 4, column.tobytes())
+
+        manifest["count"] = count + len(records)
+        manifest["text_bytes"] += sum(len(t) for t in texts)
+        manifest["id_bytes"] += sum(len(i) for i in ids)
+
+    @staticmethod
+    def _vocab_key(value: Any) -> Tuple[str, Any]:
+        # Keep 1, 1.0 and True distinct
+        return type(value).__name__, value
+
+    def _write_at(self, manifest: Dict[str, Any], name: str, position: int, data: bytes):
+        """Write at a byte position, dropping any uncommitted tail beyond it"""
+        path = self._data_file(name, manifest)
+        with open(path, "r+b" if os.path.exists(path) else "w+b") as f:
+            f.truncate(position)
+            f.seek(position)
+            f.write(data)
+
+    def _mark_deleted(self, manifest: Dict[str, Any], rows: List[int]):
+        if not rows:
+            return
+        with open(self._data_file("deleted.u8", manifest), "r+b") as f:
+            for row in rows:
+                f.seek(row)
+                f.write(b"\x01")
+
+    def _commit(self, manifest: Dict[str, Any]):
+        """Atomically publish the manifest, then re-map"""
+        tmp_path = self._file("segment.json.tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(manifest, f)
+        os.replace(tmp_path, self._file("segment.json"))
+        self._open()
+
+    def delete(self, ids: Iterable[str]):
+        """Tombstone chunks by ID"""
+        with self._lock:
+            lock = self._writer_lock()
+            try:
+                self.refresh()
+                rows = self._rows()
+                self._mark_deleted(self._manifest, [rows[id_] for id_ in ids if id_ in rows])
+                self._commit(self._manifest)
+                self._maybe_compact()
+            finally:
+                lock.close()
+
+    def clear(self):
+        """Drop every chunk"""
+        with self._lock:
+            lock = self._writer_lock()
+            try:
+                self.refresh()
+                old = self._manifest
+                self._commit(self._empty_manifest(self.dimension))
+                self._remove_files(old)
+            finally:
+                lock.close()
+
+    def dead_rows(self) -> int:
+        """Superseded or deleted rows still taking up space"""
+        return self._manifest["count"] - len(self._rows())
+
+    def _maybe_compact(self):
+        dead = self.dead_rows()
+        if dead >= self.compact_min_rows and dead > self.compact_ratio * self._manifest["count"]:
+            self._compact()
+
+    def compact(self):
+        """Rewrite the segment without tombstoned rows"""
+        with self._lock:
+            lock = self._writer_lock()
+            try:
+                self.refresh()
+                self._compact()
+            finally:
+                lock.close()
+
+    def _compact(self):
+        """Copy the live rows into a new epoch's files and switch to it; the writer lock is held"""
+        old = self._manifest
+        rows = sorted(self._rows().items(), key=lambda item: item[1])
+        manifest = self._empty_manifest(self.dimension)
+        for start in range(0, len(rows), 10000):
+            records = []
+            for id_, row in rows[start:start + 10000]:
+                record = self._record(row)
+                records.append({"id": id_, "content": record["content"], "metadata": record["metadata"],
+                                "values": self._maps["vectors"][row]})
+            self._write_rows(manifest, records)
+        self._commit(manifest)
+        self._remove_files(old)
+        logger.info(f"Compacted segment at {self.path} to {len(rows)} chunks")
+
+    def _remove_files(self, manifest: Dict[str, Any]):
+        """Delete an old epoch's data files; readers that still map them keep their pages until they remap"""
+        for name in DATA_FILES + tuple(f"meta_{field}.i32" for field in manifest["fields"]):
+            try:
+                os.remove(self._data_file(name, manifest))
+            except FileNotFoundError:
+                pass
+            except OSError as e:  # Windows: still mapped here
+                logger.warning(f"Could not remove old segment file {name}: {str(e)}")
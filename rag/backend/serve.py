@@ -0,0 +1,56 @@
+import os
+import argparse
+import multiprocessing
+import uvicorn
+from dotenv import load_dotenv
+import logging
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def run_writer(stop):
+    """Index writer process: the only one that modifies the on-disk indexes"""
+    os.environ["INDEX_READ_ONLY"] = "0"
+    from index_writer import IndexWriter
+    IndexWriter().run(stop)
+
+
+def main():
+    """
+    Production entry point: N API worker processes plus one index writer.
+
+    Workers open the local index, chunk store, BM25 index and embedding cache
+    read-only. The vector matrix and chunk store are memory-mapped, so
+    workers share one copy in the page cache instead of loading one each.
+    Uploads are spooled to the writer, which indexes them and bumps the
+    index generation. Each worker then remaps in the background.
+    """
+    load_dotenv()
+    parser = argparse.ArgumentParser(description="Serve the RAG API with read-only workers and one index writer")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                        help="API worker processes (default: CPU count)")
+    parser.add_argument("--app", default="app:app", help="ASGI app to serve")
+    args = parser.parse_args()
+
+    context = multiprocessing.get_context("spawn")
+    stop = context.Event()
+    writer = context.Process(target=run_writer, args=(stop,), name="index-writer")
+    writer.start()
+    logger.info(f"Started index writer (pid {writer.pid}); serving {args.workers} read-only workers")
+
+    # Inherited by every worker uvicorn spawns
+    os.environ["INDEX_READ_ONLY"] = "1"
+    try:
+        uvicorn.run(args.app, host=args.host, port=args.port, workers=args.workers)
+    finally:
+        stop.set()
+        writer.join(timeout=30)
+        if writer.is_alive():
+            writer.terminate()
+
+
+if __name__ == "__main__":
+    main()
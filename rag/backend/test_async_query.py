@@ -0,0 +1,75 @@
+import asyncio
+import logging
+import httpx
+import openai
+
+from types import SimpleNamespace
+from embedding_cache import EmbeddingCache
+from embedding_client import EmbeddingClient
+from fake_services import hashed_embedding
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+DIMENSION = 32
+
+class AsyncShuffledEmbeddings:
+    """AsyncOpenAI embeddings stand-in: answers in reverse order and raises error on the first `failures` calls"""
+
+    def __init__(self, failures: int = 0):
+        self.failures = failures
+        self.error = openai.APIConnectionError(request=httpx.Request("POST", "https://api.openai.com/v1/embeddings"))
+        self.calls = []
+
+    async def create(self, model, input):
+        self.calls.append(list(input))
+        if len(self.calls) <= self.failures:
+            raise self.error
+        data = [SimpleNamespace(index=i, embedding=[float(len(t))]) for i, t in enumerate(input)]
+        return SimpleNamespace(data=list(reversed(data)))
+
+def test_aquery_caps_concurrent_queries(make_store, fake_embedder):
+    # Each embedding takes a moment, so concurrent queries overlap
+    store = make_store(DIMENSION, embedder=fake_embedder(DIMENSION, delay=0.05))
+    texts = [f"Clause {i}: fire exits for plot {i}." for i in range(10)]
+    store.add_documents([{"content": t, "metadata": {"source": f"clause_{i}.txt"},
+                          "embedding": hashed_embedding(t, DIMENSION)} for i, t in enumerate(texts)])
+
+    async def run():
+        store.query_limiter = asyncio.Semaphore(2)
+        return await asyncio.gather(*(store.aquery(t, limit=1) for t in texts[:8]))
+
+    results = asyncio.run(run())
+    assert [r[0]["content"] for r in results] == texts[:8]
+    # Eight concurrent requests, never more than two embedding at once
+    assert store.embedder.peak == 2
+
+def test_async_embeddings_are_ordered_retried_and_cached():
+    embeddings = AsyncShuffledEmbeddings(failures=1)
+    client = EmbeddingClient(SimpleNamespace(embeddings=None), max_retries=2,
+                             cache=EmbeddingCache(cache_dir=None, dimensions=1))
+    client._async_client = SimpleNamespace(embeddings=embeddings)
+    texts = ["setback", "fire exit", "ramp", "fire exit"]
+
+    assert asyncio.run(client.aget_embeddings(texts)) == [[float(len(t))] for t in texts]
+    # One failed attempt retried, with the repeated text sent once
+    assert embeddings.calls == [["setback", "fire exit", "ramp"]] * 2
+    assert asyncio.run(client.aget_embedding("ramp")) == [4.0] and len(embeddings.calls) == 2
+
+    embeddings.failures = 10
+    try:
+        asyncio.run(client.aget_embedding("stairs"))
+        assert False, "a batch out of attempts must raise"
+    except openai.APIConnectionError:
+        pass
+    assert len(embeddings.calls) == 4
+
+    # A request the API rejects fails the same way again, so it is not retried
+    embeddings.error = openai.BadRequestError("bad input", body=None, response=httpx.Response(
+        400, request=httpx.Request("POST", "https://api.openai.com/v1/embeddings")))
+    try:
+        asyncio.run(client.aget_embedding("stairs"))
+        assert False, "a rejected batch must raise"
+    except openai.BadRequestError:
+        pass
+    assert len(embeddings.calls) == 5
@@ -0,0 +1,123 @@
+import logging
+import numpy as np
+import pytest
+
+from fastapi.testclient import TestClient
+from benchmark_quantization import make_corpus
+from local_index import LocalVectorIndex
+from fake_services import FakePineconeIndex, hashed_embedding
+from query_documents import DocumentQuerier
+from pinecone_client import PineconeClient
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+DIMENSION = 64
+
+DOCS = [
+    ("Fire exits must be at least 1.5 m wide.", "fire.txt", "regulatory_compliance"),
+    ("Every staircase shall have a handrail on both sides.", "stairs.txt", "regulatory_compliance"),
+    ("The science park schedule has three phases.", "schedule.txt", "project_management"),
+    ("The ground floor plan shows the main lobby.", "plan.txt", "design_documents"),
+]
+
+@pytest.fixture
+def docs_store(make_store):
+    """Factory for a store holding DOCS, optionally over another index"""
+    def make(index=None):
+        # Chunk text in a segment store, as with CHUNK_STORE_PATH set
+        store = make_store(DIMENSION, chunk_store=True)
+        if index is not None:
+            store.index = index
+        store.add_documents([{"content": text, "metadata": {"source": source, "category": category},
+                              "embedding": hashed_embedding(text, DIMENSION)}
+                             for text, source, category in DOCS])
+        return store
+    return make
+
+def test_index_query_many_matches_single_queries():
+    vectors, queries = make_corpus(3000, DIMENSION, 20)
+    for quantization in (None, "int8"):
+        index = LocalVectorIndex(dimension=DIMENSION, path=None, quantization=quantization)
+        index.upsert([(f"v{i}", v, {"seventh": i % 7 == 0}) for i, v in enumerate(vectors)])
+        for query_filter in (None, {"seventh": {"$eq": True}}):
+            batch = index.query_many(queries, top_k=5, filter=query_filter)
+            for q, result in zip(queries, batch):
+                single = index.query(q, top_k=5, filter=query_filter).matches
+                assert [m.id for m in result.matches] == [m.id for m in single]
+                assert np.allclose([m.score for m in result.matches], [m.score for m in single], atol=1e-5)
+    assert index.query_many([], top_k=5) == []
+
+def test_query_many_embeds_once_and_matches_query(docs_store):
+    store = docs_store()
+    queries = ["fire exit width", "handrail staircase", "science park phases", "ground floor lobby"]
+    expected = [store.query(q, limit=2) for q in queries]
+    store.result_cache.bump_generation()
+
+    store.embedder.calls = 0
+    batch = store.query_many(queries, limit=2)
+    assert store.embedder.calls == 1
+    assert [[r["id"] for r in results] for results in batch] == [[r["id"] for r in results] for results in expected]
+
+    # Cached queries are answered without another embedding request
+    assert store.query_many(queries[:2], limit=2) == batch[:2]
+    assert store.embedder.calls == 1
+
+    # Filters apply per query
+    filtered = store.query_many(["fire exit width", "fire exit width"], limit=4,
+                                filters=[{"category": "project_management"}, None])
+    assert {r["metadata"]["source"] for r in filtered[0]} == {"schedule.txt"}
+    assert filtered[1][0]["metadata"]["source"] == "fire.txt"
+
+def test_cached_results_do_not_share_metadata(docs_store):
+    store = docs_store()
+    first = store.query("fire exit width", limit=2)
+    expected = [dict(r["metadata"]) for r in first]
+    # Changing what a caller was served changes neither the cache nor the next caller's copy
+    first[0]["metadata"]["score"] = -1.0
+    second = store.query("fire exit width", limit=2)
+    assert store.result_cache.hits == 1 and [r["metadata"] for r in second] == expected
+    second[0]["metadata"]["source"] = "changed.txt"
+    assert [r["metadata"] for r in store.query("fire exit width", limit=2)] == expected
+
+    docs = store.similarity_search("fire exit width", k=2)
+    docs[0].metadata["source"] = "changed.txt"
+    assert store.similarity_search("fire exit width", k=2)[0].metadata["source"] == "fire.txt"
+
+def test_query_many_without_multi_query_backend(docs_store):
+    """Pinecone has no multi-vector query; the batch becomes concurrent single queries"""
+    store = docs_store(FakePineconeIndex(dimension=DIMENSION, latency=0))
+    querier = DocumentQuerier(vector_store=store)
+    results = querier.search_many(["handrail staircase", "ground floor lobby"], k=2)
+    assert [r[0]["metadata"]["source"] for r in results] == ["stairs.txt", "plan.txt"]
+    assert store.index.calls["query"] == 2 and store.embedder.calls == 1
+
+def test_batch_search_with_pinecone_client_embedder(docs_store, fake_embedder):
+    """The default backend embeds through PineconeClient, which must have the async batch method too"""
+    store = docs_store(FakePineconeIndex(dimension=DIMENSION, latency=0))
+    # The real class, minus its constructor's environment checks and network clients
+    store.embedder = PineconeClient.__new__(PineconeClient)
+    store.embedder.embedding_client = fake_embedder(DIMENSION)
+
+    import app as api
+    api.vector_store = store
+    client = TestClient(api.app)
+    queries = ["handrail staircase", "science park phases", "handrail staircase"]
+    response = client.post("/api/search/batch", json={"queries": queries, "limit": 1})
+    assert response.status_code == 200
+    assert [r[0]["source"] for r in response.json()["results"]] == ["stairs.txt", "schedule.txt", "stairs.txt"]
+    # Duplicate queries are embedded once
+    assert store.embedder.embedding_client.texts == ["handrail staircase", "science park phases"]
+
+def test_batch_search_endpoint(docs_store):
+    import app as api
+    api.vector_store = docs_store()
+    client = TestClient(api.app)
+    response = client.post("/api/search/batch", json={"queries": ["fire exit width", "science park phases"], "limit": 1})
+    assert response.status_code == 200
+    assert [r[0]["source"] for r in response.json()["results"]] == ["fire.txt", "schedule.txt"]
+
+    response = client.post("/api/search/batch", json={"queries": ["a", "b"], "filters": [None]})
+    assert response.status_code == 400
+    response = client.post("/api/search/batch", json={"queries": ["q"] * (api.MAX_BATCH_QUERIES + 1)})
+    assert response.status_code == 400
@@ -0,0 +1,34 @@
+import os
+import logging
+import numpy as np
+
+from benchmark_e2e import compare, scale_dataset, DATASET_DIR
+from fake_services import FakePineconeIndex, hashed_embedding
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+def test_compare_flags_regressions_only():
+    baseline = {"config": {"scale": 1},
+                "search": {"throughput_rps": 100.0, "latency_p95_ms": 50.0, "api_calls": {"index_query": 10}}}
+    same = {"search": {"throughput_rps": 90.0, "latency_p95_ms": 55.0, "api_calls": {"index_query": 10}}}
+    assert compare(same, baseline, tolerance=0.25) == []
+
+    worse = {"search": {"throughput_rps": 60.0, "latency_p95_ms": 40.0, "api_calls": {"index_query": 20}}}
+    regressions = compare(worse, baseline, tolerance=0.25)
+    assert len(regressions) == 2
+    assert regressions[0].startswith("search.throughput_rps") and regressions[1].startswith("search.api_calls.index_query")
+
+def test_scaled_copies_are_distinct_and_fake_index_counts_calls(tmp_path):
+    target = str(tmp_path)
+    files = scale_dataset(DATASET_DIR, target, 2)
+    paths = sorted(os.path.join(root, name) for root, _, names in os.walk(target) for name in names)
+    assert files == len(paths) and files > 0
+    with open(paths[0]) as a, open(paths[1]) as b:
+        assert a.read() != b.read()
+
+    index = FakePineconeIndex(dimension=64, latency=0)
+    index.upsert([("a", hashed_embedding("fire exit width", 64)), ("b", hashed_embedding("parking ramp slope", 64))])
+    assert index.query(hashed_embedding("fire exit", 64), top_k=1).matches[0].id == "a"
+    assert index.calls == {"upsert": 1, "query": 1}
+    assert np.isclose(np.linalg.norm(hashed_embedding("fire exit", 64)), 1.0)
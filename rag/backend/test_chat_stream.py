@@ -0,0 +1,87 @@
+import json
+import time
+import asyncio
+import logging
+
+from chat_stream import chat_events
+from llm_client import FakeLLMClient
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+RESULTS = [
+    {"content": "Fire escapes must be provided on every floor.",
+     "metadata": {"source": "mumbai_fire_safety.txt"}, "score": 0.91},
+    {"content": "Minimum setback is 3 metres.",
+     "metadata": {"source": "setbacks.txt"}, "score": 0.85},
+]
+
+class FakeVectorStore:
+    """Returns fixed results after a fixed retrieval latency"""
+
+    def __init__(self, results, latency: float = 0.05):
+        self.results = results
+        self.latency = latency
+
+    async def aquery(self, query, limit=5, filters=None):
+        await asyncio.sleep(self.latency)
+        return self.results[:limit]
+
+def _parse(events):
+    parsed = []
+    for event in events:
+        lines = event.strip().split("\n")
+        parsed.append((lines[0][len("event: "):], json.loads(lines[1][len("data: "):])))
+    return parsed
+
+async def _collect(store, llm):
+    arrivals, events = [], []
+    start = time.perf_counter()
+    async for event in chat_events("fire escapes?", store, llm):
+        arrivals.append(time.perf_counter() - start)
+        events.append(event)
+    return arrivals, _parse(events)
+
+def test_sources_arrive_before_generation():
+    """First byte is bounded by retrieval latency, not by generation latency"""
+    llm = FakeLLMClient(tokens_per_second=20, response=" ".join(["word"] * 20))
+    arrivals, events = asyncio.run(_collect(FakeVectorStore(RESULTS), llm))
+
+    assert events[0][0] == "sources"
+    assert [s["source"] for s in events[0][1]["sources"]] == ["mumbai_fire_safety.txt", "setbacks.txt"]
+    assert events[-1][0] == "done"
+    assert "".join(data["token"] for kind, data in events if kind == "token") == llm.response
+    # 20 tokens at 20/s take ~1s; sources go out after ~50ms of retrieval
+    assert arrivals[0] < 0.3
+    assert arrivals[-1] > 0.9
+
+def test_no_results_skips_generation():
+    arrivals, events = asyncio.run(_collect(FakeVectorStore([]), FakeLLMClient(tokens_per_second=1)))
+    assert [kind for kind, _ in events] == ["sources", "token", "done"]
+    assert arrivals[-1] < 0.5
+
+def test_retrieval_error_reported_in_band():
+    class FailingStore:
+        async def aquery(self, query, limit=5, filters=None):
+            raise RuntimeError("index unavailable")
+
+    _, events = asyncio.run(_collect(FailingStore(), FakeLLMClient()))
+    assert events == [("error", {"detail": "index unavailable"})]
+
+def test_chat_endpoint_streams_sse():
+    from fastapi.testclient import TestClient
+    import app as app_module
+
+    app_module.vector_store.aquery = FakeVectorStore(RESULTS).aquery
+    with TestClient(app_module.app) as client:
+        response = client.post("/api/chat", params={"message": "fire escapes?", "stream": "true"})
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/event-stream")
+        events = _parse(e for e in response.text.split("\n\n") if e.strip())
+        assert events[0][0] == "sources" and events[-1][0] == "done"
+        answer = "".join(data["token"] for kind, data in events if kind == "token")
+        assert answer.startswith("Based on the HSA regulations [1], Fire escapes")
+
+        response = client.post("/api/chat", params={"message": "fire escapes?"})
+        assert response.json() == {"response": answer,
+                                   "sources": ["mumbai_fire_safety.txt", "setbacks.txt"]}
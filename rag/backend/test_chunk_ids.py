@@ -0,0 +1,107 @@
+import logging
+import threading
+import pytest
+
+from langchain.schema import Document
+from fake_services import FakePineconeIndex
+from chunk_ids import make_chunk_id, document_id
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+DIMENSION = 32
+
+@pytest.fixture
+def processor_over(make_store, make_processor, tmp_path_factory):
+    """Factory for a processor over a fake Pinecone index, with local indexes of its own like a separate process"""
+    def make(index: FakePineconeIndex):
+        store = make_store(DIMENSION, root=tmp_path_factory.mktemp("process"))
+        store.index = index
+        return make_processor(store, parse_workers=1, embed_workers=1)
+    return make
+
+def _chunks(count: int = 6, category: str = "design_documents"):
+    return [Document(page_content=f"Clause {i}: stair risers of at most {150 + i} mm.",
+                     metadata={"source": "codes/stairs.txt", "chunk_index": i, "category": category})
+            for i in range(count)]
+
+def test_chunk_ids_are_stable():
+    chunk_id = make_chunk_id("codes/stairs.txt", 3, "Risers of at most 150 mm.")
+    assert chunk_id == make_chunk_id("codes/stairs.txt", 3, "Risers of at most 150 mm.")
+    # Equivalent spellings of a path name the same source
+    assert chunk_id == make_chunk_id("codes/./stairs.txt", 3, "Risers of at most 150 mm.")
+    assert len({chunk_id,
+                make_chunk_id("codes/ramps.txt", 3, "Risers of at most 150 mm."),
+                make_chunk_id("codes/stairs.txt", 4, "Risers of at most 150 mm."),
+                make_chunk_id("codes/stairs.txt", 3, "Risers of at most 160 mm.")}) == 4
+    source_digest, index, content_digest = chunk_id.split("_")
+    assert len(source_digest) == 16 and index == "3" and len(content_digest) == 16
+
+    # Document dicts take an explicit ID, then the chunk's, then one made from source, chunk index and content
+    doc = {"content": "Risers of at most 150 mm.", "metadata": {"source": "codes/stairs.txt"}}
+    assert document_id(doc, 3) == chunk_id
+    assert document_id({**doc, "metadata": {**doc["metadata"], "chunk_id": "c"}}) == "c"
+    assert document_id({**doc, "id": "explicit"}) == "explicit"
+
+def test_rerun_skips_existing_chunks(processor_over):
+    index = FakePineconeIndex(dimension=DIMENSION, latency=0)
+    processor = processor_over(index)
+    store = processor.vector_store
+    assert processor.index_documents(_chunks()) == 6
+    assert store.embedder.embedded == 6
+    calls = dict(index.calls)
+
+    # Same chunks again: nothing embedded or written, and the IDs upserted here need no fetch
+    assert processor.index_documents(_chunks()) == 0
+    assert store.embedder.embedded == 6
+    assert index.calls == calls
+
+    # Another process over the same index fetches once to learn which IDs exist
+    rerun = processor_over(index)
+    assert rerun.index_documents(_chunks()) == 0
+    assert rerun.vector_store.embedder.embedded == 0
+    assert index.calls["fetch"] == calls.get("fetch", 0) + 1 and index.calls["upsert"] == calls["upsert"]
+
+    # A changed metadata field reaches the existing vectors without re-embedding them
+    assert rerun.index_documents(_chunks(category="regulatory_compliance")) == 0
+    assert rerun.vector_store.embedder.embedded == 0 and index.calls["update"] == 6
+    stored = index.index.fetch([rerun.vector_store.document_id({"content": d.page_content, "metadata": d.metadata})
+                                for d in _chunks()]).vectors
+    assert {v.metadata["category"] for v in stored.values()} == {"regulatory_compliance"}
+
+def test_known_ids_are_bounded(processor_over):
+    index = FakePineconeIndex(dimension=DIMENSION, latency=0)
+    processor = processor_over(index)
+    store = processor.vector_store
+    store.known_ids_limit = 4
+    processor.index_documents(_chunks())
+    assert len(store._known_metadata) == 4
+
+    # Forgotten IDs are fetched again rather than taken for new
+    ids = [store.document_id({"content": d.page_content, "metadata": d.metadata}) for d in _chunks()]
+    fetches = index.calls["fetch"]
+    assert store.existing_ids(ids) == set(ids)
+    assert index.calls["fetch"] == fetches + 1
+
+def test_known_ids_survive_concurrent_jobs(make_store):
+    store = make_store(DIMENSION)
+    store.known_ids_limit = 50
+    errors = []
+
+    def job(n: int):
+        # Each thread records and checks its own IDs while the others evict theirs
+        try:
+            for i in range(300):
+                ids = [f"job{n}_{i}_{k}" for k in range(5)]
+                store._remember({id_: "digest" for id_ in ids})
+                store.existing_ids(ids)
+                store.delete_documents(ids[:1])
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=job, args=(n,)) for n in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == [] and len(store._known_metadata) <= 50
@@ -0,0 +1,97 @@
+import time
+import asyncio
+import threading
+import logging
+import httpx
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from clients import ClientRegistry, get_clients
+from vector_store import VectorStore
+from dataset_processor import DatasetProcessor
+from llm_client import LLMClient
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+class CountingServer:
+    """Loopback HTTP/1.1 server counting the connections it accepts and the requests in flight"""
+
+    def __init__(self, latency: float = 0.05):
+        self.connections = 0
+        self.in_flight = 0
+        self.peak = 0
+        self._lock = threading.Lock()
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def setup(self):
+                super().setup()
+                with server._lock:
+                    server.connections += 1
+
+            def do_GET(self):
+                with server._lock:
+                    server.in_flight += 1
+                    server.peak = max(server.peak, server.in_flight)
+                time.sleep(latency)
+                with server._lock:
+                    server.in_flight -= 1
+                self.send_response(200)
+                self.send_header("Content-Length", "2")
+                self.end_headers()
+                self.wfile.write(b"ok")
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.httpd.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.httpd.server_port}/"
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+def test_settings_applied_to_pools():
+    registry = ClientRegistry({"timeout": 7, "max_connections": 2, "max_keepalive_connections": 2})
+    assert registry.openai.timeout == 7 and registry.http_client.timeout == httpx.Timeout(7)
+    assert registry.openai._client is registry.http_client
+    assert registry.async_openai._client is registry.async_http_client
+    assert registry.embeddings.client is registry.openai.embeddings
+
+    server = CountingServer()
+    try:
+        # Sequential requests reuse one kept-alive connection
+        for _ in range(4):
+            assert registry.http_client.get(server.url).text == "ok"
+        assert server.connections == 1
+
+        # A burst is queued on the pool: never more than max_connections sockets
+        threads = [threading.Thread(target=registry.http_client.get, args=(server.url,)) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert server.peak <= 2 and server.connections <= 2
+    finally:
+        server.close()
+
+    http_client = registry.http_client
+    asyncio.run(registry.aclose())
+    assert http_client.is_closed and registry.http_client is not http_client
+
+def test_components_share_one_client():
+    """Every component reaches OpenAI through the same pooled client"""
+    store = VectorStore()
+    store.initialize()
+    processor = DatasetProcessor(vector_store=store)
+    other = VectorStore()
+    other.initialize()
+
+    assert processor.vector_store is store
+    assert store.embedder.openai_client is other.embedder.openai_client is get_clients().openai
+    assert store.embedder.async_client is LLMClient().client is get_clients().async_openai
+    assert store.embeddings is get_clients().embeddings
@@ -0,0 +1,89 @@
+import os
+import io
+import json
+import hashlib
+import logging
+import pytest
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+DATASET_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "dataset")
+
+class FakeS3Client:
+    """Filesystem-backed stand-in for the boto3 S3 client calls used by DatasetProcessor"""
+
+    def __init__(self, root: str):
+        self.root = root
+        self.get_calls = 0
+
+    def get_paginator(self, operation: str):
+        assert operation == 'list_objects_v2'
+        return self
+
+    def paginate(self, Bucket: str, Prefix: str):
+        contents = []
+        for root, _, files in os.walk(os.path.join(self.root, Prefix)):
+            for file in sorted(files):
+                path = os.path.join(root, file)
+                with open(path, 'rb') as f:
+                    etag = hashlib.md5(f.read()).hexdigest()
+                contents.append({'Key': os.path.relpath(path, self.root), 'ETag': f'"{etag}"'})
+        yield {'Contents': contents}
+
+    def get_object(self, Bucket: str, Key: str):
+        self.get_calls += 1
+        with open(os.path.join(self.root, Key), 'rb') as f:
+            return {'Body': io.BytesIO(f.read())}
+
+@pytest.fixture
+def cloud_processor(make_processor, tmp_path):
+    """Factory for a processor reading an S3 bucket laid out under bucket_root"""
+    def make(bucket_root: str):
+        processor = make_processor(cloud_config={'aws': {'bucket': 'test-bucket', 'access_key': 'test',
+                                                         'secret_key': 'test', 'region': 'us-east-1'}})
+        processor.processor.s3_client = FakeS3Client(bucket_root)
+        processor.etag_manifest_path = str(tmp_path / "cloud_etags.json")
+        return processor
+    return make
+
+def test_cloud_dataset_matches_local_dataset(cloud_processor):
+    """Objects are fetched concurrently and parsed from memory into the same chunks as local files"""
+    processor = cloud_processor(DATASET_DIR)
+    cloud_docs = processor.process_dataset("regulatory_compliance", is_cloud=True, cloud_type='aws')
+    local_docs = processor.processor.process_text(
+        os.path.join(DATASET_DIR, "regulatory_compliance", "building_codes", "mumbai_fire_safety.txt"))
+
+    assert cloud_docs
+    assert {d.page_content for d in local_docs} <= {d.page_content for d in cloud_docs}
+
+def test_unchanged_objects_skipped_by_etag(cloud_processor, tmp_path):
+    """A second incremental pass downloads nothing until an object changes"""
+    bucket_root = str(tmp_path / "bucket")
+    os.makedirs(os.path.join(bucket_root, "docs"))
+    for name in ("a.txt", "b.txt"):
+        with open(os.path.join(bucket_root, "docs", name), 'w') as f:
+            f.write(f"Rule {name}: minimum setback of 3 metres.")
+
+    processor = cloud_processor(bucket_root)
+    client = processor.processor.s3_client
+
+    # Fetched but never indexed: the objects are not marked as processed
+    assert len(processor.update_dataset("docs", is_cloud=True, cloud_type='aws')) == 2
+    assert not os.path.exists(processor.etag_manifest_path)
+    docs = processor.update_dataset("docs", is_cloud=True, cloud_type='aws')
+    assert len(docs) == 2 and client.get_calls == 4
+
+    assert processor.index_documents(docs) == 2
+    with open(processor.etag_manifest_path) as f:
+        assert sorted(json.load(f)) == [f"aws:test-bucket:{os.path.join('docs', n)}" for n in ("a.txt", "b.txt")]
+    assert processor.update_dataset("docs", is_cloud=True, cloud_type='aws') == []
+    assert client.get_calls == 4
+
+    with open(os.path.join(bucket_root, "docs", "b.txt"), 'w') as f:
+        f.write("Rule b.txt: minimum setback of 4.5 metres.")
+    docs = processor.update_dataset("docs", is_cloud=True, cloud_type='aws')
+    assert [d.metadata["source"] for d in docs] == [os.path.join("docs", "b.txt")]
+    assert client.get_calls == 5
+    processor.index_documents(docs)
+    assert processor.update_dataset("docs", is_cloud=True, cloud_type='aws') == []
@@ -0,0 +1,24 @@
+import logging
+import numpy as np
+
+from embedding_cache import EmbeddingCache
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+def test_memory_tier_holds_float32_rows():
+    cache = EmbeddingCache(cache_dir=None, dimensions=4, max_memory_entries=2)
+    cache.put_many(["a", "b", "c"], "m", [[0.5, 1.0, 1.5, 2.0], [1.0] * 4, [2.0] * 4])
+    assert cache.get("a", "m") is None and cache.stats()["evictions"] == 1
+    row = cache._memory[cache.make_key("b", "m")]
+    assert isinstance(row, np.ndarray) and row.dtype == np.float32
+    # Callers still get plain lists
+    assert cache.get_many(["b", "x"], "m") == [[1.0] * 4, None]
+
+def test_disk_tier_survives_restart(tmp_path):
+    cache_dir = str(tmp_path)
+    EmbeddingCache(cache_dir=cache_dir, dimensions=4).put("a", "m", [0.5, 1.0, 1.5, 2.0])
+    reopened = EmbeddingCache(cache_dir=cache_dir, dimensions=4)
+    assert reopened.get("a", "m") == [0.5, 1.0, 1.5, 2.0]
+    assert reopened.stats()["disk_hits"] == 1
+    assert reopened._memory[reopened.make_key("a", "m")].dtype == np.float32
@@ -0,0 +1,96 @@
+import logging
+import httpx
+import openai
+
+from types import SimpleNamespace
+import embedding_client
+from embedding_client import EmbeddingClient
+from fake_services import FakeOpenAIServer
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+REQUEST = httpx.Request("POST", "https://api.openai.com/v1/embeddings")
+
+def _status_error(error_class, status: int) -> openai.APIStatusError:
+    return error_class(f"status {status}", response=httpx.Response(status, request=REQUEST), body=None)
+
+class ShuffledEmbeddings:
+    """OpenAI embeddings stand-in: answers in reverse order, raises what fail(batch) returns"""
+
+    def __init__(self, fail=lambda batch: None):
+        self.fail = fail
+        self.calls = []
+
+    def create(self, model, input):
+        self.calls.append(list(input))
+        error = self.fail(input)
+        if error is not None:
+            raise error
+        data = [SimpleNamespace(index=i, embedding=[float(len(t))]) for i, t in enumerate(input)]
+        return SimpleNamespace(data=list(reversed(data)))
+
+def _texts():
+    # About 4 tokens each by the character estimate, so a 10-token budget batches them in pairs
+    return ["a" * 12, "b" * 13, "c" * 14, "d" * 15, "e" * 12]
+
+def test_batch_order_is_restored_from_index():
+    embeddings = ShuffledEmbeddings()
+    client = EmbeddingClient(SimpleNamespace(embeddings=embeddings), max_batch_tokens=10)
+    client._encoding = False
+    texts = _texts()
+    assert client.get_embeddings(texts) == [[float(len(t))] for t in texts]
+    assert embeddings.calls == [texts[0:2], texts[2:4], texts[4:]]
+
+def test_only_the_failed_batch_is_retried():
+    failures = []
+
+    def fail(batch):
+        # The middle batch fails once
+        if batch[0].startswith("c") and not failures:
+            failures.append(batch)
+            return openai.APIConnectionError(request=REQUEST)
+        return None
+
+    embeddings = ShuffledEmbeddings(fail)
+    client = EmbeddingClient(SimpleNamespace(embeddings=embeddings), max_batch_tokens=10, max_retries=2)
+    client._encoding = False
+    texts = _texts()
+    assert client.get_embeddings(texts) == [[float(len(t))] for t in texts]
+    assert embeddings.calls == [texts[0:2], texts[2:4], texts[2:4], texts[4:]]
+
+def test_only_transient_errors_are_retried(monkeypatch):
+    # Retries back off for 1s, then 2s
+    monkeypatch.setattr(embedding_client.time, "sleep", lambda seconds: None)
+    for error, calls in ((_status_error(openai.InternalServerError, 503), 3),
+                         (_status_error(openai.RateLimitError, 429), 3),
+                         (openai.APITimeoutError(REQUEST), 3),
+                         (_status_error(openai.BadRequestError, 400), 1),
+                         (_status_error(openai.AuthenticationError, 401), 1)):
+        embeddings = ShuffledEmbeddings(lambda batch: error)
+        client = EmbeddingClient(SimpleNamespace(embeddings=embeddings), max_retries=3)
+        client._encoding = False
+        try:
+            client.get_embeddings(["a"])
+            assert False, "a failing batch must raise"
+        except openai.APIError as e:
+            assert e is error
+        assert len(embeddings.calls) == calls, (error, embeddings.calls)
+
+def test_sdk_retries_do_not_stack(monkeypatch):
+    monkeypatch.setattr(embedding_client.time, "sleep", lambda seconds: None)
+    # One request a minute: after the first, every request is answered 429
+    server = FakeOpenAIServer(requests_per_period=1, period=60.0)
+    try:
+        # The SDK client would retry each request twice more by itself
+        client = EmbeddingClient(openai.OpenAI(api_key="test", base_url=server.base_url), max_retries=3)
+        client._encoding = False
+        assert len(client.get_embeddings(["setback"])[0]) == 1536
+        try:
+            client.get_embeddings(["fire exit width"])
+            assert False, "a throttled batch out of attempts must raise"
+        except openai.RateLimitError:
+            pass
+        assert server.rejected == 3 and server.served == 1
+    finally:
+        server.close()
@@ -0,0 +1,91 @@
+import logging
+import numpy as np
+import pytest
+
+from fake_services import FakePineconeIndex, hashed_embedding
+from local_index import LocalVectorIndex
+from vector_store import VectorStore
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+DIMENSION = 32
+
+@pytest.fixture
+def store(make_store):
+    # Vector search alone, so the filters are what decides the results
+    store = make_store(DIMENSION)
+    store.hybrid_search = False
+    return store
+
+def _docs(n: int = 40):
+    docs = []
+    for i in range(n):
+        content = f"Clause {i}: fire exits, stairs and setbacks for plot {i}."
+        docs.append({"content": content, "embedding": hashed_embedding(content, DIMENSION),
+                     "metadata": {"source": f"codes/clause_{i}.txt", "chunk_index": 0,
+                                  "category": "regulatory_compliance" if i % 10 == 0 else "design_documents",
+                                  "file_type": "txt"}})
+    return docs
+
+def test_inverted_index_answers_filters():
+    index = LocalVectorIndex(dimension=4, path=None)
+    rng = np.random.default_rng(0)
+    index.upsert([(f"v{i}", rng.normal(size=4).tolist(),
+                   {"category": "a" if i % 3 == 0 else "b", "tags": ["x", "y"] if i % 2 else ["z"]})
+                  for i in range(30)])
+    assert index._match_filter({"category": {"$eq": "a"}}) == {f"v{i}" for i in range(0, 30, 3)}
+    assert index._match_filter({"tags": {"$in": ["z"]}}) == {f"v{i}" for i in range(0, 30, 2)}
+    assert index._match_filter({"$and": [{"category": "a"}, {"tags": {"$eq": "y"}}]}) == {"v3", "v9", "v15", "v21", "v27"}
+
+    # Overwrites, updates and deletes keep the inverted index in step
+    index.upsert([("v0", [1.0, 0, 0, 0], {"category": "b", "tags": ["z"]})])
+    index.update("v1", set_metadata={"category": "a"})
+    index.delete(ids=["v3"])
+    matched = index._match_filter({"category": "a"})
+    assert "v0" not in matched and "v1" in matched and "v3" not in matched
+    assert index.fetch(["v1"]).vectors["v1"].metadata == {"category": "a", "tags": ["x", "y"]}
+
+    # A filtered query returns top_k matches even when they are not among the nearest vectors
+    results = index.query([1.0, 0, 0, 0], top_k=5, filter={"category": {"$eq": "a"}}).matches
+    assert len(results) == 5 and all(m.metadata["category"] == "a" for m in results)
+
+def test_filters_are_pushed_down_to_the_index(store):
+    store.add_documents(_docs())
+    seen = []
+    query = store.index.query
+    store.index.query = lambda **kwargs: seen.append(kwargs["filter"]) or query(**kwargs)
+
+    results = store.query("fire exits plot 7", limit=4, filters={"category": "regulatory_compliance"})
+    assert seen[-1] == {"category": {"$eq": "regulatory_compliance"}}
+    assert len(results) == 4 and all(r["metadata"]["category"] == "regulatory_compliance" for r in results)
+
+    store.query("fire exits", limit=2, filters={"category": ["design_documents", "regulatory_compliance"]})
+    assert seen[-1] == {"category": {"$in": ["design_documents", "regulatory_compliance"]}}
+
+    # Unknown fields are logged and ignored rather than failing the query
+    assert len(store.query("fire exits", limit=3, filters={"colour": "red"})) == 3
+    assert seen[-1] is None
+    assert VectorStore.compile_filter({"colour": "red", "file_type": "txt"}) == {"file_type": {"$eq": "txt"}}
+
+def test_existing_vectors_get_new_filter_fields(store):
+    store.index = FakePineconeIndex(dimension=DIMENSION, latency=0)
+    docs = _docs(10)
+    # Upserted before 'category' was a filter field
+    store.add_documents([{**d, "metadata": {k: v for k, v in d["metadata"].items() if k != "category"}}
+                         for d in docs])
+    assert store.query("fire exits", limit=3, filters={"category": "design_documents"}) == []
+
+    # Re-ingesting the same chunks writes only the metadata, to the vectors that lack it
+    assert store.add_documents(docs) == 0
+    assert store.index.calls["update"] == 10 and store.index.calls["upsert"] == 1
+    store.result_cache.bump_generation()
+    results = store.query("fire exits", limit=20, filters={"category": "design_documents"})
+    assert len(results) == 9
+
+    # Unchanged metadata needs no further writes; a changed field is written again
+    assert store.add_existing(docs) == 0
+    changed = [{**d, "metadata": {**d["metadata"], "file_type": "md"}} for d in docs[:2]]
+    assert store.add_existing(changed) == 2 and store.index.calls["update"] == 12
+    store.result_cache.bump_generation()
+    assert len(store.query("fire exits", limit=5, filters={"file_type": "md"})) == 2
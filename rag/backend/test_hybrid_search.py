@@ -0,0 +1,136 @@
+import os
+import re
+import time
+import zlib
+import logging
+import numpy as np
+import pytest
+
+from bm25_index import BM25Index, tokenize, reciprocal_rank_fusion
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+def _word_embedding(text):
+    """Bag of words that ignores numbers, like a semantic model blurring rule references"""
+    vector = np.zeros(64, dtype=np.float32)
+    for word in re.findall(r"[a-z]+", text.lower()):
+        vector[zlib.crc32(word.encode()) % 64] += 1.0
+    return vector.tolist()
+
+@pytest.fixture
+def store(make_store, fake_embedder):
+    return make_store(64, embedder=fake_embedder(64, embed=_word_embedding), chunk_store=True)
+
+def _rules():
+    docs = []
+    for n in range(1, 31):
+        content = f"Rule 33({n}): parking spaces shall be provided for residential buildings as per the zone."
+        docs.append({"content": content, "metadata": {"source": f"dcpr/rule_33_{n}.txt", "chunk_index": 0,
+                                                      "category": "parking" if n % 2 else "zoning"}})
+    for doc in docs:
+        doc["embedding"] = _word_embedding(doc["content"])
+    return docs
+
+def test_tokenize_clause_references():
+    assert tokenize("Rule 33(7)(a) of the Fire Act") == ["rule", "33(7)(a)", "33(7)", "33", "fire", "act"]
+    assert tokenize("Section 12.3.1") == ["section", "12.3.1"]
+
+def test_reciprocal_rank_fusion():
+    fused = reciprocal_rank_fusion([["a", "b", "c"], ["c", "a"]], k=60)
+    assert [id_ for id_, _ in fused] == ["a", "c", "b"]
+
+def test_exact_rule_reference_found(store):
+    store.add_documents(_rules())
+
+    results = store.query("What does Rule 33(7) require?", limit=3)
+    hit = [r for r in results if r["metadata"]["source"] == "dcpr/rule_33_7.txt"]
+    # Found by BM25 alone: the fake embeddings cannot tell the rules apart
+    assert hit and hit[0]["lexical_score"] is not None and hit[0]["vector_score"] is None
+    # 'score' stays the cosine similarity (from the stored vector here); the order follows the fused score
+    query_vector = np.asarray(_word_embedding("What does Rule 33(7) require?"))
+    chunk_vector = np.asarray(_word_embedding(hit[0]["content"]))
+    cosine = query_vector @ chunk_vector / (np.linalg.norm(query_vector) * np.linalg.norm(chunk_vector))
+    assert abs(hit[0]["score"] - cosine) < 1e-4
+    assert [r["fused_score"] for r in results] == sorted((r["fused_score"] for r in results), reverse=True)
+    assert all(r["score"] == r["vector_score"] for r in results if r["vector_score"] is not None)
+
+    store.hybrid_search = False
+    store.result_cache.bump_generation()
+    vector_only = store.query("What does Rule 33(7) require?", limit=3)
+    assert "dcpr/rule_33_7.txt" not in [r["metadata"]["source"] for r in vector_only]
+
+def test_lexical_hit_without_vector_is_dropped(store):
+    docs = _rules()
+    store.add_documents(docs)
+    # Another writer deleted the chunk; this BM25 index hasn't caught up yet
+    target = store.document_id(docs[6])
+    store.chunk_store.delete([target])
+    store.index.delete(ids=[target])
+    assert store.lexical_index.get(target) is not None
+
+    results = store.query("What does Rule 33(7) require?", limit=3)
+    assert len(results) == 3 and all(r["score"] is not None for r in results)
+    assert "dcpr/rule_33_7.txt" not in [r["metadata"]["source"] for r in results]
+
+def test_filters_apply_to_lexical_side(store):
+    store.add_documents(_rules())
+    results = store.query("Rule 33(8)", limit=3, filters={"category": "parking"})
+    assert results and all(r["metadata"]["category"] == "parking" for r in results)
+    assert "dcpr/rule_33_8.txt" not in [r["metadata"]["source"] for r in results]
+
+def test_incremental_updates_and_persistence(store, tmp_path):
+    docs = _rules()
+    store.add_documents(docs)
+    target = store.document_id(docs[6])
+    store.delete_documents([target])
+    assert store.lexical_index.get(target) is None
+    assert "dcpr/rule_33_7.txt" not in [r["metadata"]["source"] for r in store.query("Rule 33(7)", limit=3)]
+
+    reloaded = BM25Index(path=str(tmp_path / "bm25"))
+    assert len(reloaded) == 29
+    assert reloaded.search("33(12)", top_k=1)[0][0] == store.document_id(docs[11])
+
+def test_flush_appends_and_merges_other_writers(tmp_path):
+    path = str(tmp_path / "bm25")
+    api, updater = BM25Index(path=path, compact_min_entries=10), BM25Index(path=path, compact_min_entries=10)
+    api.add(["a"], ["Rule 33(7) parking"], [{}])
+    api.flush()
+    log = os.path.join(path, f"log.{api._epoch}.jsonl")
+    snapshot = os.path.join(path, f"snapshot.{api._epoch}.json")
+    snapshot_size = os.path.getsize(snapshot)
+
+    # A second process flushing its own change keeps the first one's instead of overwriting it
+    updater.add(["b"], ["Rule 34 fire exits"], [{}])
+    updater.flush()
+    api.add(["c"], ["Rule 35 ramps"], [{}])
+    api.remove(["b"])
+    api.flush()
+    # Only the changes are written: the snapshot is untouched and the log holds one line per change
+    assert os.path.getsize(snapshot) == snapshot_size
+    with open(log) as f:
+        assert len(f.readlines()) == 3
+    assert set(BM25Index(path=path)._docs) == {"a", "c"}
+    assert updater.refresh() == 2 and set(updater._docs) == {"a", "c"}
+
+    # Past compact_min_entries the log is folded into a new snapshot; readers reload from it
+    api.add([f"r{i}" for i in range(20)], [f"Rule {i} setbacks" for i in range(20)], [{} for _ in range(20)])
+    api.flush()
+    assert not os.path.exists(log) and not os.path.exists(snapshot)
+    updater.refresh()
+    assert len(updater) == len(api) == 22
+    assert updater.search("setbacks 7", top_k=1)[0][0] == "r7"
+
+def test_lexical_search_latency():
+    index = BM25Index(path=None)
+    words = "parking setback fire exit staircase height zone plot road width floor area ratio".split()
+    rng = np.random.default_rng(0)
+    index.add([f"c{i}" for i in range(5000)],
+              [f"Rule {i % 97}({i % 13}) " + " ".join(rng.choice(words, 40)) for i in range(5000)],
+              [{} for _ in range(5000)])
+    start = time.perf_counter()
+    for _ in range(100):
+        index.search("Rule 42(5) fire exit", top_k=20)
+    per_query = (time.perf_counter() - start) / 100
+    logger.info(f"BM25 search over 5000 chunks: {per_query * 1e6:.0f}µs")
+    assert per_query < 0.05
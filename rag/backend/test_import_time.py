@@ -0,0 +1,56 @@
+import os
+import sys
+import json
+import subprocess
+import logging
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Backend entry points (the API servers app and main) and the modules every entry point imports
+ENTRY_MODULES = ["app", "main", "document_processor", "dataset_processor", "rag_service", "query_documents"]
+
+# The API servers build a VectorStore at import; the local backend needs no credentials
+IMPORT_ENV = {"VECTOR_BACKEND": "local", "OPENAI_API_KEY": "test"}
+
+# Cloud SDKs that must only be imported once a matching cloud_config is used
+CLOUD_SDK_MODULES = ["boto3", "google.cloud.storage", "azure.storage.blob"]
+
+# Cold-start budget in seconds; override for slow CI machines
+IMPORT_TIME_BUDGET = float(os.getenv("IMPORT_TIME_BUDGET", "5.0"))
+
+def _import_in_fresh_interpreter(module: str):
+    """Import module in a new interpreter; return (seconds, cloud SDKs that got loaded)"""
+    code = (
+        "import sys, time, json\n"
+        "start = time.perf_counter()\n"
+        f"import {module}\n"
+        "elapsed = time.perf_counter() - start\n"
+        f"loaded = [m for m in {CLOUD_SDK_MODULES!r} if m in sys.modules]\n"
+        "print(json.dumps([elapsed, loaded]))\n"
+    )
+    result = subprocess.run(
+        [sys.executable, "-c", code],
+        cwd=BACKEND_DIR,
+        env={**IMPORT_ENV, **os.environ},
+        capture_output=True,
+        text=True,
+        check=True
+    )
+    elapsed, loaded = json.loads(result.stdout.strip().splitlines()[-1])
+    return elapsed, loaded
+
+def test_cloud_sdks_not_imported_at_startup():
+    """Entry modules must not pull in cloud SDKs without a cloud_config"""
+    for module in ENTRY_MODULES:
+        _, loaded = _import_in_fresh_interpreter(module)
+        assert not loaded, f"{module} imported cloud SDKs at startup: {loaded}"
+
+def test_import_time_budget():
+    """Each entry module imports within the cold-start budget"""
+    for module in ENTRY_MODULES:
+        elapsed, _ = _import_in_fresh_interpreter(module)
+        logger.info(f"import {module}: {elapsed:.3f}s")
+        assert elapsed < IMPORT_TIME_BUDGET, f"import {module} took {elapsed:.2f}s (budget {IMPORT_TIME_BUDGET}s)"
@@ -0,0 +1,73 @@
+import os
+import time
+import threading
+import logging
+import pytest
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+DIMENSION = 32
+
+@pytest.fixture
+def pipeline_processor(make_store, make_processor):
+    """Factory for a processor with two parser processes; keyword arguments go to DatasetProcessor"""
+    def make(**kwargs):
+        store = make_store(DIMENSION)
+        store.hybrid_search = False
+        return make_processor(store, parse_workers=2, **kwargs)
+    return make
+
+def _write_files(directory: str, count: int, words: int = 20):
+    paths = []
+    for i in range(count):
+        path = os.path.join(directory, f"note_{i:02d}.txt")
+        with open(path, "w") as f:
+            f.write(" ".join(f"clause{i}_{w}" for w in range(words)))
+        paths.append(path)
+    return paths
+
+def test_index_files_reports_chunks_in_document_order(pipeline_processor, tmp_path):
+    processor = pipeline_processor(embed_workers=3)
+    paths = _write_files(str(tmp_path), 3, words=1500)
+
+    chunk_ids = processor.index_files(paths, batch_size=1)
+    assert set(chunk_ids) == set(paths)
+    store = processor.vector_store
+    for path in paths:
+        ids = chunk_ids[path]
+        assert len(ids) > 3
+        # Three embed threads finish batches out of order; the result is still in chunk order
+        # Chunk IDs are "<source digest>_<chunk index>_<content hash>"
+        indexes = [int(id_.split("_")[1]) for id_ in ids]
+        assert indexes == sorted(indexes) == list(range(len(ids)))
+        assert store.existing_ids(ids) == set(ids)
+
+def test_slow_upserts_hold_back_embedding(pipeline_processor, tmp_path):
+    processor = pipeline_processor(embed_workers=1, queue_size=2)
+    store = processor.vector_store
+    paths = _write_files(str(tmp_path), 40)
+
+    release = threading.Event()
+    add_documents = store.add_documents
+
+    def blocked_add_documents(docs, **kwargs):
+        release.wait()
+        return add_documents(docs, **kwargs)
+
+    store.add_documents = blocked_add_documents
+    result = {}
+    worker = threading.Thread(target=lambda: result.update(processor.index_files(paths, batch_size=2)))
+    worker.start()
+    try:
+        # Parser processes take a moment to spawn; then give the stages time to run ahead
+        deadline = time.time() + 60
+        while store.embedder.embedded == 0 and time.time() < deadline:
+            time.sleep(0.1)
+        time.sleep(1)
+        # One batch being upserted, two queued, one waiting to be queued: the embed stage stops there
+        assert 0 < store.embedder.embedded <= 4 * 2, store.embedder.embedded
+    finally:
+        release.set()
+        worker.join()
+    assert store.embedder.embedded == 40 and set(result) == set(paths)
@@ -0,0 +1,148 @@
+import os
+import json
+import logging
+import numpy as np
+
+from local_index import LocalVectorIndex
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+DIMENSION = 16
+
+def _clustered(n: int, clusters: int = 20, seed: int = 0) -> np.ndarray:
+    # Points around a few directions, the shape IVF partitioning is meant for
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(clusters, DIMENSION))
+    return centers[rng.integers(0, clusters, size=n)] + 0.3 * rng.normal(size=(n, DIMENSION))
+
+def _records(path: str):
+    with open(os.path.join(path, "records.json"), "r") as f:
+        return json.load(f)
+
+def test_ivf_matches_exact_search():
+    vectors = _clustered(3000)
+    exact = LocalVectorIndex(dimension=DIMENSION, path=None)
+    ivf = LocalVectorIndex(dimension=DIMENSION, path=None, ivf_min_size=1000, nprobe=8)
+    items = [(f"v{i}", v.tolist(), {"shard": i % 4}) for i, v in enumerate(vectors)]
+    exact.upsert(items)
+    ivf.upsert(items)
+
+    queries = _clustered(50, seed=1)
+    recall = []
+    for q in queries:
+        truth = {m.id for m in exact.query(q.tolist(), top_k=10).matches}
+        found = {m.id for m in ivf.query(q.tolist(), top_k=10).matches}
+        recall.append(len(truth & found) / 10)
+    assert ivf._centroids is not None
+    assert np.mean(recall) >= 0.9, np.mean(recall)
+
+    # Filters still apply, and batch queries agree with single ones
+    matches = ivf.query(queries[0].tolist(), top_k=5, filter={"shard": {"$eq": 2}}).matches
+    assert len(matches) == 5 and all(m.metadata["shard"] == 2 for m in matches)
+    batch = ivf.query_many([q.tolist() for q in queries[:3]], top_k=5)
+    assert [[m.id for m in r.matches] for r in batch] == \
+        [[m.id for m in ivf.query(q.tolist(), top_k=5).matches] for q in queries[:3]]
+
+    # A vector upserted after clustering is assigned a cell and can be found
+    ivf.upsert([("late", queries[0].tolist(), {"shard": 0})])
+    assert ivf.query(queries[0].tolist(), top_k=1).matches[0].id == "late"
+
+def test_persistence_round_trip_appends(tmp_path):
+    path = str(tmp_path)
+    rng = np.random.default_rng(0)
+    index = LocalVectorIndex(dimension=DIMENSION, path=path)
+    index.upsert([(f"v{i}", rng.normal(size=DIMENSION).tolist(), {"n": i}) for i in range(50)])
+    index.flush()
+    snapshot = _records(path)
+    assert len(snapshot["ids"]) == 50 and not os.path.exists(os.path.join(path, "vectors.npy"))
+
+    # Small changes are appended to the record log; records.json is left alone
+    index.upsert([("new", [1.0] + [0.0] * (DIMENSION - 1), {"n": -1})])
+    index.delete(ids=["v3"])
+    index.update("v7", set_metadata={"tag": "x"})
+    index.flush()
+    assert _records(path) == snapshot
+    log_path = os.path.join(path, f"records.{snapshot['epoch']}.log")
+    assert os.path.exists(log_path)
+
+    # Only the dirty rows are rewritten in vectors.f32
+    with open(os.path.join(path, "vectors.f32"), "rb") as f:
+        before = f.read()
+    index.update("v10", values=[0.0, 1.0] + [0.0] * (DIMENSION - 2))
+    index.flush()
+    with open(os.path.join(path, "vectors.f32"), "rb") as f:
+        after = f.read()
+    row_bytes = DIMENSION * 4
+    changed = {i // row_bytes for i in range(len(before)) if before[i] != after[i]}
+    assert changed == {index._rows["v10"]}
+
+    reopened = LocalVectorIndex(dimension=DIMENSION, path=path)
+    assert reopened.describe_index_stats().total_vector_count == 50
+    assert reopened.fetch(["v3"]).vectors == {}
+    assert reopened.fetch(["v7"]).vectors["v7"].metadata == {"n": 7, "tag": "x"}
+    assert reopened.query([1.0] + [0.0] * (DIMENSION - 1), top_k=1).matches[0].id == "new"
+    assert reopened.query([0.0, 1.0] + [0.0] * (DIMENSION - 2), top_k=1).matches[0].id == "v10"
+    assert reopened.query([0.0, 1.0] + [0.0] * (DIMENSION - 2), top_k=1, filter={"tag": "x"}).matches[0].id == "v7"
+
+    # A read-only reader sees the same records by replaying the log
+    reader = LocalVectorIndex(dimension=DIMENSION, path=path, read_only=True)
+    assert sorted(reader._ids) == sorted(reopened._ids)
+
+def test_log_is_folded_into_records(tmp_path):
+    path = str(tmp_path)
+    index = LocalVectorIndex(dimension=DIMENSION, path=path)
+    index.upsert([(f"v{i}", np.eye(DIMENSION)[i % DIMENSION].tolist(), {"n": i}) for i in range(20)])
+    index.flush()
+    epoch = _records(path)["epoch"]
+    # Log entries beyond max(1000, size) trigger a new snapshot under a new epoch
+    for i in range(1001):
+        index.update(f"v{i % 20}", set_metadata={"n": i})
+        index.flush()
+    records = _records(path)
+    assert records["epoch"] != epoch and not os.path.exists(os.path.join(path, f"records.{epoch}.log"))
+
+    index.delete(delete_all=True)
+    index.flush()
+    assert LocalVectorIndex(dimension=DIMENSION, path=path).describe_index_stats().total_vector_count == 0
+
+def test_two_writers_keep_each_others_rows(tmp_path):
+    for quantization in (None, "int8"):
+        path = str(tmp_path / str(quantization))
+        basis = np.eye(DIMENSION)
+        a = LocalVectorIndex(dimension=DIMENSION, path=path, quantization=quantization)
+        a.upsert([("a1", basis[0], {"by": "a"})])
+        a.flush()
+        b = LocalVectorIndex(dimension=DIMENSION, path=path, quantization=quantization)
+        b.upsert([("b1", basis[1], {"by": "b"})])
+        b.flush()
+
+        # Each writer's next flush lands on top of the other's, not over it
+        a.upsert([("a2", basis[2], {"by": "a"})])
+        a.flush()
+        b.upsert([("b2", basis[3], {"by": "b"})])
+        b.delete(ids=["a1"])
+        b.flush()
+        a.update("b1", set_metadata={"seen": True})
+        a.flush()
+
+        reopened = LocalVectorIndex(dimension=DIMENSION, path=path)
+        assert sorted(reopened._ids) == ["a2", "b1", "b2"], (quantization, reopened._ids)
+        for i, id_ in ((1, "b1"), (2, "a2"), (3, "b2")):
+            assert reopened.query(basis[i].tolist(), top_k=1).matches[0].id == id_
+        assert reopened.fetch(["b1"]).vectors["b1"].metadata == {"by": "b", "seen": True}
+        # The writer that merged also serves the merged index
+        assert sorted(a._ids) == ["a2", "b1", "b2"]
+
+def test_legacy_npy_directory_is_converted(tmp_path):
+    path = str(tmp_path)
+    vectors = np.eye(DIMENSION, dtype=np.float32)[:4]
+    np.save(os.path.join(path, "vectors.npy"), vectors)
+    with open(os.path.join(path, "records.json"), "w") as f:
+        json.dump({"ids": ["a", "b", "c", "d"], "metadata": [{}, {}, {}, {"k": 1}]}, f)
+
+    index = LocalVectorIndex(dimension=DIMENSION, path=path)
+    index.flush()
+    assert not os.path.exists(os.path.join(path, "vectors.npy")) and "epoch" in _records(path)
+    reopened = LocalVectorIndex(dimension=DIMENSION, path=path)
+    assert reopened.query(vectors[3].tolist(), top_k=1).matches[0].id == "d"
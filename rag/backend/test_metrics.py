@@ -0,0 +1,98 @@
+import os
+import time
+import logging
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from metrics import Registry, Counter, Histogram, RequestMetricsMiddleware, STAGE_SECONDS, API_CALLS, REQUEST_SECONDS
+from profiler import RequestProfiler
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+DIMENSION = 16
+
+def test_prometheus_text_format():
+    registry = Registry()
+    calls = registry.register(Counter("calls_total", "Calls", ("service",)))
+    latency = registry.register(Histogram("latency_seconds", "Latency", ("stage",), buckets=(0.1, 1.0)))
+    calls.inc(service="openai")
+    calls.inc(2, service="openai")
+    latency.observe(0.05, stage="embed")
+    latency.observe(0.5, stage="embed")
+    registry.register_collector(lambda: [("hits_total", "counter", "Hits", [({"cache": 'q"1'}, 3)])])
+
+    lines = registry.render().splitlines()
+    assert "# TYPE calls_total counter" in lines
+    assert 'calls_total{service="openai"} 3' in lines
+    assert 'latency_seconds_bucket{stage="embed",le="0.1"} 1' in lines
+    assert 'latency_seconds_bucket{stage="embed",le="1"} 2' in lines
+    assert 'latency_seconds_bucket{stage="embed",le="+Inf"} 2' in lines
+    assert 'latency_seconds_sum{stage="embed"} 0.55' in lines
+    assert 'latency_seconds_count{stage="embed"} 2' in lines
+    assert 'hits_total{cache="q\\"1"} 3' in lines
+
+def test_query_records_stage_spans_and_index_calls(make_store):
+    store = make_store(DIMENSION, chunk_store=True)
+    store.add_documents([{"content": "Fire exits must be 1.5 m wide", "metadata": {"source": "fire.txt"},
+                          "embedding": store.embedder.get_embedding("Fire exits must be 1.5 m wide")}])
+
+    stages = ("query_embed", "query_index", "query_resolve", "query_fuse")
+    before = {stage: STAGE_SECONDS.count(stage=stage) for stage in stages}
+    queries = API_CALLS.value(service="local", operation="query")
+    assert store.query("fire exits", limit=1)[0]["metadata"]["source"] == "fire.txt"
+    assert all(STAGE_SECONDS.count(stage=stage) == before[stage] + 1 for stage in stages)
+    assert API_CALLS.value(service="local", operation="query") == queries + 1
+
+    # A cached repeat skips every stage
+    store.query("fire exits", limit=1)
+    assert STAGE_SECONDS.count(stage="query_embed") == before["query_embed"] + 1
+
+def _slow_handler_work():
+    time.sleep(0.3)
+
+def test_slow_requests_leave_folded_stacks(tmp_path):
+    profile_dir = str(tmp_path)
+    api = FastAPI()
+
+    @api.get("/slow")
+    def slow():
+        _slow_handler_work()
+        return {"ok": True}
+
+    @api.get("/fast")
+    def fast():
+        return {"ok": True}
+
+    api.add_middleware(RequestMetricsMiddleware, paths=["/slow", "/fast"],
+                       profiler=RequestProfiler(mode="header", slow_ms=200, directory=profile_dir))
+    client = TestClient(api)
+
+    count = REQUEST_SECONDS.count(method="GET", path="/slow", status="200")
+    assert client.get("/slow").status_code == 200
+    assert REQUEST_SECONDS.count(method="GET", path="/slow", status="200") == count + 1
+    # Without the header nothing is sampled; fast requests are sampled but not kept
+    assert os.listdir(profile_dir) == []
+    client.get("/fast", headers={"X-Profile": "1"})
+    assert os.listdir(profile_dir) == []
+
+    client.get("/slow", headers={"X-Profile": "1"})
+    dumps = os.listdir(profile_dir)
+    assert len(dumps) == 1 and dumps[0].endswith(".folded")
+    with open(os.path.join(profile_dir, dumps[0])) as f:
+        lines = f.read().splitlines()
+    # Collapsed format: "frame;frame;frame count", the handler's sleep among the stacks
+    assert all(line.rsplit(" ", 1)[1].isdigit() for line in lines)
+    assert any("test_metrics:_slow_handler_work" in line for line in lines)
+
+    client.get("/missing")
+    assert REQUEST_SECONDS.count(method="GET", path="other", status="404") == 1
+
+def test_metrics_endpoint():
+    import app as api
+    client = TestClient(api.app)
+    body = client.get("/metrics").text
+    assert client.get("/metrics").headers["content-type"].startswith("text/plain; version=0.0.4")
+    assert "# TYPE rag_stage_seconds histogram" in body
+    assert 'rag_cache_requests_total{cache="query_result",result="hit"}' in body
+    assert 'rag_request_seconds_count{method="GET",path="/metrics",status="200"}' in client.get("/metrics").text
@@ -0,0 +1,193 @@
+import io
+import os
+import time
+import logging
+import multiprocessing
+import numpy as np
+import pytest
+from pypdf import PdfWriter
+from pypdf.generic import DecodedStreamObject, DictionaryObject, NameObject
+
+from embedding_cache import EmbeddingCache
+from local_index import LocalVectorIndex
+import index_writer
+from index_writer import IndexWriter, enqueue_upload, job_status
+from fake_services import hashed_embedding
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+DIMENSION = 16
+
+def _docs(texts):
+    return [{"content": t, "metadata": {"source": f"doc{i}.txt"}, "embedding": hashed_embedding(t, DIMENSION)}
+            for i, t in enumerate(texts)]
+
+def test_read_only_index_is_mapped(tmp_path):
+    path = str(tmp_path)
+    writer = LocalVectorIndex(dimension=DIMENSION, path=path)
+    writer.upsert([(f"v{i}", np.random.default_rng(i).normal(size=DIMENSION)) for i in range(100)])
+    writer.flush()
+
+    reader = LocalVectorIndex(dimension=DIMENSION, path=path, read_only=True)
+    assert isinstance(reader._vectors, np.memmap)
+    assert reader.query(writer.fetch(["v7"]).vectors["v7"].values, top_k=1).matches[0].id == "v7"
+    with pytest.raises(RuntimeError):
+        reader.upsert([("x", np.ones(DIMENSION))])
+
+    # Rows are rewritten in place, so the reader's mapping stays valid; refresh catches up its IDs
+    writer.delete(ids=[f"v{i}" for i in range(50)])
+    writer.flush()
+    assert reader.query(np.ones(DIMENSION), top_k=100).matches[-1].id.startswith("v")
+    assert reader.refresh() == 50
+    assert reader.describe_index_stats().total_vector_count == 50 and reader.fetch(["v7"]).vectors == {}
+
+def test_quantized_reader_follows_growing_file(tmp_path):
+    path = str(tmp_path)
+    rng = np.random.default_rng(0)
+    writer = LocalVectorIndex(dimension=DIMENSION, path=path, quantization="int8")
+    writer.upsert([(f"v{i}", rng.normal(size=DIMENSION), {"batch": 0}) for i in range(500)])
+    writer.flush()
+    reader = LocalVectorIndex(dimension=DIMENSION, path=path, quantization="int8", read_only=True)
+    size_before = os.path.getsize(os.path.join(path, "vectors.f32"))
+    records_before = os.stat(os.path.join(path, "records.json")).st_ino
+
+    # Past the first 1024 rows the writer grows vectors.f32 in place
+    vectors = rng.normal(size=(1500, DIMENSION))
+    writer.upsert([(f"w{i}", v, {"batch": 1}) for i, v in enumerate(vectors)])
+    writer.delete(ids=["v0", "v1"])
+    writer.update("v2", set_metadata={"batch": 2})
+    writer.flush()
+    assert os.path.getsize(os.path.join(path, "vectors.f32")) > size_before
+    assert reader.query(vectors[5].tolist(), top_k=1).matches[0].id != "w5"
+
+    # The reader applies the appended records without re-reading records.json
+    assert os.stat(os.path.join(path, "records.json")).st_ino == records_before
+    reader.refresh()
+    assert reader.describe_index_stats().total_vector_count == 1998
+    assert all(reader.query(vectors[i].tolist(), top_k=1).matches[0].id == f"w{i}" for i in (5, 700, 1499))
+    assert reader.fetch(["v0", "v1"]).vectors == {}
+    assert [m.id for m in reader.query(np.ones(DIMENSION), top_k=3, filter={"batch": 2}).matches] == ["v2"]
+    assert len(reader.query(np.ones(DIMENSION), top_k=2000, filter={"batch": 1}).matches) == 1500
+    assert reader.refresh() == 0
+
+def test_reader_remaps_after_writer_publishes(make_store):
+    writer = make_store(DIMENSION, chunk_store=True)
+    writer.add_documents(_docs(["Fire exits must be 1.5 m wide"]))
+    reader = make_store(DIMENSION, read_only=True, chunk_store=True)
+    assert reader.query("Fire exits must be 1.5 m wide", limit=1)[0]["content"] == "Fire exits must be 1.5 m wide"
+    with pytest.raises(RuntimeError):
+        reader.add_documents(_docs(["not allowed"]))
+
+    index = reader.index
+    writer.add_documents(_docs(["Parking ramps need a 1:8 slope"]))
+    # The next query notices the new generation and remaps in the background
+    deadline = time.monotonic() + 5
+    while time.monotonic() < deadline:
+        results = reader.query("Parking ramps need a 1:8 slope", limit=1)
+        if results and results[0]["content"] == "Parking ramps need a 1:8 slope":
+            break
+        time.sleep(0.05)
+    else:
+        raise AssertionError("reader never saw the writer's update")
+    # Caught up in place rather than reloaded
+    assert reader.index is index
+
+def test_writers_remap_after_each_other(make_store):
+    api = make_store(DIMENSION, chunk_store=True)
+    api.add_documents(_docs(["Fire exits must be 1.5 m wide"]))
+    updater = make_store(DIMENSION, chunk_store=True)
+    updater.add_documents(_docs(["Parking ramps need a 1:8 slope", "Stairs need handrails"])[1:])
+    api.add_documents(_docs(["Lifts serve every floor"]))
+
+    # A writable store catches up with the other writer too, keeping its own additions
+    deadline = time.monotonic() + 5
+    while time.monotonic() < deadline:
+        results = api.query("Stairs need handrails", limit=1)
+        if results and results[0]["content"] == "Stairs need handrails":
+            break
+        time.sleep(0.05)
+    else:
+        raise AssertionError("the writer never saw the other writer's update")
+    assert api.index.describe_index_stats().total_vector_count == 3
+    assert api.query("Lifts serve every floor", limit=1)[0]["content"] == "Lifts serve every floor"
+
+def test_writer_indexes_spooled_uploads(make_store, tmp_path):
+    spool = str(tmp_path / "uploads")
+    writer = IndexWriter(vector_store=make_store(DIMENSION, chunk_store=True), spool_dir=spool)
+    job_id = enqueue_upload("stairs.txt", b"Every staircase shall have a handrail on both sides.", spool_dir=spool)
+    assert writer.pending_jobs() == [job_id]
+
+    assert writer.process_pending() == 1
+    assert writer.pending_jobs() == []
+    assert job_status(job_id, spool)["status"] == "done"
+
+    reader = make_store(DIMENSION, read_only=True, chunk_store=True)
+    result = reader.query("handrail staircase", limit=1)[0]
+    assert result["metadata"]["source"] == "stairs.txt" and "handrail" in result["content"]
+
+    writer._acquire()
+    with pytest.raises(RuntimeError):
+        IndexWriter(vector_store=writer.vector_store, spool_dir=spool)._acquire()
+
+def _pdf(pages: int) -> bytes:
+    # A text-only PDF with Helvetica, enough for pypdf to extract each page's text
+    writer = PdfWriter()
+    font = writer._add_object(DictionaryObject({NameObject("/Type"): NameObject("/Font"),
+                                                NameObject("/Subtype"): NameObject("/Type1"),
+                                                NameObject("/BaseFont"): NameObject("/Helvetica")}))
+    for p in range(pages):
+        page = writer.add_blank_page(612, 792)
+        page[NameObject("/Resources")] = DictionaryObject({NameObject("/Font"): DictionaryObject({NameObject("/F1"): font})})
+        lines = " ".join(f"T* (Clause {p}.{c}: every staircase on floor {c} shall have a handrail on both sides.) Tj"
+                         for c in range(40))
+        content = DecodedStreamObject()
+        content.set_data(f"BT /F1 10 Tf 12 TL 36 760 Td {lines} ET".encode())
+        page[NameObject("/Contents")] = writer._add_object(content)
+    data = io.BytesIO()
+    writer.write(data)
+    return data.getvalue()
+
+def test_upload_progress_counts_pages_and_chunks(make_store, monkeypatch):
+    monkeypatch.setattr(index_writer, "EMBED_BATCH_SIZE", 2)
+    writer = IndexWriter(vector_store=make_store(DIMENSION, chunk_store=True))
+    updates = []
+    chunks = writer.index_upload("codes/stairs.pdf", _pdf(6), progress=lambda *update: updates.append(update))
+
+    # PDF pages are counted while embedding: the page total is known before the chunk total
+    embedding = [(done, total, unit) for stage, done, total, unit in updates if stage == "embedding"]
+    assert updates[0] == ("parsing", 0, 6, "pages") and len(embedding) > 2
+    assert all(total == 6 and unit == "pages" for _, total, unit in embedding)
+    assert [done for done, _, _ in embedding] == sorted(done for done, _, _ in embedding)
+    assert embedding[0][0] < 6 and embedding[-1][0] == 6
+    assert updates[-1] == ("indexing", 0, chunks, "chunks")
+
+    # Other files are chunked in one go, so the chunk total is there from the first batch
+    updates.clear()
+    text = "\n\n".join(f"Section {s}. " + "Ramps shall have a slope of at most 1 in 12. " * 40 for s in range(8))
+    chunks = writer.index_upload("codes/ramps.txt", text.encode(), progress=lambda *update: updates.append(update))
+    assert updates[0] == ("parsing", 0, None, "chunks") and chunks > 2
+    assert [u for u in updates if u[0] == "embedding"] == \
+        [("embedding", min(n, chunks), chunks, "chunks") for n in range(2, chunks + 2, 2)]
+
+def _append_embeddings(cache_dir: str, prefix: str):
+    cache = EmbeddingCache(cache_dir=cache_dir, dimensions=DIMENSION)
+    for i in range(50):
+        cache.put_many([f"{prefix}{i}"], "model", [[float(i)] * DIMENSION])
+
+def test_embedding_cache_shared_between_processes(tmp_path):
+    cache_dir = str(tmp_path)
+    reader = EmbeddingCache(cache_dir=cache_dir, dimensions=DIMENSION)
+    context = multiprocessing.get_context("spawn")
+    workers = [context.Process(target=_append_embeddings, args=(cache_dir, p)) for p in ("a", "b")]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+
+    # Entries written concurrently by other processes are found without a restart
+    assert reader.get("a49", "model") == [49.0] * DIMENSION
+    assert reader.get("b7", "model") == [7.0] * DIMENSION
+    fresh = EmbeddingCache(cache_dir=cache_dir, dimensions=DIMENSION)
+    assert fresh.stats()["disk_entries"] == 100
+    assert all(fresh.get(f"{p}{i}", "model") == [float(i)] * DIMENSION for p in "ab" for i in range(50))
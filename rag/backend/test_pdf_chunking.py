@@ -0,0 +1,60 @@
+import re
+import logging
+
+from langchain.schema import Document
+from document_processor import DocumentProcessor
+from token_chunker import TokenChunker
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+def _pages(count: int = 4, words: int = 45):
+    # Every word is unique and names its page, e.g. "p2w17."
+    return [" ".join(f"p{p}w{w}." for w in range(words)) for p in range(count)]
+
+def _processor(max_chunks=None) -> DocumentProcessor:
+    processor = DocumentProcessor()
+    processor.max_chunks = max_chunks
+    processor.text_splitter = TokenChunker(chunk_tokens=40, overlap_tokens=8, max_chunks=max_chunks)
+    return processor
+
+def _chunks(processor: DocumentProcessor, pages):
+    stream = (Document(page_content=text, metadata={"page": i}) for i, text in enumerate(pages))
+    return list(processor._iter_page_chunks(stream, "codes/fire.pdf"))
+
+def test_chunks_span_pages_and_name_their_first_page():
+    pages = _pages()
+    chunks = _chunks(_processor(), pages)
+    assert [c.metadata["chunk_index"] for c in chunks] == list(range(len(chunks)))
+
+    full = "\n".join(pages)
+    page_starts = [full.index(f"p{p}w0.") for p in range(len(pages))]
+    spanning = 0
+    for chunk in chunks:
+        start = full.find(chunk.page_content)
+        assert start >= 0, "a chunk's text must be contiguous source text"
+        # Attributed to the page its first character came from, numbered from 1
+        assert chunk.metadata["page_number"] == max(p for p, s in enumerate(page_starts) if s <= start) + 1
+        if len(set(re.findall(r"p(\d+)w", chunk.page_content))) > 1:
+            spanning += 1
+    # A page's tail is chunked together with the next page instead of ending in a stub
+    assert spanning > 0
+    # Every word on every page ends up in some chunk
+    indexed = set(re.findall(r"p\d+w\d+", " ".join(c.page_content for c in chunks)))
+    assert indexed == set(re.findall(r"p\d+w\d+", full))
+
+def test_streaming_is_lazy_and_capped():
+    consumed = []
+
+    def pages():
+        for i, text in enumerate(_pages(count=50)):
+            consumed.append(i)
+            yield Document(page_content=text, metadata={"page": i})
+
+    stream = _processor()._iter_page_chunks(pages(), "codes/fire.pdf")
+    next(stream)
+    # The first chunk needs the first page and a look at the next one, not the whole document
+    assert len(consumed) <= 2
+
+    capped = list(_processor(max_chunks=5)._iter_page_chunks(pages(), "codes/fire.pdf"))
+    assert len(capped) == 5 and capped[-1].metadata["chunk_index"] == 4
@@ -0,0 +1,46 @@
+import logging
+import numpy as np
+from local_index import LocalVectorIndex
+from benchmark_quantization import make_corpus, build, run
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+def test_int8_recall_and_memory():
+    """Quantized first pass plus exact re-rank matches the exact top-k"""
+    vectors, queries = make_corpus(5000, 256, 50)
+    exact_stats, truth = run("exact", build(vectors), queries, 10)
+    quantized = build(vectors, quantization="int8")
+    stats, _ = run("int8", quantized, queries, 10, truth)
+
+    assert stats["recall@10"] >= 0.98, stats
+    assert build(vectors).memory_bytes() == 4 * quantized.memory_bytes()
+
+def test_scores_are_exact_after_rerank():
+    vectors, queries = make_corpus(2000, 128, 20)
+    exact, quantized = build(vectors), build(vectors, quantization="int8")
+    for q in queries[:10]:
+        a = exact.query(q, top_k=5).matches
+        b = quantized.query(q, top_k=5).matches
+        assert [m.id for m in a] == [m.id for m in b]
+        assert np.allclose([m.score for m in a], [m.score for m in b], atol=1e-6)
+
+def test_quantized_index_persists_and_deletes(tmp_path):
+    path = str(tmp_path)
+    vectors, queries = make_corpus(3000, 64, 10)
+    index = LocalVectorIndex(dimension=64, path=path, quantization="int8")
+    index.upsert([(f"v{i}", v, {"i": i}) for i, v in enumerate(vectors)])
+    index.delete(ids=["v0", "v1"])
+    index.flush()
+
+    reloaded = LocalVectorIndex(dimension=64, path=path, quantization="int8")
+    assert reloaded.describe_index_stats().total_vector_count == 2998
+    assert reloaded.fetch(["v0"]).vectors == {}
+    assert np.allclose(reloaded.fetch(["v7"]).vectors["v7"].values,
+                       vectors[7] / np.linalg.norm(vectors[7]), atol=1e-6)
+    assert [m.id for m in reloaded.query(queries[0], top_k=3).matches] == \
+        [m.id for m in index.query(queries[0], top_k=3).matches]
+
+    # The same directory can be reopened unquantized
+    exact = LocalVectorIndex(dimension=64, path=path)
+    assert exact.query(queries[0], top_k=1).matches[0].id == index.query(queries[0], top_k=1).matches[0].id
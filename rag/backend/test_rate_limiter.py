@@ -0,0 +1,153 @@
+import os
+import sys
+import time
+import uuid
+import logging
+
+from types import SimpleNamespace
+from openai import OpenAI
+from rate_limiter import RateLimitScheduler, parse_duration
+from embedding_client import EmbeddingClient
+from fake_services import FakeOpenAIServer
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))
+sys.path.insert(0, os.path.join(REPO_ROOT, "scripts"))
+from embedding_generator import EmbeddingGenerator
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+def _chunks(n: int):
+    run = uuid.uuid4().hex
+    return [{"content": f"{run} chunk {i} " + "setback rule " * 16, "metadata": {"i": i}} for i in range(n)]
+
+def test_parse_duration():
+    assert parse_duration("20ms") == 0.02
+    assert parse_duration("6m0s") == 360.0
+    assert parse_duration("1.5") == 1.5
+    assert parse_duration(None) is None
+
+def test_throttled_calls_back_off_and_halve_concurrency():
+    class Throttled(Exception):
+        status_code = 429
+
+    now = [0.0]
+    sleeps = []
+
+    def sleep(seconds):
+        sleeps.append(seconds)
+        now[0] += seconds
+
+    scheduler = RateLimitScheduler(1000, 10 ** 6, period=1.0, max_concurrency=8,
+                                   base_backoff=0.1, clock=lambda: now[0], sleep=sleep)
+    attempts = []
+
+    def flaky():
+        attempts.append(1)
+        if len(attempts) < 3:
+            raise Throttled()
+        return "ok"
+
+    assert scheduler.call(flaky, tokens=10) == "ok"
+    # Halved twice (4 -> 2 -> 1), then grown by one after the success
+    assert scheduler.throttled == 2 and scheduler.concurrency == 2
+    # Only the two throttled attempts waited, with growing jittered delays
+    assert len(sleeps) == 2
+    assert 0.05 <= sleeps[0] <= 0.1 and 0.1 <= sleeps[1] <= 0.2
+
+    class Broken(Exception):
+        status_code = 500
+
+    def broken():
+        raise Broken()
+
+    try:
+        scheduler.call(broken)
+        assert False, "non-throttle errors must propagate"
+    except Broken:
+        pass
+    assert scheduler.throttled == 2
+
+class ScriptedEmbeddings:
+    """OpenAI embeddings stand-in: raises error(batch) when it returns one, else embeds by length"""
+
+    def __init__(self, error):
+        self.error = error
+        self.calls = []
+
+    def create(self, model, input):
+        self.calls.append(list(input))
+        error = self.error(input)
+        if error is not None:
+            raise error
+        return SimpleNamespace(data=[SimpleNamespace(index=i, embedding=[float(len(t))]) for i, t in enumerate(input)])
+
+def _scheduler(**kwargs) -> RateLimitScheduler:
+    return RateLimitScheduler(1000, 10 ** 6, period=1.0, base_backoff=0.001, sleep=lambda s: None, **kwargs)
+
+def test_throttles_are_retried_by_the_scheduler_only():
+    class Throttled(Exception):
+        status_code = 429
+
+    embeddings = ScriptedEmbeddings(lambda batch: Throttled())
+    client = EmbeddingClient(SimpleNamespace(embeddings=embeddings), max_retries=3,
+                             scheduler=_scheduler(max_throttle_retries=4))
+    try:
+        client.get_embeddings(["a", "b"])
+        assert False, "an exhausted throttle must propagate"
+    except Throttled:
+        pass
+    # 4 scheduler attempts, not 4 for each of the client's 3
+    assert len(embeddings.calls) == 4
+
+def test_failed_batch_falls_back_to_single_chunks():
+    class BadInput(Exception):
+        status_code = 400
+
+    embeddings = ScriptedEmbeddings(lambda batch: BadInput() if len(batch) > 1 and "poison" in batch else None)
+    generator = EmbeddingGenerator(config_path=os.path.join(REPO_ROOT, "config.yaml"), scheduler=_scheduler(),
+                                   openai_client=SimpleNamespace(embeddings=embeddings))
+    generator.embedding_client = EmbeddingClient(SimpleNamespace(embeddings=embeddings), max_retries=1)
+    chunks = [{"content": text, "metadata": {}} for text in ("ok", "poison", "fine")]
+    embedded = generator.generate_embeddings(chunks)
+    assert [c["embedding"] for c in embedded] == [[2.0], [6.0], [4.0]]
+
+    # A chunk that fails on its own raises rather than vanishing from the result
+    embeddings.error = lambda batch: BadInput() if "poison" in batch else None
+    try:
+        generator.generate_embeddings(chunks)
+        assert False, "a chunk that cannot be embedded must raise"
+    except BadInput:
+        pass
+
+def test_generator_runs_at_provider_limit():
+    """Bulk embedding tracks the server's budget closely with few 429s"""
+    requests_per_second, tokens_per_second = 20, 4000
+    server = FakeOpenAIServer(requests_per_second, tokens_per_second, period=1.0,
+                              embed=lambda text: [float(len(text)), 0.0, 1.0])
+    try:
+        # Start from an optimistic guess; the headers pull the scheduler down to the real limit
+        scheduler = RateLimitScheduler(2 * requests_per_second, 2 * tokens_per_second, period=1.0,
+                                       max_concurrency=8, base_backoff=0.05)
+        generator = EmbeddingGenerator(
+            config_path=os.path.join(REPO_ROOT, "config.yaml"),
+            scheduler=scheduler,
+            openai_client=OpenAI(api_key="test", base_url=server.base_url, max_retries=0)
+        )
+        chunks = _chunks(120)
+
+        start = time.perf_counter()
+        embedded = generator.batch_generate_embeddings(chunks, batch_size=2)
+        elapsed = time.perf_counter() - start
+
+        assert [c["metadata"]["i"] for c in embedded] == list(range(120))
+        assert all(c["embedding"][0] == float(len(c["content"])) for c in embedded)
+        assert server.served == 60
+        # 60 requests against a 20-request burst refilling at 20/s need at least 2s
+        ideal = (60 - requests_per_second) / requests_per_second
+        assert elapsed < ideal * 1.5 + 0.5, f"{elapsed:.2f}s vs ideal {ideal:.2f}s"
+        assert server.rejected <= 10, f"{server.rejected} throttled requests"
+        logger.info(f"{elapsed:.2f}s for 60 requests (ideal {ideal:.2f}s), "
+                    f"{server.rejected} throttled, {scheduler.stats()}")
+    finally:
+        server.close()
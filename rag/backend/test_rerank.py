@@ -0,0 +1,101 @@
+import time
+import asyncio
+import logging
+import pytest
+
+from fake_services import hashed_embedding
+from metrics import RERANK_FALLBACKS
+from reranker import Reranker, LexicalOverlapScorer, create_reranker
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+DIMENSION = 64
+
+DOCS = [
+    ("Exits and stairs are shown on the plan; fire alarms are on every floor.", "plan.txt"),
+    ("Fire exits must be at least 1.5 m wide and open outwards.", "exits.txt"),
+    ("Fire hose reels are installed on each floor.", "hose.txt"),
+    ("The science park schedule has three phases.", "schedule.txt"),
+]
+
+class SlowScorer:
+    """Takes longer than any budget the tests give it"""
+    inline = False
+
+    def __init__(self, delay: float):
+        self.delay = delay
+
+    def load(self):
+        pass
+
+    def score(self, query, texts, deadline):
+        time.sleep(self.delay)
+        return [float(i) for i in range(len(texts))]
+
+class BrokenScorer(SlowScorer):
+    inline = True
+
+    def score(self, query, texts, deadline):
+        raise RuntimeError("model crashed")
+
+@pytest.fixture
+def store(make_store):
+    """DOCS in a chunk-store-backed index, searched by vector alone"""
+    store = make_store(DIMENSION, chunk_store=True)
+    store.hybrid_search = False
+    store.add_documents([{"content": text, "metadata": {"source": source},
+                          "embedding": hashed_embedding(text, DIMENSION)} for text, source in DOCS])
+    return store
+
+def test_lexical_scorer_prefers_full_query_coverage():
+    texts = [text for text, _ in DOCS]
+    scores = LexicalOverlapScorer().score("how wide are fire exits", texts, deadline=time.perf_counter() + 1)
+    assert max(range(len(texts)), key=lambda i: scores[i]) == 1
+    # "fire" is in three candidates, so a chunk with only "fire" scores below one with "exits" too
+    assert scores[2] < scores[0] < scores[1]
+    assert LexicalOverlapScorer().score("the of", texts, deadline=time.perf_counter() + 1) == [0.0] * len(texts)
+
+def test_create_reranker_from_config():
+    assert create_reranker({}) is None
+    assert create_reranker({"reranker": False}) is None
+    reranker = create_reranker({"reranker": "lexical", "rerank_candidates": 12, "rerank_budget_ms": 5})
+    assert isinstance(reranker.scorer, LexicalOverlapScorer)
+    assert reranker.candidates == 12 and reranker.budget_ms == 5
+    try:
+        create_reranker({"reranker": "bert"})
+        raise AssertionError("unknown reranker accepted")
+    except ValueError:
+        pass
+
+def test_query_reranks_candidates(store):
+    vector_order = store.query("fire exits wide", limit=2)
+    assert vector_order[0]["metadata"]["source"] == "hose.txt"
+
+    store.reranker = Reranker(LexicalOverlapScorer(), candidates=4, budget_ms=1000)
+    store.result_cache.bump_generation()
+    results = store.query("fire exits wide", limit=2)
+    assert len(results) == 2 and results[0]["metadata"]["source"] == "exits.txt"
+    assert results[0]["rerank_score"] >= results[1]["rerank_score"]
+    assert "rerank_score" not in vector_order[0]
+
+    # The batch path re-ranks the same way
+    store.result_cache.bump_generation()
+    assert store.query_many(["fire exits wide"], limit=2)[0] == results
+
+def test_over_budget_or_failing_scorer_keeps_retrieval_order(store):
+    store.reranker = Reranker(SlowScorer(0.05), candidates=4, budget_ms=10)
+    expected = [r["id"] for r in store._fuse("fire exits", store._format_matches(
+        store.index.query(vector=hashed_embedding("fire exits", DIMENSION), top_k=4)), 4, None,
+        hashed_embedding("fire exits", DIMENSION))][:2]
+
+    fallbacks = RERANK_FALLBACKS.value(reason="budget")
+    results = asyncio.run(store.aquery("fire exits", limit=2))
+    assert [r["id"] for r in results] == expected and "rerank_score" not in results[0]
+    assert RERANK_FALLBACKS.value(reason="budget") == fallbacks + 1
+
+    store.reranker = Reranker(BrokenScorer(0), candidates=4, budget_ms=10)
+    store.result_cache.bump_generation()
+    errors = RERANK_FALLBACKS.value(reason="error")
+    assert [r["id"] for r in store.query("fire exits", limit=2)] == expected
+    assert RERANK_FALLBACKS.value(reason="error") == errors + 1
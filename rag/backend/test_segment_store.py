@@ -0,0 +1,133 @@
+import os
+import logging
+import numpy as np
+
+from fake_services import hashed_embedding
+from segment_store import SegmentStore
+from vector_store import VectorStore
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+DIMENSION = 16
+
+def _records(n: int, prefix: str = "c"):
+    rng = np.random.default_rng(0)
+    return [
+        {"id": f"{prefix}{i}", "content": f"Chunk {i}: fire escape width ✓", "values": rng.normal(size=DIMENSION),
+         "metadata": {"source": f"doc{i % 3}.pdf", "chunk_index": i, "tags": ["ignored"]}}
+        for i in range(n)
+    ]
+
+def test_append_get_and_supersede(tmp_path):
+    store = SegmentStore(str(tmp_path), dimension=DIMENSION)
+    records = _records(10)
+    store.append(records)
+    assert len(store) == 10 and "c3" in store
+    assert store.get("c3") == {"content": "Chunk 3: fire escape width ✓",
+                               "metadata": {"source": "doc0.pdf", "chunk_index": 3}}
+    assert np.allclose(store.get_vectors(["c3"])["c3"], records[3]["values"])
+
+    store.append([{"id": "c3", "content": "Updated", "values": np.zeros(DIMENSION), "metadata": {"source": "new.pdf"}}])
+    assert len(store) == 10
+    assert store.get("c3") == {"content": "Updated", "metadata": {"source": "new.pdf"}}
+
+    store.delete(["c4", "missing"])
+    assert len(store) == 9 and store.get("c4") is None
+
+def test_reopen_maps_without_copying(tmp_path):
+    path = str(tmp_path)
+    SegmentStore(path, dimension=DIMENSION).append(_records(100))
+
+    reopened = SegmentStore(path, dimension=DIMENSION)
+    assert isinstance(reopened._maps["vectors"], np.memmap)
+    assert len(reopened) == 100
+    assert reopened.get("c99")["content"] == "Chunk 99: fire escape width ✓"
+
+    # A reader sees rows committed by another writer once the manifest changes
+    reader = SegmentStore(path, dimension=DIMENSION)
+    SegmentStore(path, dimension=DIMENSION).append(_records(5, prefix="new"))
+    assert "new4" in reader.get_many(["new4"])
+
+    # An uncommitted tail (crashed writer) is ignored and overwritten
+    with open(reader._data_file("text.bin"), "ab") as f:
+        f.write(b"garbage")
+    reader.append(_records(1, prefix="after"))
+    assert SegmentStore(path, dimension=DIMENSION).get("after0")["content"] == "Chunk 0: fire escape width ✓"
+
+def test_compact_drops_tombstones(tmp_path):
+    path = str(tmp_path)
+    store = SegmentStore(path, dimension=DIMENSION)
+    store.append(_records(50))
+    store.delete([f"c{i}" for i in range(0, 50, 2)])
+    old_vectors = store._data_file("vectors.f32")
+    size = os.path.getsize(old_vectors)
+    reader = SegmentStore(path, dimension=DIMENSION)
+    assert len(reader) == 25
+
+    store.compact()
+    assert len(store) == 25 and store._manifest["count"] == 25
+    assert os.path.getsize(store._data_file("vectors.f32")) == size // 2
+    assert not os.path.exists(old_vectors)
+    assert store.get("c7")["metadata"]["chunk_index"] == 7
+    # A reader switches to the compacted files
+    assert reader.get_many(["c7", "c8"]).keys() == {"c7"}
+
+def test_writes_compact_automatically_and_decode_only_new_rows(tmp_path):
+    store = SegmentStore(str(tmp_path), dimension=DIMENSION, compact_ratio=0.5, compact_min_rows=10)
+    store.append(_records(20))
+    assert len(store) == 20
+    decoded = store._row_ids
+    store.append(_records(5, prefix="new"))
+    assert "new4" in store and store._row_ids is decoded and len(decoded) == 25
+
+    # 10 superseded of 35 rows stays under the ratio; 30 of 55 crosses it
+    store.append(_records(10))
+    assert store.dead_rows() == 10 and store._manifest["count"] == 35
+    store.append(_records(20))
+    assert store.dead_rows() == 0 and len(store) == store._manifest["count"] == 25
+    assert store.get("c19")["content"] == "Chunk 19: fire escape width ✓"
+
+def test_vector_store_resolves_content_locally(make_store):
+    store = make_store(DIMENSION, chunk_store=True)
+    store.hybrid_search = False
+
+    docs = [{"content": f"Clause {i} on staircase width", "metadata": {"source": f"nbc_{i}.pdf"}} for i in range(5)]
+    for doc in docs:
+        doc["embedding"] = hashed_embedding(doc["content"], DIMENSION)
+    store.add_documents(docs)
+
+    # The index holds no chunk text; it comes back from the segment store
+    stored = store.index.fetch(ids=list(store.index._ids)[:1]).vectors
+    assert all("content" not in v.metadata for v in stored.values())
+    results = store.query("Clause 2 on staircase width", limit=1)
+    assert results[0]["content"] == "Clause 2 on staircase width"
+    assert results[0]["metadata"]["source"] == "nbc_2.pdf"
+
+    store.delete_all_documents()
+    assert len(store.chunk_store) == 0
+
+def test_matches_are_resolved_without_the_chunk_store(make_store):
+    writer = make_store(DIMENSION, chunk_store=True)
+    writer.hybrid_search = False
+    doc = {"content": "Clause 9 on ramps", "metadata": {"source": "nbc_9.pdf"},
+           "embedding": hashed_embedding("Clause 9 on ramps", DIMENSION)}
+    writer.add_documents([doc])
+
+    # Off by default: another process without the segment finds the text in the BM25 index
+    reader = make_store(DIMENSION)
+    reader.hybrid_search = False
+    assert reader.chunk_store is None
+    assert reader.query("Clause 9 on ramps", limit=1)[0]["content"] == "Clause 9 on ramps"
+
+    # With the text nowhere, the match is still returned
+    reader.lexical_index.clear()
+    reader.result_cache.bump_generation()
+    result = reader.query("Clause 9 on ramps", limit=1)[0]
+    assert result["content"] == "" and result["metadata"]["source"] == "nbc_9.pdf"
+
+    # New writes keep the text in the index metadata
+    reader.add_documents([{**doc, "content": "Clause 10 on lifts", "metadata": {"source": "nbc_10.pdf"}}])
+    assert reader.index.fetch(ids=[VectorStore.document_id({**doc, "content": "Clause 10 on lifts",
+                                                            "metadata": {"source": "nbc_10.pdf"}})]
+                              ).vectors.popitem()[1].metadata["content"] == "Clause 10 on lifts"
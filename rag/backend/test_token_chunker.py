@@ -0,0 +1,56 @@
+import logging
+
+from langchain.schema import Document
+from token_chunker import TokenChunker
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+def _regulation(sections: int = 12) -> str:
+    parts = []
+    for s in range(1, sections + 1):
+        parts.append(f"Section {s}. Means of escape")
+        parts.append(" ".join(f"Exit route {s}.{c} on floor {c} shall be kept clear of storage."
+                              for c in range(1, 5)))
+        parts.append("")
+    return "\n".join(parts)
+
+def _tokens(chunker: TokenChunker, text: str) -> int:
+    return len(chunker._token_offsets(text))
+
+def test_chunks_respect_token_limits():
+    chunker = TokenChunker(chunk_tokens=100, overlap_tokens=10)
+    text = _regulation()
+    chunks = chunker.split_text(text)
+    assert len(chunks) > 3
+    # Re-tokenizing a cut-out span can merge or split one token at its edge
+    assert all(_tokens(chunker, chunk) <= chunker.chunk_tokens + 1 for chunk in chunks)
+    # Every chunk is source text, and consecutive chunks overlap
+    assert all(chunk in text for chunk in chunks)
+    for previous, chunk in zip(chunks, chunks[1:]):
+        assert chunk.split()[0] in previous.split()[-chunker.overlap_tokens - 1:]
+    # Cuts land just before a section heading whenever the window holds one
+    for chunk in chunks[:-1]:
+        assert text[text.index(chunk) + len(chunk):].lstrip().startswith("Section"), chunk[-40:]
+
+def test_max_chunks_caps_each_document():
+    chunker = TokenChunker(chunk_tokens=40, overlap_tokens=5, max_chunks=3)
+    assert len(chunker.split_text(_regulation())) == 3
+    docs = [Document(page_content=_regulation(), metadata={"source": name}) for name in ("a.txt", "b.txt")]
+    split = chunker.split_documents(docs)
+    assert [d.metadata["source"] for d in split] == ["a.txt"] * 3 + ["b.txt"] * 3
+    assert chunker.split_text("") == [] and chunker.split_text("Short clause.") == ["Short clause."]
+
+def test_chunking_is_deterministic():
+    text = _regulation()
+    first = TokenChunker(chunk_tokens=50, overlap_tokens=8).split_text(text)
+    assert TokenChunker(chunk_tokens=50, overlap_tokens=8).split_text(text) == first
+    # Chunks before an edit are unchanged, so their chunk IDs are too
+    edited = text.replace("Section 12.", "Section 12 (amended).")
+    assert TokenChunker(chunk_tokens=50, overlap_tokens=8).split_text(edited)[:3] == first[:3]
+
+    try:
+        TokenChunker(chunk_tokens=10, overlap_tokens=10)
+        assert False, "overlap must be smaller than the chunk"
+    except ValueError:
+        pass
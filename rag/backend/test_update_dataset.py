@@ -0,0 +1,48 @@
+import os
+import logging
+
+from update_dataset import update_dataset, load_manifest, manifest_path
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+DIMENSION = 32
+
+def _write(path: str, text: str):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as f:
+        f.write(text)
+
+def _ids(manifest, key):
+    return set(manifest[key]["chunk_ids"])
+
+def test_update_adds_modifies_and_deletes(make_processor, tmp_path):
+    tmp = str(tmp_path)
+    processor = make_processor(parse_workers=1, embed_workers=1)
+    metadata_dir = os.path.join(tmp, "metadata")
+    dataset = os.path.join(tmp, "dataset")
+    _write(os.path.join(dataset, "codes", "fire.txt"), "Fire exits must be at least 1.5 m wide.")
+    _write(os.path.join(dataset, "codes", "ramps.txt"), "Ramps need a 1:12 slope.")
+
+    update_dataset(dataset, processor=processor, metadata_dir=metadata_dir)
+    manifest = load_manifest(manifest_path(dataset, metadata_dir))
+    fire, ramps = os.path.join("codes", "fire.txt"), os.path.join("codes", "ramps.txt")
+    assert set(manifest) == {fire, ramps}
+    store = processor.vector_store
+    assert store.existing_ids(list(_ids(manifest, fire) | _ids(manifest, ramps))) == _ids(manifest, fire) | _ids(manifest, ramps)
+
+    # Modified: the old chunk is replaced; deleted: its vectors go
+    old_fire = _ids(manifest, fire)
+    _write(os.path.join(dataset, "codes", "fire.txt"), "Fire exits must be at least 2 m wide.")
+    os.remove(os.path.join(dataset, "codes", "ramps.txt"))
+    update_dataset(dataset, processor=processor, metadata_dir=metadata_dir)
+    updated = load_manifest(manifest_path(dataset, metadata_dir))
+    assert set(updated) == {fire} and _ids(updated, fire) != old_fire
+    assert store.existing_ids(list(old_fire | _ids(manifest, ramps) | _ids(updated, fire))) == _ids(updated, fire)
+
+    # Syncing another directory leaves this dataset's vectors alone
+    other = os.path.join(tmp, "other")
+    _write(os.path.join(other, "stairs.txt"), "Staircases need handrails on both sides.")
+    update_dataset(other, processor=processor, metadata_dir=metadata_dir)
+    assert store.existing_ids(list(_ids(updated, fire))) == _ids(updated, fire)
+    assert manifest_path(other, metadata_dir) != manifest_path(dataset, metadata_dir)
@@ -0,0 +1,80 @@
+import time
+import threading
+import logging
+import pytest
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from index_writer import IndexWriter, enqueue_upload, job_status, cancel_job
+from upload_api import create_upload_router
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+DIMENSION = 16
+
+@pytest.fixture
+def make_writer(make_store, tmp_path):
+    """Factory for an IndexWriter polling a spool under tmp_path, over its own store"""
+    def make(embedder=None):
+        store = make_store(DIMENSION, embedder=embedder, chunk_store=True)
+        return IndexWriter(vector_store=store, spool_dir=str(tmp_path / "uploads"), poll_interval=0.05)
+    return make
+
+def _wait_for(job_id: str, spool: str, states, timeout: float = 10.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        status = job_status(job_id, spool)
+        if status and status["status"] in states:
+            return status
+        time.sleep(0.02)
+    raise AssertionError(f"job {job_id} never reached {states}: {job_status(job_id, spool)}")
+
+def test_upload_returns_job_and_background_writer_indexes_it(make_writer):
+    writer = make_writer()
+    api = FastAPI()
+    api.include_router(create_upload_router(writer.spool_dir))
+    client = TestClient(api)
+
+    # Nothing is parsed or embedded while the request is open
+    response = client.post("/api/upload", files={"file": ("stairs.txt", b"Every staircase shall have a handrail.")})
+    assert response.status_code == 202
+    job_id = response.json()["job_id"]
+    assert client.get(f"/api/upload/{job_id}").json()["status"] == "queued"
+    assert client.get("/api/upload/0123").status_code == 404
+
+    writer.start()
+    try:
+        status = _wait_for(job_id, writer.spool_dir, ("done", "failed"))
+    finally:
+        writer.stop()
+    assert status["status"] == "done" and status["chunks"] == 1
+    assert status["filename"] == "stairs.txt" and status["bytes"] == 38
+    result = writer.vector_store.query("staircase handrail", limit=1)[0]
+    assert result["metadata"]["source"] == "stairs.txt"
+
+def test_cancel_queued_job(make_writer):
+    writer = make_writer()
+    job_id = enqueue_upload("ramps.txt", b"Ramps need a 1:8 slope.", spool_dir=writer.spool_dir)
+    assert cancel_job(job_id, writer.spool_dir)["status"] == "cancelled"
+    assert writer.pending_jobs() == []
+    assert writer.process_pending() == 0
+    assert writer.vector_store.embedder.calls == 0
+    # Cancelling again is a no-op
+    assert cancel_job(job_id, writer.spool_dir)["status"] == "cancelled"
+
+def test_cancel_running_job_leaves_index_untouched(make_writer, fake_embedder):
+    gate = threading.Event()
+    writer = make_writer(fake_embedder(DIMENSION, gate=gate))
+    job_id = enqueue_upload("exits.txt", b"Fire exits must be 1.5 m wide.", spool_dir=writer.spool_dir)
+    worker = threading.Thread(target=writer.process_job, args=(job_id,))
+    worker.start()
+
+    status = _wait_for(job_id, writer.spool_dir, ("running",))
+    assert cancel_job(job_id, writer.spool_dir)["cancel_requested"]
+    gate.set()
+    worker.join()
+
+    status = job_status(job_id, writer.spool_dir)
+    assert status["status"] == "cancelled" and "cancel_requested" not in status
+    assert writer.vector_store.query("fire exits", limit=1) == []
@@ -0,0 +1,119 @@
+import re
+from typing import List, Optional, Tuple
+import numpy as np
+from langchain.schema import Document
+import logging
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Places a chunk may end, strongest first. Regulatory texts are organised by
+# section, rule and clause headings, so cutting just before one keeps a rule
+# and its sub-clauses together.
+BOUNDARY_PATTERNS = [
+    (3, re.compile(r"\n(?=[ \t]*(?:#+\s|(?:-\s+)?\*\*|Metadata:|(?:Rule|Section|Chapter|Clause|Regulation|Part|Schedule|Article)\s+[\dIVXLC]+|\d+(?:\.\d+)*[.)]\s|\(\d+[a-z]?\)\s))", re.IGNORECASE)),
+    (2, re.compile(r"\n[ \t]*\n")),
+    (1, re.compile(r"\n")),
+    (0, re.compile(r"[.;:!?](?=\s)")),
+]
+
+_FALLBACK_TOKEN = re.compile(r"\S+\s*|\s+")
+
+
+class TokenChunker:
+    def __init__(self,
+                 chunk_tokens: int = 256,
+                 overlap_tokens: int = 50,
+                 max_chunks: Optional[int] = None,
+                 encoding_name: str = "cl100k_base"):
+        """
+        Split text into token-bounded windows with overlap.
+
+        Each document is tokenized once; windows are cut on the resulting
+        token offset array, ending at the strongest structural boundary
+        (section/rule heading, blank line, line break, sentence end) in the
+        second half of the window. Output depends only on the input text, so
+        re-runs produce identical chunks.
+
+        Args:
+            chunk_tokens: Maximum tokens per chunk
+            overlap_tokens: Tokens repeated at the start of the next chunk
+            max_chunks: Maximum chunks per document; extra text is dropped with a warning
+            encoding_name: tiktoken encoding (cl100k_base matches text-embedding-ada-002)
+        """
+        if overlap_tokens >= chunk_tokens:
+            raise ValueError("overlap_tokens must be smaller than chunk_tokens")
+        self.chunk_tokens = chunk_tokens
+        self.overlap_tokens = overlap_tokens
+        self.max_chunks = max_chunks
+        self.encoding_name = encoding_name
+        self._encoding = None
+
+    def _token_offsets(self, text: str) -> np.ndarray:
+        """Character offset at which each token starts"""
+        if self._encoding is None:
+            try:
+                import tiktoken
+                self._encoding = tiktoken.get_encoding(self.encoding_name)
+            except Exception as e:
+                logger.warning(f"tiktoken unavailable, approximating tokens by words: {str(e)}")
+                self._encoding = False
+        if self._encoding:
+            tokens = self._encoding.encode(text, disallowed_special=())
+            _, offsets = self._encoding.decode_with_offsets(tokens)
+            return np.asarray(offsets, dtype=np.int64)
+        return np.fromiter((m.start() for m in _FALLBACK_TOKEN.finditer(text)), dtype=np.int64)
+
+    def _boundaries(self, text: str, offsets: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Token indices where a chunk may end, with their priorities, sorted by index"""
+        positions, priorities = [], []
+        for priority, pattern in BOUNDARY_PATTERNS:
+            for match in pattern.finditer(text):
+                positions.append(match.end())
+                priorities.append(priority)
+        if not positions:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+        # First token starting at or after the boundary character
+        tokens = np.searchsorted(offsets, np.asarray(positions), side="left")
+        order = np.argsort(tokens, kind="stable")
+        return tokens[order], np.asarray(priorities)[order]
+
+    def split_text(self, text: str) -> List[str]:
+        """Split text into chunks of at most chunk_tokens tokens"""
+        offsets = self._token_offsets(text)
+        n = len(offsets)
+        if n == 0:
+            return []
+        boundary_tokens, boundary_priorities = self._boundaries(text, offsets)
+        char_ends = np.append(offsets[1:], len(text))
+
+        chunks: List[str] = []
+        start = 0
+        while start < n:
+            end = min(start + self.chunk_tokens, n)
+            if end < n:
+                # Strongest boundary in the back half of the window, rightmost on ties
+                lo = np.searchsorted(boundary_tokens, start + self.chunk_tokens // 2, side="left")
+                hi = np.searchsorted(boundary_tokens, end, side="right")
+                if hi > lo:
+                    window = boundary_priorities[lo:hi]
+                    best = lo + np.flatnonzero(window == window.max())[-1]
+                    end = int(boundary_tokens[best])
+            chunk = text[offsets[start]:char_ends[end - 1]].strip()
+            if chunk:
+                chunks.append(chunk)
+                if self.max_chunks and len(chunks) >= self.max_chunks and end < n:
+                    logger.warning(f"Stopped at max_chunks={self.max_chunks}; {n - end} tokens not chunked")
+                    break
+            if end >= n:
+                break
+            start = max(end - self.overlap_tokens, start + 1)
+        return chunks
+
+    def split_documents(self, documents: List[Document]) -> List[Document]:
+        """Split each document, copying its metadata onto every chunk"""
+        return [
+            Document(page_content=chunk, metadata=dict(doc.metadata))
+            for doc in documents
+            for chunk in self.split_text(doc.page_content)
+        ]
@@ -1,43 +1,136 @@
 from dataset_processor import DatasetProcessor
 import os
+import json
+import hashlib
 import logging
 from datetime import datetime
+from typing import Dict, Any, List, Optional
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-def update_dataset():
-    """Update the dataset with new documents"""
-    processor = DatasetProcessor()
-    processor.initialize()
-    
-    # Process only new or modified files
-    last_update = get_last_update_time()
-    
+DATASET_DIR = os.path.join(os.path.dirname(__file__), "dataset")
+METADATA_DIR = os.path.join(DATASET_DIR, "processed", "metadata")
+MANIFEST_FILE = os.path.join(METADATA_DIR, "manifest.json")
+
+def update_dataset(dataset_path: Optional[str] = None, batch_size: int = 100,
+                   processor: Optional[DatasetProcessor] = None, metadata_dir: str = METADATA_DIR):
+    """
+    Incrementally sync the vector store with the dataset directory.
+
+    Only files that are new or whose content changed since the last run are
+    re-chunked and re-embedded. Vectors left behind by deleted files, or by
+    files that now produce fewer chunks, are deleted by ID. Each dataset
+    directory has its own manifest, so syncing one never deletes another's
+    vectors.
+
+    Args:
+        dataset_path: Local dataset directory (defaults to the bundled dataset)
+        batch_size: Chunks per embedding request and per upsert
+        processor: DatasetProcessor to index with (a new one by default)
+        metadata_dir: Directory holding the manifests
+    """
+    if processor is None:
+        processor = DatasetProcessor()
+        processor.initialize()
+    dataset_path = dataset_path or processor.dataset_path
+    manifest_file = manifest_path(dataset_path, metadata_dir)
+
+    manifest = load_manifest(manifest_file)
+    current: Dict[str, Dict[str, Any]] = {}
+    changed: List[str] = []
+
+    for file_path in processor.list_local_files(dataset_path):
+        key = os.path.relpath(file_path, dataset_path)
+        stat = os.stat(file_path)
+        entry = manifest.get(key)
+
+        # Size and mtime unchanged: trust the previous run without reading the file
+        if entry and entry["size"] == stat.st_size and entry["mtime"] == stat.st_mtime:
+            current[key] = entry
+            continue
+
+        content_hash = file_sha256(file_path)
+        if entry and entry["sha256"] == content_hash:
+            current[key] = {**entry, "size": stat.st_size, "mtime": stat.st_mtime}
+            continue
+
+        current[key] = {
+            "path": file_path,
+            "size": stat.st_size,
+            "mtime": stat.st_mtime,
+            "sha256": content_hash,
+            "chunk_ids": entry["chunk_ids"] if entry else []
+        }
+        changed.append(key)
+
     # Process new documents
-    processor.process_dataset()
-    
-    # Update last update time
-    update_last_update_time()
-    
-    logger.info("Dataset update completed!")
-
-def get_last_update_time():
-    """Get the last update time from the metadata file"""
-    metadata_file = os.path.join(os.path.dirname(__file__), "dataset", "processed", "metadata", "last_update.txt")
-    if os.path.exists(metadata_file):
-        with open(metadata_file, 'r') as f:
-            return datetime.fromisoformat(f.read().strip())
-    return datetime.min
-
-def update_last_update_time():
+    logger.info(f"{len(changed)} new or changed files out of {len(current)}")
+    chunk_ids = processor.index_files([current[key]["path"] for key in changed], batch_size)
+
+    stale_ids: List[str] = []
+    for key in changed:
+        new_ids = chunk_ids.get(current[key]["path"])
+        if new_ids is None:
+            # Parsing failed: keep the old vectors and retry on the next run
+            if key in manifest:
+                current[key] = manifest[key]
+            else:
+                del current[key]
+            continue
+        stale_ids.extend(set(current[key]["chunk_ids"]) - set(new_ids))
+        current[key]["chunk_ids"] = new_ids
+
+    for key in manifest.keys() - current.keys():
+        logger.info(f"Removing vectors for deleted file {key}")
+        stale_ids.extend(manifest[key]["chunk_ids"])
+
+    if stale_ids:
+        processor.vector_store.delete_documents(stale_ids)
+
+    save_manifest(current, manifest_file)
+    update_last_update_time(metadata_dir)
+
+    logger.info(f"Dataset update completed! Re-indexed {len(changed)} files, deleted {len(stale_ids)} stale vectors")
+
+def file_sha256(file_path: str) -> str:
+    """Hash file content in blocks so large PDFs aren't read into memory at once"""
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def manifest_path(dataset_path: str, metadata_dir: str = METADATA_DIR) -> str:
+    """Manifest file for one dataset directory; the bundled dataset keeps manifest.json"""
+    dataset_path = os.path.abspath(dataset_path)
+    if metadata_dir == METADATA_DIR and dataset_path == os.path.abspath(DATASET_DIR):
+        return MANIFEST_FILE
+    digest = hashlib.sha256(dataset_path.encode('utf-8')).hexdigest()[:16]
+    return os.path.join(metadata_dir, f"manifest_{digest}.json")
+
+def load_manifest(manifest_file: str = MANIFEST_FILE) -> Dict[str, Dict[str, Any]]:
+    """Load the per-file manifest written by the previous run"""
+    if os.path.exists(manifest_file):
+        with open(manifest_file, 'r') as f:
+            return json.load(f)
+    return {}
+
+def save_manifest(manifest: Dict[str, Dict[str, Any]], manifest_file: str = MANIFEST_FILE):
+    """Write the manifest atomically so an interrupted run can't corrupt it"""
+    os.makedirs(os.path.dirname(manifest_file), exist_ok=True)
+    temp_file = manifest_file + ".tmp"
+    with open(temp_file, 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(temp_file, manifest_file)
+
+def update_last_update_time(metadata_dir: str = METADATA_DIR):
     """Update the last update time in the metadata file"""
-    metadata_dir = os.path.join(os.path.dirname(__file__), "dataset", "processed", "metadata")
     os.makedirs(metadata_dir, exist_ok=True)
-    
+
     metadata_file = os.path.join(metadata_dir, "last_update.txt")
     with open(metadata_file, 'w') as f:
         f.write(datetime.now().isoformat())
 
 if __name__ == "__main__":
-    update_dataset() 
\ No newline at end of file
+    update_dataset()
@@ -0,0 +1,56 @@
+import asyncio
+from fastapi import APIRouter, UploadFile, File, HTTPException
+from index_writer import enqueue_upload, job_status, cancel_job, DEFAULT_SPOOL_DIR
+import logging
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def create_upload_router(spool_dir: str = DEFAULT_SPOOL_DIR) -> APIRouter:
+    """
+    Upload endpoints backed by the index writer's job queue.
+
+    POST /api/upload copies the file into the spool and returns a job ID
+    without parsing or embedding anything, so its latency does not grow
+    with the document's size. GET /api/upload/{job_id} reports status and
+    progress; DELETE /api/upload/{job_id} cancels the job. An IndexWriter
+    on the same spool directory (in-process or serve.py's writer process)
+    does the indexing.
+
+    Args:
+        spool_dir: Spool directory the IndexWriter watches
+    """
+    router = APIRouter()
+
+    @router.post("/api/upload", status_code=202)
+    async def upload_file(file: UploadFile = File(...)):
+        """Queue a file for indexing and return its job ID"""
+        try:
+            # Starlette has already spooled the body to a temp file; copy it over in chunks off the event loop
+            job_id = await asyncio.to_thread(enqueue_upload, file.filename, file.file, spool_dir)
+            return {"message": f"Queued {file.filename} for indexing", "job_id": job_id,
+                    "status_url": f"/api/upload/{job_id}"}
+        except Exception as e:
+            logger.error(f"Error in upload endpoint: {str(e)}")
+            raise HTTPException(status_code=500, detail=str(e))
+        finally:
+            await file.close()
+
+    @router.get("/api/upload/{job_id}")
+    async def upload_status(job_id: str):
+        """Status and progress of an upload job"""
+        status = await asyncio.to_thread(job_status, job_id, spool_dir)
+        if status is None:
+            raise HTTPException(status_code=404, detail=f"Unknown upload job {job_id}")
+        return status
+
+    @router.delete("/api/upload/{job_id}")
+    async def cancel_upload(job_id: str):
+        """Cancel a queued or running upload job"""
+        status = await asyncio.to_thread(cancel_job, job_id, spool_dir)
+        if status is None:
+            raise HTTPException(status_code=404, detail=f"Unknown upload job {job_id}")
+        return status
+
+    return router
@@ -1,11 +1,30 @@
 import os
+import json
+import hashlib
+import asyncio
+import threading
+import contextlib
+import numpy as np
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from pinecone_client import PineconeClient
+from local_index import LocalVectorIndex, DEFAULT_INDEX_PATH
+from embedding_client import EmbeddingClient
+from embedding_cache import get_embedding_cache
+from chunk_ids import document_id
+from query_cache import QueryResultCache
+from config import filterable_fields, load_config
+from bm25_index import BM25Index, DEFAULT_BM25_PATH, reciprocal_rank_fusion
+from segment_store import SegmentStore
+from index_generation import IndexGeneration, DEFAULT_GENERATION_PATH
+from reranker import create_reranker
+from clients import get_clients
+from metrics import span, count_call
 from langchain_pinecone import Pinecone
-from langchain_openai import OpenAIEmbeddings
 from dotenv import load_dotenv
 import logging
 from langchain.schema import Document
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Set, Optional, Union, Tuple
 import uuid
 
 logging.basicConfig(level=logging.INFO)
@@ -14,102 +33,817 @@ logger = logging.getLogger(__name__)
 class VectorStore:
     def __init__(self):
         load_dotenv()
+        # "pinecone" (default) or "local" for the in-process LocalVectorIndex
+        self.backend = os.getenv("VECTOR_BACKEND", "pinecone").lower()
         self.index_name = os.getenv("PINECONE_INDEX")
         self.api_key = os.getenv("PINECONE_API_KEY")
         self.environment = os.getenv("PINECONE_ENVIRONMENT")
         
         logger.info(f"VectorStore Initializing with:")
-        logger.info(f"  PINECONE_INDEX: {self.index_name}")
-        logger.info(f"  PINECONE_API_KEY: {self.api_key[:5]}...") # Mask for security
-        logger.info(f"  PINECONE_ENVIRONMENT: {self.environment}")
+        logger.info(f"  VECTOR_BACKEND: {self.backend}")
+        if self.backend == "pinecone":
+            logger.info(f"  PINECONE_INDEX: {self.index_name}")
+            logger.info(f"  PINECONE_API_KEY: {self.api_key[:5] if self.api_key else None}...") # Mask for security
+            logger.info(f"  PINECONE_ENVIRONMENT: {self.environment}")
 
-        self.embeddings = OpenAIEmbeddings()
         self.client = None
+        self.embedder = None
         self.index = None
+        self.lexical_index = None
+        self.chunk_store = None
+        # ID -> digest of the metadata stored with its vector, as last fetched or written here;
+        # an LRU, so re-runs over a large corpus answer existence checks without a fetch
+        self._known_metadata: "OrderedDict[str, str]" = OrderedDict()
+        # Upload jobs and requests check and record IDs from several threads at once
+        self._known_lock = threading.Lock()
+        self.known_ids_limit = int(os.getenv("KNOWN_IDS_CACHE_SIZE", "200000"))
+        # Reader processes map the on-disk indexes read-only and remap when the writer publishes
+        self.read_only = os.getenv("INDEX_READ_ONLY", "").lower() in ("1", "true", "yes")
+        self.generation = None
+        self._remap_lock = threading.Lock()
+        self._remap_state_lock = threading.Lock()
+        self._remap_requested = False
+        self._remap_running = False
         self.dimension = 1536  # OpenAI embedding dimension
+        # Caps in-flight async queries so a burst of requests can't exhaust API quotas or threads
+        self.query_limiter = asyncio.Semaphore(int(os.getenv("MAX_CONCURRENT_QUERIES", "16")))
+        # Results of repeated queries; every write to the index invalidates it
+        self.result_cache = QueryResultCache(
+            max_entries=int(os.getenv("QUERY_CACHE_SIZE", "1024")),
+            ttl=float(os.getenv("QUERY_CACHE_TTL", "300"))
+        )
 
-        if not all([self.index_name, self.api_key, self.environment]):
+        # Hybrid retrieval: BM25 candidates fused with vector candidates by reciprocal rank
+        config = load_config()
+        self.hybrid_search = config.get("hybrid_search", True)
+        self.lexical_top_k = config.get("lexical_top_k", 20)
+        self.rrf_k = config.get("rrf_k", 60)
+        self.lexical_min_score_ratio = config.get("lexical_min_score_ratio", 0.2)
+        # Optional re-ranking of the fused candidates; None keeps retrieval order
+        self.reranker = create_reranker(config)
+
+        if self.backend not in ("pinecone", "local"):
+            raise ValueError(f"Unknown VECTOR_BACKEND '{self.backend}'. Use 'pinecone' or 'local'.")
+        if self.backend == "pinecone" and not all([self.index_name, self.api_key, self.environment]):
             raise ValueError("Missing Pinecone environment variables. Please check your .env file.")
 
+    @property
+    def embeddings(self):
+        """Shared LangChain embeddings, used by the Pinecone similarity_search path"""
+        return get_clients().embeddings
+
     def initialize(self):
-        """Initialize Pinecone client and index"""
+        """Initialize the index client for the configured backend"""
         try:
-            self.client = PineconeClient()
-            self.client.initialize()
-            self.index = self.client.get_index()
+            self.generation = IndexGeneration(os.getenv("INDEX_GENERATION_PATH", DEFAULT_GENERATION_PATH))
+            if self.backend == "local":
+                self.embedder = EmbeddingClient(cache=get_embedding_cache())
+            else:
+                self.client = PineconeClient()
+                self.client.initialize()
+                self.index = self.client.get_index()
+                self.embedder = self.client
+            local_index, self.lexical_index = self._load_local_indexes()
+            if self.backend == "local":
+                self.index = local_index
+            # Opt-in: chunk text kept in a local memory-mapped segment instead of the index metadata.
+            # Every process querying the index must then see the same segment directory.
+            chunk_store_path = os.getenv("CHUNK_STORE_PATH", "")
+            self.chunk_store = SegmentStore(chunk_store_path, self.dimension) if chunk_store_path else None
+            if self.reranker is not None:
+                self.reranker.load()
             logger.info("Vector store initialized successfully")
         except Exception as e:
             logger.error(f"Failed to initialize vector store: {str(e)}")
             raise
 
-    def add_documents(self, documents: List[Dict[str, Any]]):
-        """Add documents to the vector store"""
+    def _load_local_indexes(self):
+        """Open the on-disk indexes; a reader holds off the writer while it loads"""
+        with self.generation.reading() if self.read_only else contextlib.nullcontext():
+            local_index = None
+            if self.backend == "local":
+                local_index = LocalVectorIndex(
+                    dimension=self.dimension,
+                    path=os.getenv("LOCAL_INDEX_PATH", DEFAULT_INDEX_PATH),
+                    # "int8" keeps 4x smaller codes in memory and re-ranks from a mapped float32 file
+                    quantization=os.getenv("LOCAL_INDEX_QUANTIZATION") or None,
+                    read_only=self.read_only
+                )
+            lexical_index = BM25Index(path=os.getenv("BM25_INDEX_PATH", DEFAULT_BM25_PATH))
+        return local_index, lexical_index
+
+    def remap(self):
+        """Catch the indexes up with what another process last published"""
+        with self._remap_lock:
+            # Both indexes replay the records the other process appended instead of reloading everything
+            with self.generation.reading():
+                if self.backend == "local":
+                    self.index.refresh()
+                if self.lexical_index is not None:
+                    self.lexical_index.refresh()
+            if self.chunk_store is not None:
+                self.chunk_store.refresh()
+            if not self.read_only:
+                # The other writer may have deleted or rewritten vectors remembered here
+                with self._known_lock:
+                    self._known_metadata.clear()
+            self.result_cache.bump_generation()
+        logger.info(f"Remapped indexes at generation {self.generation.read()}")
+
+    def _maybe_remap(self):
+        """
+        Start a background remap once another process has published; queries keep
+        the old maps meanwhile. Writers remap too: the API's own IndexWriter and
+        update_dataset.py publish to the same indexes.
+        """
+        if self.generation is None or not self.generation.changed():
+            return
+        with self._remap_state_lock:
+            # A burst of generations while a remap runs is caught up by one more pass, not one each
+            self._remap_requested = True
+            if self._remap_running:
+                return
+            self._remap_running = True
+
+        def run():
+            while True:
+                with self._remap_state_lock:
+                    if not self._remap_requested:
+                        self._remap_running = False
+                        return
+                    self._remap_requested = False
+                try:
+                    self.remap()
+                except Exception as e:
+                    logger.error(f"Failed to remap indexes: {str(e)}")
+        threading.Thread(target=run, daemon=True).start()
+
+    def _check_writable(self):
+        if self.read_only:
+            raise RuntimeError("Vector store is read-only in this process; uploads go through the index writer")
+
+    def add_documents(self, documents: List[Dict[str, Any]], skip_existing: bool = True) -> int:
+        """
+        Add documents to the vector store.
+
+        IDs come from the document's 'id' or metadata 'chunk_id', falling back to
+        one derived from source, chunk index and content, so re-adding the same
+        chunk overwrites rather than duplicates it.
+
+        Args:
+            documents: Dicts with 'content', 'metadata' and 'embedding'
+            skip_existing: Skip documents whose ID is already in the index. Since
+                IDs include a content hash, an existing ID means unchanged content.
+
+        Returns:
+            Number of vectors actually upserted
+        """
         try:
             if not self.index:
                 self.initialize()
+            self._check_writable()
 
             # Prepare vectors for batch upsert
             vectors = []
             for i, doc in enumerate(documents):
                 vector = {
-                    "id": f"doc_{i}",
+                    "id": self.document_id(doc, i),
                     "values": doc["embedding"],
-                    "metadata": {
-                        "content": doc["content"],
-                        "source": doc["metadata"]["source"]
-                    }
+                    "metadata": self._vector_metadata(doc)
                 }
                 vectors.append(vector)
 
+            # Lexical indexing is idempotent and cheap, so it also catches up on chunks
+            # that were already in the vector index
+            lexical_changed = self.lexical_index.add(
+                [v["id"] for v in vectors],
+                [v["metadata"]["content"] for v in vectors],
+                [{k: val for k, val in v["metadata"].items() if k != "content"} for v in vectors]
+            )
+
+            if self.chunk_store is not None:
+                # Store text locally before the vectors become queryable, then keep it out of
+                # the index so queries return IDs only. Chunks indexed earlier are caught up too.
+                self.chunk_store.append([
+                    {"id": v["id"], "content": v["metadata"]["content"], "values": v["values"],
+                     "metadata": {k: val for k, val in v["metadata"].items() if k != "content"}}
+                    for v in vectors if v["id"] not in self.chunk_store
+                ])
+                for v in vectors:
+                    v["metadata"] = {k: val for k, val in v["metadata"].items() if k != "content"}
+
+            if skip_existing:
+                existing = self.existing_ids([v["id"] for v in vectors])
+                if existing:
+                    # Their text is unchanged, but their metadata may not be
+                    self.add_existing([{**doc, "id": v["id"]} for doc, v in zip(documents, vectors)
+                                       if v["id"] in existing])
+                vectors = [v for v in vectors if v["id"] not in existing]
+
             # Upsert vectors in batches
             batch_size = 100
             for i in range(0, len(vectors), batch_size):
                 batch = vectors[i:i + batch_size]
+                count_call(self.backend, "upsert")
                 self.index.upsert(vectors=batch)
+                self._remember({v["id"]: self.metadata_digest(v["metadata"]) for v in batch})
+            if vectors or lexical_changed:
+                self._flush_local()
+                self.result_cache.bump_generation()
 
-            logger.info(f"Successfully added {len(documents)} documents to vector store")
+            logger.info(f"Successfully added {len(vectors)} of {len(documents)} documents to vector store")
+            return len(vectors)
         except Exception as e:
             logger.error(f"Failed to add documents to vector store: {str(e)}")
             raise
 
-    def query(self, query: str, limit: int = 5) -> List[Dict[str, Any]]:
-        """Query the vector store"""
+    def add_lexical(self, documents: List[Dict[str, Any]]) -> int:
+        """
+        Index documents in the BM25 index only, e.g. chunks whose vectors already exist.
+
+        Args:
+            documents: Dicts with 'content' and 'metadata' (no embedding needed)
+
+        Returns:
+            Number of chunks newly indexed or changed
+        """
+        if not self.index:
+            self.initialize()
+        self._check_writable()
+        changed = self._index_lexical(documents)
+        if changed:
+            with self.generation.publishing():
+                self.lexical_index.flush()
+                self.generation.bump()
+            self.result_cache.bump_generation()
+        return changed
+
+    def add_existing(self, documents: List[Dict[str, Any]]) -> int:
+        """
+        Catch up chunks whose vectors already exist: index them in BM25 and write
+        their metadata to the vector index where it changed, e.g. filter fields
+        added to config.yaml since the vectors were upserted, or a new total_chunks.
+
+        Args:
+            documents: Dicts with 'content' and 'metadata' (no embedding needed)
+
+        Returns:
+            Number of vectors whose metadata was updated
+        """
         try:
+            if not self.index:
+                self.initialize()
+            self._check_writable()
+            ids = [self.document_id(doc, i) for i, doc in enumerate(documents)]
+            with self._known_lock:
+                known = {id_: self._known_metadata[id_] for id_ in ids if id_ in self._known_metadata}
+            unknown = [id_ for id_ in ids if id_ not in known]
+            if unknown:
+                known.update(self._stored_metadata(unknown))
+
+            updated = {}
+            for id_, doc in zip(ids, documents):
+                metadata = {k: v for k, v in self._vector_metadata(doc).items() if k != "content"}
+                digest = self.metadata_digest(metadata)
+                if known.get(id_, digest) != digest:
+                    count_call(self.backend, "update")
+                    # Merges into the stored metadata; the text stays where it is
+                    self.index.update(id=id_, set_metadata=metadata)
+                    self._remember({id_: digest})
+                    updated[id_] = metadata
+            if updated and self.chunk_store is not None:
+                vectors = self.chunk_store.get_vectors(list(updated))
+                stored = self.chunk_store.get_many(list(vectors))
+                self.chunk_store.append([
+                    {"id": id_, "content": stored[id_]["content"], "values": vectors[id_],
+                     "metadata": updated[id_]}
+                    for id_ in vectors if id_ in stored
+                ])
+
+            lexical_changed = self._index_lexical(documents)
+            if updated:
+                self._flush_local()
+                self.result_cache.bump_generation()
+            elif lexical_changed:
+                with self.generation.publishing():
+                    self.lexical_index.flush()
+                    self.generation.bump()
+                self.result_cache.bump_generation()
+            if updated:
+                logger.info(f"Updated metadata of {len(updated)} existing vectors")
+            return len(updated)
+        except Exception as e:
+            logger.error(f"Failed to update existing documents: {str(e)}")
+            raise
+
+    def _index_lexical(self, documents: List[Dict[str, Any]]) -> int:
+        metadatas = [self._vector_metadata(doc) for doc in documents]
+        return self.lexical_index.add(
+            [self.document_id(doc, i) for i, doc in enumerate(documents)],
+            [m.pop("content") for m in metadatas],
+            metadatas
+        )
+
+    @classmethod
+    def _vector_metadata(cls, doc: Dict[str, Any]) -> Dict[str, Any]:
+        """Metadata stored with a chunk's vector: its text, source and filterable fields"""
+        return {
+            "content": doc["content"],
+            "source": doc["metadata"]["source"],
+            **cls._filterable_metadata(doc["metadata"])
+        }
+
+    @staticmethod
+    def _filterable_metadata(metadata: Dict[str, Any]) -> Dict[str, Any]:
+        """Metadata fields stored with the vector so searches can filter on them server-side"""
+        return {
+            field: metadata[field]
+            for field in filterable_fields()
+            if isinstance(metadata.get(field), (str, int, float, bool))
+        }
+
+    @staticmethod
+    def compile_filter(filters: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+        """
+        Translate {"field": value} filters into the index's native filter expression.
+
+        A list value matches any of its elements; fields that are not
+        filterable are logged and ignored. Both Pinecone and the local index
+        evaluate the expression during the search, so k results are returned
+        whenever k matching chunks exist.
+        """
+        if not filters:
+            return None
+        allowed = filterable_fields()
+        compiled = {}
+        for field, value in filters.items():
+            if field not in allowed:
+                # Chunks never carry the field, so filtering on it would match nothing
+                logger.warning(f"Ignoring filter on '{field}'. Filterable fields: {', '.join(allowed)}")
+                continue
+            compiled[field] = {"$in": list(value)} if isinstance(value, (list, tuple, set)) else {"$eq": value}
+        return compiled or None
+
+    # Stable vector ID for a document dict; PineconeClient names its vectors the same way
+    document_id = staticmethod(document_id)
+
+    def existing_ids(self, ids: List[str]) -> Set[str]:
+        """
+        Subset of ids already present in the index.
+
+        IDs this store upserted or fetched before are answered from memory;
+        only the rest are fetched from the index.
+        """
+        with self._known_lock:
+            known = {id_ for id_ in ids if id_ in self._known_metadata}
+        unknown = [id_ for id_ in ids if id_ not in known]
+        return known | (set(self._stored_metadata(unknown)) if unknown else set())
+
+    def _remember(self, digests: Dict[str, str]):
+        """Record metadata digests of stored vectors, forgetting the least recently seen past the limit"""
+        with self._known_lock:
+            for id_, digest in digests.items():
+                self._known_metadata[id_] = digest
+                self._known_metadata.move_to_end(id_)
+            while len(self._known_metadata) > self.known_ids_limit:
+                self._known_metadata.popitem(last=False)
+
+    def _stored_metadata(self, ids: List[str]) -> Dict[str, str]:
+        """Digest of the metadata stored with each of ids that is in the index, remembered for add_existing"""
+        if not self.index:
+            self.initialize()
+
+        found: Dict[str, str] = {}
+        # Pinecone caps the number of IDs per fetch request
+        for i in range(0, len(ids), 100):
+            count_call(self.backend, "fetch")
+            for id_, vector in self.index.fetch(ids=ids[i:i + 100]).vectors.items():
+                found[id_] = self.metadata_digest(getattr(vector, "metadata", None) or {})
+        self._remember(found)
+        return found
+
+    @staticmethod
+    def metadata_digest(metadata: Dict[str, Any]) -> str:
+        """Digest of a vector's metadata apart from its text; Pinecone returns integers as floats"""
+        normalized = {
+            k: float(v) if isinstance(v, (int, float)) and not isinstance(v, bool) else v
+            for k, v in metadata.items() if k != "content"
+        }
+        return hashlib.sha256(json.dumps(normalized, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+    def query(self, query: str, limit: int = 5, filters: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+        """Query the vector store, optionally restricted to chunks whose metadata matches filters"""
+        try:
+            self._maybe_remap()
+            cache_key = self.result_cache.make_key("query", query, limit, filters)
+            cached = self.result_cache.get(cache_key)
+            if cached is not None:
+                return cached
+            generation = self.result_cache.generation
+
             if not self.index:
                 self.initialize()
 
             # Get query embedding
-            query_embedding = self.client.get_embedding(query)
+            with span("query_embed"):
+                query_embedding = self.embedder.get_embedding(query)
+            compiled_filter = self.compile_filter(filters)
+            candidates = self._candidates(limit)
 
             # Query the index
-            results = self.index.query(
-                vector=query_embedding,
-                top_k=limit,
-                include_metadata=True
-            )
+            count_call(self.backend, "query")
+            with span("query_index"):
+                results = self.index.query(
+                    vector=query_embedding,
+                    top_k=candidates,
+                    include_metadata=self.chunk_store is None,
+                    filter=compiled_filter
+                )
+
+            with span("query_resolve"):
+                matches = self._format_matches(results)
+            with span("query_fuse"):
+                formatted_results = self._fuse(query, matches, candidates, compiled_filter, query_embedding)
+            formatted_results = self._rerank(query, formatted_results, limit)
+            self.result_cache.put(cache_key, formatted_results, generation)
+            return formatted_results
+        except Exception as e:
+            logger.error(f"Failed to query vector store: {str(e)}")
+            raise
+
+    async def aquery(self, query: str, limit: int = 5, filters: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+        """Query the vector store without blocking the event loop"""
+        try:
+            self._maybe_remap()
+            cache_key = self.result_cache.make_key("query", query, limit, filters)
+            cached = self.result_cache.get(cache_key)
+            if cached is not None:
+                return cached
+            generation = self.result_cache.generation
+
+            if not self.index:
+                await asyncio.to_thread(self.initialize)
+
+            compiled_filter = self.compile_filter(filters)
+            candidates = self._candidates(limit)
+            async with self.query_limiter:
+                with span("query_embed"):
+                    query_embedding = await self.embedder.aget_embedding(query)
 
-            # Format results
-            formatted_results = []
-            for match in results.matches:
-                formatted_results.append({
-                    "content": match.metadata["content"],
-                    "metadata": {
-                        "source": match.metadata["source"]
-                    },
-                    "score": match.score
-                })
+                # The Pinecone index client is synchronous; run it on a worker thread
+                count_call(self.backend, "query")
+                with span("query_index"):
+                    results = await asyncio.to_thread(
+                        self.index.query,
+                        vector=query_embedding,
+                        top_k=candidates,
+                        include_metadata=self.chunk_store is None,
+                        filter=compiled_filter
+                    )
 
+            # BM25 lookups take microseconds, so resolving and fusion run inline
+            with span("query_resolve"):
+                matches = self._format_matches(results)
+            with span("query_fuse"):
+                formatted_results = self._fuse(query, matches, candidates, compiled_filter, query_embedding)
+            if self.reranker is not None and not self.reranker.inline:
+                # A model scorer would hold the event loop for its whole budget
+                formatted_results = await asyncio.to_thread(self._rerank, query, formatted_results, limit)
+            else:
+                formatted_results = self._rerank(query, formatted_results, limit)
+            self.result_cache.put(cache_key, formatted_results, generation)
             return formatted_results
         except Exception as e:
             logger.error(f"Failed to query vector store: {str(e)}")
             raise
 
+    def query_many(self, queries: List[str], limit: int = 5,
+                   filters: Optional[Union[Dict[str, Any], List[Optional[Dict[str, Any]]]]] = None
+                   ) -> List[List[Dict[str, Any]]]:
+        """
+        Run many queries at once: one embeddings request for every uncached
+        query and one index call per distinct filter.
+
+        Args:
+            queries: Query texts
+            limit: Results per query
+            filters: One filter dict for every query, or a list with one (or None) per query
+
+        Returns:
+            One result list per query, in input order, as query() would return it
+        """
+        try:
+            self._maybe_remap()
+            results, pending, plan = self._plan_batch(queries, limit, filters)
+            if not pending:
+                return results
+
+            if not self.index:
+                self.initialize()
+
+            texts, slots = self._unique_texts(queries, pending)
+            with span("query_embed"):
+                unique = self.embedder.get_embeddings(texts)
+            embeddings = [unique[slot] for slot in slots]
+            matches = [None] * len(pending)
+            for compiled_filter, positions in self._group_by_filter(plan).values():
+                with span("query_index"):
+                    found = self._index_query_many([embeddings[p] for p in positions], self._candidates(limit),
+                                                   compiled_filter)
+                for p, result in zip(positions, found):
+                    matches[p] = result
+            return self._finish_batch(queries, limit, results, pending, plan, matches, embeddings)
+        except Exception as e:
+            logger.error(f"Failed to run batch of {len(queries)} queries: {str(e)}")
+            raise
+
+    async def aquery_many(self, queries: List[str], limit: int = 5,
+                          filters: Optional[Union[Dict[str, Any], List[Optional[Dict[str, Any]]]]] = None
+                          ) -> List[List[Dict[str, Any]]]:
+        """Async counterpart of query_many; the whole batch holds one query slot"""
+        try:
+            self._maybe_remap()
+            results, pending, plan = self._plan_batch(queries, limit, filters)
+            if not pending:
+                return results
+
+            if not self.index:
+                await asyncio.to_thread(self.initialize)
+
+            async with self.query_limiter:
+                texts, slots = self._unique_texts(queries, pending)
+                with span("query_embed"):
+                    unique = await self.embedder.aget_embeddings(texts)
+                embeddings = [unique[slot] for slot in slots]
+                matches = [None] * len(pending)
+                for compiled_filter, positions in self._group_by_filter(plan).values():
+                    with span("query_index"):
+                        found = await asyncio.to_thread(self._index_query_many, [embeddings[p] for p in positions],
+                                                        self._candidates(limit), compiled_filter)
+                    for p, result in zip(positions, found):
+                        matches[p] = result
+            if self.reranker is not None and not self.reranker.inline:
+                return await asyncio.to_thread(self._finish_batch, queries, limit, results, pending, plan, matches,
+                                               embeddings)
+            return self._finish_batch(queries, limit, results, pending, plan, matches, embeddings)
+        except Exception as e:
+            logger.error(f"Failed to run batch of {len(queries)} queries: {str(e)}")
+            raise
+
+    def _plan_batch(self, queries: List[str], limit: int,
+                    filters: Optional[Union[Dict[str, Any], List[Optional[Dict[str, Any]]]]]):
+        """
+        Serve what the result cache can and plan the rest.
+
+        Returns:
+            (results with cached entries filled in, positions still to run,
+             (cache key, compiled filter, generation) per position still to run)
+        """
+        if filters is None or isinstance(filters, dict):
+            filters = [filters] * len(queries)
+        elif len(filters) != len(queries):
+            raise ValueError(f"Got {len(filters)} filters for {len(queries)} queries")
+
+        results: List[Optional[List[Dict[str, Any]]]] = [None] * len(queries)
+        pending: List[int] = []
+        plan: List[Tuple[Any, Optional[Dict[str, Any]], int]] = []
+        for i, (query, query_filters) in enumerate(zip(queries, filters)):
+            key = self.result_cache.make_key("query", query, limit, query_filters)
+            cached = self.result_cache.get(key)
+            if cached is not None:
+                results[i] = cached
+            else:
+                pending.append(i)
+                plan.append((key, self.compile_filter(query_filters), self.result_cache.generation))
+        return results, pending, plan
+
+    @staticmethod
+    def _unique_texts(queries: List[str], pending: List[int]) -> Tuple[List[str], List[int]]:
+        """Distinct query texts to embed, and the index into them of each pending position"""
+        positions: Dict[str, int] = {}
+        slots = [positions.setdefault(queries[i], len(positions)) for i in pending]
+        return list(positions), slots
+
+    @staticmethod
+    def _group_by_filter(plan) -> Dict[str, Tuple[Optional[Dict[str, Any]], List[int]]]:
+        """Positions in the plan grouped by identical compiled filter"""
+        groups: Dict[str, Tuple[Optional[Dict[str, Any]], List[int]]] = {}
+        for p, (_, compiled_filter, _) in enumerate(plan):
+            key = json.dumps(compiled_filter, sort_keys=True, default=str)
+            groups.setdefault(key, (compiled_filter, []))[1].append(p)
+        return groups
+
+    def _index_query_many(self, vectors: List[List[float]], limit: int,
+                          compiled_filter: Optional[Dict[str, Any]]) -> List[Any]:
+        """One multi-query call where the index supports it, else concurrent single queries"""
+        kwargs = dict(top_k=limit, include_metadata=self.chunk_store is None, filter=compiled_filter)
+        if hasattr(self.index, "query_many"):
+            count_call(self.backend, "query_many")
+            return self.index.query_many(vectors, **kwargs)
+
+        # Pinecone has no multi-vector query; overlap the round trips instead
+        def query_one(vector):
+            count_call(self.backend, "query")
+            return self.index.query(vector=vector, **kwargs)
+
+        with ThreadPoolExecutor(max_workers=min(8, len(vectors))) as pool:
+            return list(pool.map(query_one, vectors))
+
+    def _finish_batch(self, queries: List[str], limit: int, results: List[Optional[List[Dict[str, Any]]]],
+                      pending: List[int], plan, matches: List[Any],
+                      embeddings: List[List[float]]) -> List[List[Dict[str, Any]]]:
+        """Resolve, fuse, re-rank and cache the results of the queries that ran"""
+        for p, i in enumerate(pending):
+            key, compiled_filter, generation = plan[p]
+            with span("query_resolve"):
+                formatted = self._format_matches(matches[p])
+            with span("query_fuse"):
+                formatted = self._fuse(queries[i], formatted, self._candidates(limit), compiled_filter, embeddings[p])
+            formatted = self._rerank(queries[i], formatted, limit)
+            self.result_cache.put(key, formatted, generation)
+            results[i] = formatted
+        return results
+
+    def _candidates(self, limit: int) -> int:
+        """Chunks to retrieve for limit results: the re-ranker's candidate count, if it is on"""
+        return max(limit, self.reranker.candidates) if self.reranker is not None else limit
+
+    def _rerank(self, query: str, results: List[Dict[str, Any]], limit: int) -> List[Dict[str, Any]]:
+        """Top limit results, re-ordered by the re-ranker within its latency budget"""
+        if self.reranker is None:
+            return results
+        return self.reranker.rerank(query, results, limit)
+
+    def _format_matches(self, results) -> List[Dict[str, Any]]:
+        """
+        Convert index matches into result dicts.
+
+        Chunk text comes from the index metadata, else the chunk store, else
+        the index (fetched) or the BM25 index. A match whose text is nowhere
+        is still returned, with empty content, rather than dropped.
+        """
+        stored: Dict[str, Dict[str, Any]] = {}
+        for match in results.matches:
+            metadata = dict(match.metadata or {})
+            if "content" in metadata:
+                stored[match.id] = {"content": metadata.pop("content"), "metadata": metadata}
+        missing = [match.id for match in results.matches if match.id not in stored]
+        fetched_metadata: Dict[str, Dict[str, Any]] = {}
+        if missing and self.chunk_store is not None:
+            stored.update(self.chunk_store.get_many(missing))
+            missing = [id_ for id_ in missing if id_ not in stored]
+            if missing:
+                # The query ran without metadata; vectors written before (or without) this chunk store carry it
+                count_call(self.backend, "fetch")
+                for id_, vector in self.index.fetch(ids=missing).vectors.items():
+                    metadata = dict(vector.metadata or {})
+                    fetched_metadata[id_] = metadata
+                    if "content" in metadata:
+                        stored[id_] = {"content": metadata.pop("content"), "metadata": metadata}
+                missing = [id_ for id_ in missing if id_ not in stored]
+        if missing and self.lexical_index is not None:
+            # Vectors written while a chunk store held their text; BM25 keeps a copy
+            for id_ in missing:
+                lexical = self.lexical_index.get(id_)
+                if lexical is not None:
+                    stored[id_] = lexical
+            missing = [id_ for id_ in missing if id_ not in stored]
+        if missing:
+            logger.warning(f"No stored text for {len(missing)} matched chunks; returning them without content")
+
+        formatted = []
+        for match in results.matches:
+            found = stored.get(match.id)
+            if found is None:
+                metadata = fetched_metadata.get(match.id) or dict(match.metadata or {})
+                metadata.setdefault("source", "")
+                found = {"content": "", "metadata": metadata}
+            formatted.append({
+                "id": match.id,
+                "content": found["content"],
+                "metadata": found["metadata"],
+                "score": match.score
+            })
+        return formatted
+
+    def _fuse(self, query: str, vector_results: List[Dict[str, Any]], limit: int,
+              compiled_filter: Optional[Dict[str, Any]], query_embedding: List[float]) -> List[Dict[str, Any]]:
+        """
+        Merge vector matches with BM25 matches by reciprocal rank fusion.
+
+        Chunks found only lexically (e.g. an exact "Rule 33(7)") are returned
+        from the BM25 index's stored content. 'score' stays the cosine similarity
+        to the query, so thresholds and relevance scores mean the same with
+        hybrid search on or off; for lexical-only chunks it is computed from the
+        stored vector, and a chunk whose vector is gone (deleted by another
+        writer the BM25 index hasn't caught up with) is dropped. The order
+        follows 'fused_score'; 'vector_score' and 'lexical_score' keep each
+        retriever's own score (None where that retriever did not return the chunk).
+        """
+        if not self.hybrid_search or self.lexical_index is None or len(self.lexical_index) == 0:
+            return vector_results
+        lexical = self.lexical_index.search(query, top_k=max(limit, self.lexical_top_k), filter=compiled_filter)
+        if not lexical:
+            return vector_results
+        # Chunks matching only ubiquitous terms ("rule", "building") are noise; without
+        # this cutoff they would outrank an exact clause hit just by appearing in both lists
+        lexical = [(id_, s) for id_, s in lexical if s >= self.lexical_min_score_ratio * lexical[0][1]]
+
+        by_id = {r["id"]: r for r in vector_results}
+        lexical_scores = dict(lexical)
+        fused = reciprocal_rank_fusion([[r["id"] for r in vector_results], [id_ for id_, _ in lexical]], k=self.rrf_k)
+        cosine = self._cosine_scores([id_ for id_, _ in fused if id_ not in by_id], query_embedding)
+        results = []
+        for id_, fused_score in fused:
+            match = by_id.get(id_)
+            if match is None and id_ not in cosine:
+                continue
+            if len(results) == limit:
+                break
+            stored = match or self.lexical_index.get(id_)
+            results.append({
+                "id": id_,
+                "content": stored["content"],
+                "metadata": stored["metadata"],
+                "score": match["score"] if match else cosine.get(id_),
+                "fused_score": fused_score,
+                "vector_score": match["score"] if match else None,
+                "lexical_score": lexical_scores.get(id_)
+            })
+        return results
+
+    def _cosine_scores(self, ids: List[str], query_embedding: List[float]) -> Dict[str, float]:
+        """Cosine similarity of the query to the stored vectors of chunks the vector search didn't return"""
+        if not ids:
+            return {}
+        try:
+            if self.chunk_store is not None:
+                vectors = self.chunk_store.get_vectors(ids)
+            else:
+                count_call(self.backend, "fetch")
+                vectors = {id_: v.values for id_, v in self.index.fetch(ids=ids).vectors.items()}
+        except Exception as e:
+            logger.warning(f"Could not fetch vectors to score lexical matches: {str(e)}")
+            return {}
+        query = np.asarray(query_embedding, dtype=np.float32)
+        query_norm = float(np.linalg.norm(query)) or 1.0
+        scores = {}
+        for id_, values in vectors.items():
+            vector = np.asarray(values, dtype=np.float32)
+            scores[id_] = float(vector @ query) / (query_norm * (float(np.linalg.norm(vector)) or 1.0))
+        return scores
+
+    def delete_documents(self, ids: List[str]):
+        """Delete documents from the vector store by ID"""
+        try:
+            if not self.index:
+                self.initialize()
+            self._check_writable()
+
+            count_call(self.backend, "delete")
+            self.index.delete(ids=ids)
+            with self._known_lock:
+                for id_ in ids:
+                    self._known_metadata.pop(id_, None)
+            self.lexical_index.remove(ids)
+            if self.chunk_store is not None:
+                self.chunk_store.delete(ids)
+            self._flush_local()
+            self.result_cache.bump_generation()
+            logger.info(f"Deleted {len(ids)} documents from vector store")
+        except Exception as e:
+            logger.error(f"Failed to delete documents from vector store: {str(e)}")
+            raise
+
+    def _flush_local(self):
+        """Persist the in-process indexes after a write and signal reader processes to remap"""
+        with self.generation.publishing():
+            if self.backend == "local":
+                self.index.flush()
+            if self.lexical_index is not None:
+                self.lexical_index.flush()
+            self.generation.bump()
+
     def similarity_search(self, query, k=4):
         logger.info(f"Searching for documents similar to: {query}")
         try:
-            vectorstore = Pinecone(index=self.index, embedding=self.embeddings, text_key="text")
-            results = vectorstore.similarity_search(query, k=k)
+            self._maybe_remap()
+            cache_key = self.result_cache.make_key("similarity_search", query, k)
+            cached = self.result_cache.get(cache_key)
+            if cached is not None:
+                return cached
+            generation = self.result_cache.generation
+
+            if self.backend == "local":
+                results = [
+                    Document(page_content=r["content"], metadata={**r["metadata"], "score": r["score"]})
+                    for r in self.query(query, limit=k)
+                ]
+            else:
+                vectorstore = Pinecone(index=self.index, embedding=self.embeddings, text_key="text")
+                results = vectorstore.similarity_search(query, k=k)
             logger.info(f"Found {len(results)} similar documents.")
+            self.result_cache.put(cache_key, results, generation)
             return results
         except Exception as e:
             logger.error(f"Error during similarity search: {e}")
@@ -118,8 +852,17 @@ class VectorStore:
     def delete_all_documents(self):
         logger.info(f"Deleting all documents from Pinecone index: {self.index_name}...")
         try:
+            self._check_writable()
             # The delete_all method is part of the Index object
+            count_call(self.backend, "delete")
             self.index.delete(delete_all=True)
+            with self._known_lock:
+                self._known_metadata.clear()
+            self.lexical_index.clear()
+            if self.chunk_store is not None:
+                self.chunk_store.clear()
+            self._flush_local()
+            self.result_cache.bump_generation()
             logger.info("All documents deleted successfully from Pinecone.")
         except Exception as e:
             logger.error(f"Error deleting all documents from Pinecone: {e}") 
\ No newline at end of file
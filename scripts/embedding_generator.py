@@ -1,12 +1,21 @@
 import os
-from typing import List, Dict, Any
-import openai
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Optional
 from dotenv import load_dotenv
 import yaml
 from tqdm import tqdm
 
+# The embedding cache, client and rate limiter are shared with the RAG backend
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "rag", "backend"))
+
+from embedding_cache import get_embedding_cache
+from embedding_client import EmbeddingClient
+from rate_limiter import RateLimitScheduler
+
 class EmbeddingGenerator:
-    def __init__(self, config_path: str = "../config.yaml"):
+    def __init__(self, config_path: str = "../config.yaml", scheduler: Optional[RateLimitScheduler] = None,
+                 openai_client=None):
         """Initialize the embedding generator with configuration."""
         load_dotenv()
         
@@ -16,51 +25,51 @@ class EmbeddingGenerator:
         self.embedding_model = self.config['embedding_model']
         self.embedding_dimensions = self.config['embedding_dimensions']
         self.api_settings = self.config['api']
+        self.cache = get_embedding_cache()
+        # Paces requests against api.rate_limit (requests/minute) and api.tokens_per_minute,
+        # adapting to the provider's rate-limit headers
+        self.scheduler = scheduler or RateLimitScheduler.from_config(self.api_settings)
         
-        # Initialize OpenAI client
-        openai.api_key = os.getenv('OPENAI_API_KEY')
-        if not openai.api_key:
+        if openai_client is None and not os.getenv('OPENAI_API_KEY'):
             raise ValueError("OPENAI_API_KEY not found in environment variables")
+        self.embedding_client = EmbeddingClient(openai_client, model=self.embedding_model,
+                                                cache=self.cache, scheduler=self.scheduler)
 
     def generate_embeddings(self, chunks: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
-        """Generate embeddings for a list of text chunks."""
-        embedded_chunks = []
-        
-        for chunk in tqdm(chunks, desc="Generating embeddings"):
-            try:
-                # Generate embedding for the chunk content
-                response = openai.embeddings.create(
-                    model=self.embedding_model,
-                    input=chunk['content']
-                )
-                
-                # Add embedding to chunk data
-                embedded_chunk = {
-                    'content': chunk['content'],
-                    'metadata': chunk['metadata'],
-                    'embedding': response.data[0].embedding
-                }
-                embedded_chunks.append(embedded_chunk)
-                
-            except Exception as e:
-                print(f"Error generating embedding for chunk: {str(e)}")
-                continue
-        
-        return embedded_chunks
+        """
+        Generate embeddings for a list of text chunks in as few requests as possible.
+
+        If the batch request fails, the chunks are embedded one at a time so one
+        bad input costs only itself; an error on a single chunk is raised, never
+        swallowed, so no chunk silently goes without an embedding.
+        """
+        try:
+            embeddings = self.embedding_client.get_embeddings([chunk['content'] for chunk in chunks])
+        except Exception as e:
+            if len(chunks) == 1:
+                raise
+            print(f"Error generating embeddings for batch of {len(chunks)} chunks, embedding one by one: {str(e)}")
+            embeddings = [self.embedding_client.get_embedding(chunk['content']) for chunk in chunks]
+
+        return [
+            {
+                'content': chunk['content'],
+                'metadata': chunk['metadata'],
+                'embedding': embedding
+            }
+            for chunk, embedding in zip(chunks, embeddings)
+        ]
 
     def batch_generate_embeddings(self, chunks: List[Dict[str, Any]], batch_size: int = 100) -> List[Dict[str, Any]]:
-        """Generate embeddings in batches to handle rate limits."""
+        """Generate embeddings for batches concurrently, paced by the rate-limit scheduler."""
+        batches = [chunks[i:i + batch_size] for i in range(0, len(chunks), batch_size)]
         all_embedded_chunks = []
         
-        for i in range(0, len(chunks), batch_size):
-            batch = chunks[i:i + batch_size]
-            embedded_batch = self.generate_embeddings(batch)
-            all_embedded_chunks.extend(embedded_batch)
-            
-            # Add a small delay to respect rate limits
-            if i + batch_size < len(chunks):
-                import time
-                time.sleep(1)  # 1 second delay between batches
+        # The scheduler caps calls in flight, so extra workers just wait for a slot
+        with ThreadPoolExecutor(max_workers=self.scheduler.max_concurrency) as executor:
+            for embedded_batch in tqdm(executor.map(self.generate_embeddings, batches),
+                                       total=len(batches), desc="Generating embeddings"):
+                all_embedded_chunks.extend(embedded_batch)
         
         return all_embedded_chunks
 
@@ -76,4 +85,6 @@ if __name__ == "__main__":
     generator = EmbeddingGenerator()
     embedded_chunks = generator.batch_generate_embeddings(chunks)
     
-    print(f"Generated embeddings for {len(embedded_chunks)} chunks") 
\ No newline at end of file
+    print(f"Generated embeddings for {len(embedded_chunks)} chunks")
+    print(f"Embedding cache: {generator.cache.stats()}")
+    print(f"Rate limiting: {generator.scheduler.stats()}") 
\ No newline at end of file